@@ -0,0 +1,223 @@
+"""Columnar (Parquet / Arrow IPC) exports of the cache and the lookup event log.
+
+The CSV export formats every value for people to read: "$95,199" for
+incomes, text for coordinates. This export keeps the types instead:
+- incomes and net worth are int64
+- coordinates are float64
+- timestamps are real timestamps
+- repeated labels (status, segment, urbanity, ...) are dictionary-encoded
+
+Rows are read from SQLite in keyset-paginated batches and written one record
+batch at a time, so memory stays flat and a download can be streamed as it is
+built. Needs pyarrow (`pip install -r requirements-analytics.txt`).
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache_manager_new import LOOKUP_STAGES
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+TABLES = {"cache": "postal_code_cache", "events": "lookup_events"}
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+
+def _to_int(value: Any) -> Optional[int]:
+    """Integers and numeric strings ("$95,199", "1,234") become ints; ranges and labels become None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    cleaned = re.sub(r"[$,\s]", "", str(value))
+    try:
+        return int(float(cleaned))
+    except ValueError:
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(str(value).replace("%", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def _to_timestamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _to_label(value: Any) -> Optional[str]:
+    return None if value is None or value == "" else str(value)
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    return None if value is None else bool(value)
+
+
+# (column, arrow type, converter) per table, in output order.
+Column = Tuple[str, pa.DataType, Callable[[Any], Any]]
+
+CACHE_COLUMNS: List[Column] = [
+    ("postal_code", pa.string(), _to_label),
+    ("status", CATEGORY, _to_label),
+    ("message", pa.string(), _to_label),
+    ("segment_number", pa.int16(), _to_int),
+    ("segment_name", CATEGORY, _to_label),
+    ("segment_description", CATEGORY, _to_label),
+    ("who_they_are", CATEGORY, _to_label),
+    ("average_household_income", pa.int64(), _to_int),
+    # Net worth is stored either as a number or as a range label such as "$1M to $2.15M".
+    ("average_household_net_worth", CATEGORY, _to_label),
+    ("average_household_net_worth_amount", pa.int64(), _to_int),
+    ("education", CATEGORY, _to_label),
+    ("urbanity", CATEGORY, _to_label),
+    ("occupation", CATEGORY, _to_label),
+    ("diversity", CATEGORY, _to_label),
+    ("family_life", CATEGORY, _to_label),
+    ("tenure", CATEGORY, _to_label),
+    ("home_type", CATEGORY, _to_label),
+    ("income_level", CATEGORY, _to_label),
+    ("lifestage", CATEGORY, _to_label),
+    ("social_group", CATEGORY, _to_label),
+    ("official_language", CATEGORY, _to_label),
+    ("population", pa.int64(), _to_int),
+    ("households", pa.int64(), _to_int),
+    ("percent_total_households", pa.float64(), _to_float),
+    ("latitude", pa.float64(), _to_float),
+    ("longitude", pa.float64(), _to_float),
+    ("geocoder_found", pa.bool_(), _to_bool),
+    ("vintage", CATEGORY, _to_label),
+    ("source", CATEGORY, _to_label),
+    ("confirmed", pa.bool_(), _to_bool),
+    ("cached_at", pa.timestamp("us"), _to_timestamp),
+    ("expires_at", pa.timestamp("us"), _to_timestamp),
+]
+
+EVENT_COLUMNS: List[Column] = [
+    ("id", pa.int64(), _to_int),
+    ("requested_at", pa.timestamp("us"), _to_timestamp),
+    ("postal_code", pa.string(), _to_label),
+    ("status", CATEGORY, _to_label),
+    ("source", CATEGORY, _to_label),
+    ("endpoint", CATEGORY, _to_label),
+    ("batch_id", pa.string(), _to_label),
+    ("message", pa.string(), _to_label),
+    ("from_cache", pa.bool_(), _to_bool),
+    ("duration_ms", pa.int32(), _to_int),
+    *((f"{stage}_ms", pa.int32(), _to_int) for stage in LOOKUP_STAGES),
+]
+
+COLUMNS: Dict[str, List[Column]] = {"postal_code_cache": CACHE_COLUMNS, "lookup_events": EVENT_COLUMNS}
+
+
+def schema_for(table: str) -> pa.Schema:
+    return pa.schema([(name, arrow_type) for name, arrow_type, _ in COLUMNS[table]])
+
+
+def record_batches(
+    cache_manager: Any,
+    table: str,
+    batch_size: int = 50000,
+    include_expired: bool = True,
+) -> Iterator[pa.RecordBatch]:
+    """Convert keyset-paginated SQLite rows into typed record batches."""
+    columns = COLUMNS[table]
+    schema = schema_for(table)
+    names = [name for name, _, _ in columns]
+    for rows in cache_manager.iter_table_rows(table, names, batch_size=batch_size, include_expired=include_expired):
+        arrays = [
+            pa.array([convert(row[position]) for row in rows], type=arrow_type)
+            for position, (_, arrow_type, convert) in enumerate(columns)
+        ]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _writer(sink: Any, schema: pa.Schema, fmt: str) -> Any:
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "arrow":
+        # The stream format (not the file format) allows each batch its own dictionaries.
+        return pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    raise ValueError(f"unsupported export format: {fmt}")
+
+
+def stream_export(
+    cache_manager: Any,
+    table: str,
+    fmt: str,
+    batch_size: int = 50000,
+    include_expired: bool = True,
+) -> Iterator[bytes]:
+    """Yield the encoded export a record batch at a time, for a streamed HTTP download."""
+    sink = _ChunkSink()
+    writer = _writer(sink, schema_for(table), fmt)
+    for batch in record_batches(cache_manager, table, batch_size, include_expired):
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def write_export(
+    cache_manager: Any,
+    table: str,
+    fmt: str,
+    path: str,
+    batch_size: int = 50000,
+    include_expired: bool = True,
+) -> int:
+    """Write an export file; returns the number of rows written."""
+    rows = 0
+    with open(path, "wb") as handle:
+        writer = _writer(handle, schema_for(table), fmt)
+        for batch in record_batches(cache_manager, table, batch_size, include_expired):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+        writer.close()
+    return rows
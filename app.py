@@ -1,21 +1,42 @@
 import base64
+import csv
+import io
+import json
 import logging
+import math
 import os
+import re
 import secrets
 import smtplib
 import time
 import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from email.message import EmailMessage
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
 import requests
-from flask import Flask, Response, jsonify, make_response, request
-
-from cache_manager_new import cache_manager
-from prizm_client import PrizmClient, PrizmLookupError, normalize_postal_code
+from flask import Flask, Response, g, jsonify, make_response, request, send_file, stream_with_context
+
+import metrics
+
+from batch_jobs import BatchJobRunner, job_results_csv, job_results_ndjson
+from cache_janitor import CacheJanitor
+from cache_manager_new import CACHE_BACKEND, cache_manager, cache_store, dashboard_store, job_store
+from lazy import LazyObject
+from payload_store import payload_store
+from profiler import RequestProfiler
+from refresh_ahead import RefreshAheadWorker
+from reporting_snapshot import ReportingSnapshot
+from resegment_worker import ResegmentWorker
+from prizm_client import Deadline, PrizmClient, PrizmDeadlineExceeded, PrizmLookupError, normalize_postal_code
 from segment_net_worth import average_household_net_worth, average_household_net_worth_amount
 
+try:
+    import analytics_export
+except ImportError:  # pyarrow is only in requirements-analytics.txt
+    analytics_export = None
+
 logging.basicConfig(
     level=os.environ.get("LOG_LEVEL", "INFO"),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -23,7 +44,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-prizm_client = PrizmClient()
+prizm_client = LazyObject(PrizmClient)
+profiler = RequestProfiler()
 
 DASHBOARD_HTML = """<!doctype html>
 <html lang="en">
@@ -39,7 +61,7 @@ DASHBOARD_HTML = """<!doctype html>
     header h1 { margin:0 0 6px; font-size:30px; letter-spacing:-.02em; }
     header p { margin:0; opacity:.86; }
     main { padding:24px 32px 40px; max-width:1320px; margin:0 auto; }
-    .grid { display:grid; gap:16px; grid-template-columns:repeat(4,minmax(0,1fr)); margin-bottom:20px; }
+    .grid { display:grid; gap:16px; grid-template-columns:repeat(5,minmax(0,1fr)); margin-bottom:20px; }
     .card { background:var(--card); border:1px solid var(--line); border-radius:14px; padding:18px; box-shadow:0 1px 2px rgba(20,45,70,.05); }
     .metric { font-size:32px; line-height:1; font-weight:750; letter-spacing:-.04em; }
     .label { color:var(--muted); font-size:13px; margin-top:8px; }
@@ -65,7 +87,7 @@ DASHBOARD_HTML = """<!doctype html>
 <body>
 <header>
   <h1>PRIZM Dashboard</h1>
-  <p>Postal-code cache, lookup outcomes, export, and weekly reporting metrics.</p>
+  <p>Postal-code cache, lookup outcomes, export, and weekly reporting metrics. <span id="freshness"></span></p>
 </header>
 <main>
   <div class="grid">
@@ -73,6 +95,7 @@ DASHBOARD_HTML = """<!doctype html>
     <div class="card"><div id="successful" class="metric ok">–</div><div class="label">successful cached codes</div></div>
     <div class="card"><div id="failed" class="metric bad">–</div><div class="label">failed / unassigned cached codes</div></div>
     <div class="card"><div id="weekLookups" class="metric">–</div><div class="label">lookups recorded this week</div></div>
+    <div class="card"><div id="refreshAhead" class="metric">–</div><div class="label">refresh-ahead hits / misses this week</div></div>
   </div>
 
   <div class="section-title">
@@ -85,10 +108,18 @@ DASHBOARD_HTML = """<!doctype html>
   </div>
 
   <div class="section-title">
-    <div><h2>Recent daily cache additions</h2><div class="muted">Based on when each postal code was first cached or refreshed.</div></div>
+    <div><h2>Recent daily cache additions</h2><div class="muted">Based on when each postal code was first cached, or re-cached with a different segment. Refreshes that keep the segment are not counted.</div></div>
   </div>
   <div class="card"><div id="dailyCounts" class="muted">Loading…</div></div>
 
+  <div class="section-title">
+    <div><h2>Lookup stage latency</h2><div class="muted">Milliseconds per stage over the last 7 days, for lookups that ran that stage.</div></div>
+  </div>
+  <table>
+    <thead><tr><th>Stage</th><th>Lookups</th><th>p50</th><th>p95</th><th>p99</th></tr></thead>
+    <tbody id="stageLatency"><tr><td colspan="5" class="muted">Loading…</td></tr></tbody>
+  </table>
+
   <div class="section-title">
     <div><h2>Postal codes</h2><div class="muted">Search cached successes, failures, and invalid records.</div></div>
   </div>
@@ -117,14 +148,25 @@ async function loadSummary() {
   const stats = data.cache_stats || {};
   const breakdown = stats.status_breakdown || {};
   const week = data.lookup_events_7d || {};
+  const reporting = data.reporting || {};
+  text('freshness', reporting.source === 'snapshot'
+    ? `Data as of ${new Date(reporting.refreshed_at).toLocaleString()} (snapshot refreshed every ${Math.round(reporting.refresh_seconds / 60)} min, never older than ${Math.round(reporting.max_age_seconds / 60)} min).`
+    : 'Live data.');
   text('total', fmt.format(stats.valid_entries || 0));
   text('successful', fmt.format(breakdown.success || 0));
   text('failed', fmt.format((breakdown.error || 0) + (breakdown.invalid || 0)));
   text('weekLookups', fmt.format(week.lookups || 0));
+  const refreshAhead = week.refresh_ahead;
+  text('refreshAhead', refreshAhead ? `${fmt.format(refreshAhead.hits || 0)} / ${fmt.format(refreshAhead.misses || 0)}` : '–');
   const counts = data.daily_cache_counts || [];
   document.getElementById('dailyCounts').innerHTML = counts.length ? counts.map(row =>
     `<div><strong>${esc(row.day)}</strong>: ${fmt.format(row.total || 0)} cached · <span class="ok">${fmt.format(row.successful || 0)} success</span> · <span class="bad">${fmt.format(row.failed || 0)} failed</span></div>`
   ).join('') : 'No daily additions recorded in the selected window.';
+  const stages = Object.entries(week.stage_latency_ms || {});
+  const ms = value => value == null ? '–' : fmt.format(value);
+  document.getElementById('stageLatency').innerHTML = stages.length ? stages.map(([stage, row]) => `
+    <tr><td><strong>${esc(stage.replace('_', ' '))}</strong></td><td>${fmt.format(row.count || 0)}</td><td>${ms(row.p50)}</td><td>${ms(row.p95)}</td><td>${ms(row.p99)}</td></tr>`
+  ).join('') : '<tr><td colspan="5" class="muted">No stage timings recorded.</td></tr>';
 }
 async function loadRows() {
   const params = new URLSearchParams({ limit: '500' });
@@ -197,16 +239,27 @@ def parse_basic_auth() -> tuple[Optional[str], Optional[str]]:
 
 
 def has_valid_api_key() -> bool:
+    return api_key_is_valid(request.headers)
+
+
+def api_key_is_valid(headers: Any) -> bool:
     expected_key = os.environ.get("PRIZM_API_KEY")
     if not expected_key:
         return True
 
-    provided_key = request.headers.get("X-API-Key")
-    auth_header = request.headers.get("Authorization", "")
+    provided_key = headers.get("X-API-Key")
+    auth_header = headers.get("Authorization", "")
     bearer_token = auth_header.removeprefix("Bearer ").strip() if auth_header.startswith("Bearer ") else None
     return secrets.compare_digest(provided_key or "", expected_key) or secrets.compare_digest(bearer_token or "", expected_key)
 
 
+def has_valid_admin_key() -> bool:
+    expected_key = os.environ.get("PRIZM_ADMIN_KEY")
+    if not expected_key:
+        return False
+    return secrets.compare_digest(request.headers.get("X-Admin-Key", ""), expected_key)
+
+
 def has_valid_dashboard_auth() -> bool:
     username, password = dashboard_credentials()
     if not password:
@@ -221,28 +274,54 @@ def dashboard_auth_required() -> Response:
     return response
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
 @app.before_request
 def require_authentication():
     if request.path == "/health" or request.method == "OPTIONS":
         return None
 
-    dashboard_paths = {"/", "/dashboard", "/api/dashboard/summary", "/api/cache/entries", "/api/cache/export.csv", "/api/reports/weekly", "/api/reports/weekly/send"}
+    dashboard_paths = {"/", "/dashboard", "/api/dashboard/summary", "/api/cache/entries", "/api/cache/export.csv", "/api/cache/export.parquet", "/api/cache/export.arrow", "/api/reports/weekly", "/api/reports/weekly/send"}
     if request.path in dashboard_paths:
         if has_valid_dashboard_auth() or has_valid_api_key():
             return None
         return dashboard_auth_required()
 
-    if request.path.startswith("/api/") and has_valid_api_key():
+    if (request.path.startswith("/api/") or request.path == "/metrics") and has_valid_api_key():
         return None
 
     return jsonify({"error": "Unauthorized"}), 401
 
 
+@app.before_request
+def start_request_profile():
+    if not profiler.enabled and "X-Profile" not in request.headers:
+        return None
+    forced = request.headers.get("X-Profile") == "1" and has_valid_admin_key()
+    g.profile = profiler.start(forced=forced)
+    return None
+
+
+@app.teardown_request
+def discard_request_profile(_exc):
+    session = g.pop("profile", None)
+    if session is not None:
+        profiler.discard(session)
+
+
+def request_endpoint_label() -> str:
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
 def api_response_from_cache(cached_data: Dict[str, Any]) -> Dict[str, Any]:
     response = cached_data.copy()
     segment_number = response.get("segment_number")
     response["prizm_code"] = segment_number or "Unknown"
-    if segment_number:
+    # cache_data stores the per-segment net worth at write time; rows cached before that still need it here.
+    if segment_number and "average_household_net_worth_amount" not in response:
         net_worth_amount = average_household_net_worth_amount(segment_number)
         if net_worth_amount is not None:
             response["average_household_net_worth_amount"] = net_worth_amount
@@ -259,58 +338,77 @@ def api_response_from_cache(cached_data: Dict[str, Any]) -> Dict[str, Any]:
     return response
 
 
-def get_prizm_code(postal_code: str, endpoint: str = "single", batch_id: Optional[str] = None) -> Dict[str, Any]:
-    started = time.monotonic()
-    formatted_postal_code = normalize_postal_code(postal_code)
-    cache_key = formatted_postal_code or postal_code
-
-    cached_data = cache_manager.get_cached_data(cache_key)
-    if cached_data:
-        logger.info("Returning cached PRIZM result for %s", cache_key)
-        result = api_response_from_cache(cached_data)
-        cache_manager.record_lookup_event(
-            cache_key,
-            result.get("status", "error"),
-            "cache",
-            endpoint=endpoint,
-            batch_id=batch_id,
-            message=result.get("message"),
-            from_cache=True,
-            duration_ms=int((time.monotonic() - started) * 1000),
-        )
-        return result
+def cached_lookup_result(
+    cache_key: str,
+    cached_data: Dict[str, Any],
+    endpoint: str,
+    batch_id: Optional[str],
+    started: float,
+    timings: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    logger.info("Returning cached PRIZM result for %s", cache_key)
+    result = api_response_from_cache(cached_data)
+    dashboard_store.record_lookup_event(
+        cache_key,
+        result.get("status", "error"),
+        "cache",
+        endpoint=endpoint,
+        batch_id=batch_id,
+        message=result.get("message"),
+        from_cache=True,
+        duration_ms=int((time.monotonic() - started) * 1000),
+        stage_timings=timings,
+    )
+    return result
 
-    source = "upstream" if formatted_postal_code else "validation"
-    try:
-        result = prizm_client.lookup(postal_code)
-        should_cache = True
-    except (PrizmLookupError, requests.RequestException) as exc:
-        logger.exception("PRIZM lookup failed for %s", postal_code)
-        should_cache = False
-        result = {
-            "postal_code": formatted_postal_code or postal_code,
-            "prizm_code": "Unknown",
-            "segment_number": None,
-            "segment_name": "",
-            "segment_description": "",
-            "average_household_income": "",
-            "education": "",
-            "urbanity": "",
-            "average_household_net_worth": "",
-            "occupation": "",
-            "diversity": "",
-            "family_life": "",
-            "tenure": "",
-            "home_type": "",
-            "status": "error",
-            "message": str(exc),
-        }
 
-    if should_cache:
+def upstream_error_result(postal_code: str, exc: Exception) -> Dict[str, Any]:
+    return {
+        "postal_code": normalize_postal_code(postal_code) or postal_code,
+        "prizm_code": "Unknown",
+        "segment_number": None,
+        "segment_name": "",
+        "segment_description": "",
+        "average_household_income": "",
+        "education": "",
+        "urbanity": "",
+        "average_household_net_worth": "",
+        "occupation": "",
+        "diversity": "",
+        "family_life": "",
+        "tenure": "",
+        "home_type": "",
+        "status": "error",
+        "message": str(exc),
+    }
+
+
+def finish_upstream_lookup(
+    cache_key: str,
+    result: Dict[str, Any],
+    source: str,
+    should_cache: bool,
+    endpoint: str,
+    batch_id: Optional[str],
+    started: float,
+    timings: Optional[Dict[str, int]] = None,
+    pending_writes: Optional[list] = None,
+    payloads: Optional[list] = None,
+) -> Dict[str, Any]:
+    """Cache the result and its raw upstream `payloads` (or queue them on `pending_writes` for
+    write_cache_many) and record the lookup event."""
+    if should_cache and pending_writes is not None:
+        pending_writes.append((cache_key, result, payloads or []))
+    elif should_cache:
         cache_duration = cache_duration_for_result(result)
-        cache_manager.cache_data(cache_key, result, custom_duration_days=cache_duration)
-
-    cache_manager.record_lookup_event(
+        write_started = time.monotonic()
+        cache_store.cache_data(cache_key, result, custom_duration_days=cache_duration)
+        if payloads:
+            payload_store.store_payloads(payloads)
+        if timings is not None:
+            timings["cache_write"] = int((time.monotonic() - write_started) * 1000)
+
+    dashboard_store.record_lookup_event(
         cache_key,
         result.get("status", "error"),
         source,
@@ -319,10 +417,369 @@ def get_prizm_code(postal_code: str, endpoint: str = "single", batch_id: Optiona
         message=result.get("message"),
         from_cache=False,
         duration_ms=int((time.monotonic() - started) * 1000),
+        stage_timings=timings,
     )
     return result
 
 
+def write_cache_many(pending_writes: list) -> None:
+    """Cache the results queued by a batch's lookups in one write transaction, and their upstream
+    payloads in one more, and take them off the queue."""
+    count = len(pending_writes)
+    if not count:
+        return
+    # Lookups still running may append while this writes; theirs stay queued for the next call.
+    queued = pending_writes[:count]
+    del pending_writes[:count]
+    entries = [(cache_key, result) for cache_key, result, _ in queued]
+    written = cache_store.cache_many(entries, duration_policy=cache_duration_for_result)
+    if written < len(entries):
+        logger.warning("Cached %s of %s batch lookup results", written, len(entries))
+    payload_store.store_payloads(payload for _, _, payloads in queued for payload in payloads)
+
+
+def upstream_payload_list() -> Optional[list]:
+    """A list for prizm_client.lookup to record raw upstream payloads in, unless PRIZM_STORE_UPSTREAM_PAYLOADS=0."""
+    return [] if os.environ.get("PRIZM_STORE_UPSTREAM_PAYLOADS", "1") == "1" else None
+
+
+def lookup_deadline(budget_seconds: Optional[float] = None) -> Optional[Deadline]:
+    if budget_seconds is None:
+        budget_seconds = float(os.environ.get("PRIZM_LOOKUP_BUDGET_SECONDS", "20"))
+    return Deadline(budget_seconds) if budget_seconds > 0 else None
+
+
+def request_budget_seconds(headers: Any = None) -> Optional[float]:
+    """Honour a caller's X-Request-Budget-Ms header, but never exceed the configured budget."""
+    headers = request.headers if headers is None else headers
+    try:
+        requested = float(headers.get("X-Request-Budget-Ms", "")) / 1000
+    except ValueError:
+        return None
+    configured = float(os.environ.get("PRIZM_LOOKUP_BUDGET_SECONDS", "20"))
+    return min(requested, configured) if configured > 0 else requested
+
+
+def read_cache(
+    cache_key: str,
+    include_expired: bool = False,
+    timings: Optional[Dict[str, int]] = None,
+) -> Optional[Dict[str, Any]]:
+    started = time.monotonic()
+    cached_data = cache_store.get_cached_data(cache_key, include_expired=include_expired)
+    metrics.observe_cache_lookup("stale" if include_expired else "fresh", bool(cached_data))
+    if timings is not None:
+        timings["cache_read"] = int((time.monotonic() - started) * 1000)
+    return cached_data
+
+
+def read_cache_many(cache_keys: list[str], timings: Optional[Dict[str, int]] = None) -> list[Optional[Dict[str, Any]]]:
+    """Fresh cached data for each key, in order, from one bulk cache read."""
+    started = time.monotonic()
+    found = cache_store.get_cached_many(cache_keys) if cache_keys else {}
+    cached = [found.get(cache_store.normalize_postal_code(cache_key)) for cache_key in cache_keys]
+    for cached_data in cached:
+        metrics.observe_cache_lookup("fresh", bool(cached_data))
+    if timings is not None:
+        timings["cache_read"] = int((time.monotonic() - started) * 1000)
+    return cached
+
+
+def fsa_estimate_result(cache_key: str, exc: Exception) -> Optional[Dict[str, Any]]:
+    """Estimate a cold postal code from its FSA's dominant segment when PRIZM_FSA_ESTIMATE_FALLBACK=1."""
+    if os.environ.get("PRIZM_FSA_ESTIMATE_FALLBACK", "0") != "1" or not normalize_postal_code(cache_key):
+        return None
+    distribution = cache_manager.get_fsa_distribution(cache_key[:3])
+    min_codes = int(os.environ.get("PRIZM_FSA_ESTIMATE_MIN_CODES", "5"))
+    if not distribution or distribution["postal_codes"] < min_codes:
+        return None
+    dominant = distribution["dominant_segment"]
+    profile = cache_manager.get_segment_profile(dominant["segment_number"])
+    if not profile:
+        return None
+
+    result = api_response_from_cache({**profile, "postal_code": cache_key})
+    result["status"] = "estimated"
+    result["message"] = f"Upstream unavailable ({exc}); estimated from the dominant segment in {distribution['fsa']}"
+    result["estimate"] = {
+        "fsa": distribution["fsa"],
+        "share": dominant["share"],
+        "postal_codes": distribution["postal_codes"],
+    }
+    return result
+
+
+def deadline_fallback_result(cache_key: str, postal_code: str, exc: PrizmDeadlineExceeded) -> tuple[Dict[str, Any], str]:
+    """Answer a lookup that ran out of budget with the expired cache row, what upstream resolved so far,
+    or an FSA estimate."""
+    stale_data = read_cache(cache_key, include_expired=True)
+    if stale_data:
+        result = api_response_from_cache(stale_data)
+        result.setdefault("cache_info", {})["stale"] = True
+        return result, "stale"
+    if exc.partial:
+        return exc.partial, "upstream"
+    estimate = fsa_estimate_result(cache_key, exc)
+    if estimate:
+        return estimate, "estimate"
+    return upstream_error_result(postal_code, exc), "upstream"
+
+
+def lookup_failure_result(cache_key: str, postal_code: str, exc: Exception) -> tuple[Dict[str, Any], str]:
+    """Answer a failed upstream lookup (quota, network) with an FSA estimate when enabled, else an error."""
+    estimate = fsa_estimate_result(cache_key, exc)
+    if estimate:
+        return estimate, "estimate"
+    return upstream_error_result(postal_code, exc), "upstream"
+
+
+def upstream_lookup_result(
+    postal_code: str,
+    endpoint: str,
+    batch_id: Optional[str],
+    started: float,
+    deadline: Optional[Deadline] = None,
+    timings: Optional[Dict[str, int]] = None,
+    pending_writes: Optional[list] = None,
+) -> Dict[str, Any]:
+    timings = {} if timings is None else timings
+    formatted_postal_code = normalize_postal_code(postal_code)
+    cache_key = formatted_postal_code or postal_code
+    source = "upstream" if formatted_postal_code else "validation"
+    payloads = upstream_payload_list()
+    try:
+        result = prizm_client.lookup(
+            postal_code, deadline=deadline or lookup_deadline(), timings=timings, payloads=payloads
+        )
+        should_cache = True
+    except PrizmDeadlineExceeded as exc:
+        logger.warning("PRIZM lookup for %s ran out of budget: %s", postal_code, exc)
+        should_cache = False
+        result, source = deadline_fallback_result(cache_key, postal_code, exc)
+    except (PrizmLookupError, requests.RequestException) as exc:
+        logger.exception("PRIZM lookup failed for %s", postal_code)
+        should_cache = False
+        result, source = lookup_failure_result(cache_key, postal_code, exc)
+
+    return finish_upstream_lookup(
+        cache_key, result, source, should_cache, endpoint, batch_id, started, timings, pending_writes, payloads
+    )
+
+
+def background_lookups(postal_codes: list[str], endpoint: str) -> list[Dict[str, Any]]:
+    """Look cached postal codes up again upstream for a background worker, one at a time, skipping the
+    cache read; the old rows keep serving until the one cache_many write at the end replaces them."""
+    pending_writes: list = []
+    try:
+        return [
+            upstream_lookup_result(postal_code, endpoint, None, time.monotonic(), pending_writes=pending_writes)
+            for postal_code in postal_codes
+        ]
+    finally:
+        write_cache_many(pending_writes)
+
+
+def get_prizm_code(
+    postal_code: str,
+    endpoint: str = "single",
+    batch_id: Optional[str] = None,
+    budget_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    started = time.monotonic()
+    deadline = lookup_deadline(budget_seconds)
+    cache_key = normalize_postal_code(postal_code) or postal_code
+    timings: Dict[str, int] = {}
+
+    cached_data = read_cache(cache_key, timings=timings)
+    if cached_data:
+        return cached_lookup_result(cache_key, cached_data, endpoint, batch_id, started, timings)
+    return upstream_lookup_result(postal_code, endpoint, batch_id, started, deadline, timings)
+
+
+def get_prizm_codes(
+    postal_codes: list[str],
+    endpoint: str,
+    batch_id: Optional[str] = None,
+    budget_seconds: Optional[float] = None,
+    executor: Optional[Executor] = None,
+) -> list[Dict[str, Any]]:
+    """Look up several postal codes, in order: one bulk cache read, then an upstream lookup per miss
+    (concurrently on `executor` when given), then one cache_many write for the misses."""
+    started = time.monotonic()
+    cache_keys = [normalize_postal_code(postal_code) or postal_code for postal_code in postal_codes]
+    read_timings: Dict[str, int] = {}
+    cached = read_cache_many(cache_keys, timings=read_timings)
+
+    results: list[Optional[Dict[str, Any]]] = [None] * len(postal_codes)
+    misses = []
+    for index, (cache_key, cached_data) in enumerate(zip(cache_keys, cached)):
+        if cached_data:
+            results[index] = cached_lookup_result(cache_key, cached_data, endpoint, batch_id, started, dict(read_timings))
+        else:
+            misses.append(index)
+
+    pending_writes: list = []
+
+    def lookup(index: int) -> Dict[str, Any]:
+        deadline = lookup_deadline(budget_seconds)
+        # Each lookup event times its own lookup, not the batch's cache read and earlier lookups.
+        return upstream_lookup_result(
+            postal_codes[index], endpoint, batch_id, time.monotonic(), deadline, dict(read_timings), pending_writes
+        )
+
+    try:
+        for index, result in zip(misses, executor.map(lookup, misses) if executor else map(lookup, misses)):
+            results[index] = result
+    finally:
+        write_cache_many(pending_writes)
+    return results
+
+
+def postal_codes_from_csv(text: str) -> list[str]:
+    """Read postal codes from a `postal_code` column, or the first column of a headerless CSV."""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = 0
+    if "postal_code" in header:
+        column = header.index("postal_code")
+        rows = rows[1:]
+
+    return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+
+def postal_codes_from_request() -> list[str]:
+    """Accept a JSON `postal_codes` list, an uploaded CSV `file`, or a text/csv body."""
+    upload = request.files.get("file")
+    if upload is not None:
+        return postal_codes_from_csv(upload.read().decode("utf-8-sig"))
+    if request.mimetype == "text/csv":
+        return postal_codes_from_csv(request.get_data(as_text=True))
+
+    data = request.get_json(silent=True) or {}
+    postal_codes = data.get("postal_codes")
+    if not isinstance(postal_codes, list):
+        return []
+    return [str(postal_code) for postal_code in postal_codes]
+
+
+def ndjson_line(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":")) + "\n"
+
+
+def stream_batch_results(postal_codes: list[str], batch_id: str) -> Iterator[str]:
+    """Yield cache hits immediately, then upstream results as each lookup finishes."""
+    started = time.monotonic()
+    concurrency = max(1, int(os.environ.get("STREAM_BATCH_CONCURRENCY", "4")))
+    write_size = max(1, int(os.environ.get("STREAM_BATCH_WRITE_SIZE", "100")))
+    totals = {"total": 0, "successful": 0, "failed": 0, "cache_hits": 0}
+
+    def emit(index: int, result: Dict[str, Any]) -> str:
+        totals["total"] += 1
+        if result.get("status") == "success":
+            totals["successful"] += 1
+        else:
+            totals["failed"] += 1
+        return ndjson_line({"type": "result", "index": index, "result": result})
+
+    misses = []
+    cache_keys = [normalize_postal_code(postal_code) or postal_code for postal_code in postal_codes]
+    timings: Dict[str, int] = {}
+    for index, (postal_code, cache_key, cached_data) in enumerate(
+        zip(postal_codes, cache_keys, read_cache_many(cache_keys, timings=timings))
+    ):
+        if cached_data:
+            totals["cache_hits"] += 1
+            yield emit(index, cached_lookup_result(cache_key, cached_data, "batch_stream", batch_id, started, dict(timings)))
+        else:
+            misses.append((index, postal_code))
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending_writes: list = []
+    try:
+        futures = {
+            executor.submit(
+                upstream_lookup_result, postal_code, "batch_stream", batch_id, time.monotonic(), None, None, pending_writes
+            ): index
+            for index, postal_code in misses
+        }
+        for future in as_completed(futures):
+            yield emit(futures[future], future.result())
+            # Cache as the stream goes, so a disconnect or worker restart keeps the lookups done so far.
+            if len(pending_writes) >= write_size:
+                write_cache_many(pending_writes)
+    finally:
+        # A client disconnect closes the generator; drop lookups that have not started yet, and wait
+        # for the running ones (each bounded by the lookup budget) so their results are cached too.
+        executor.shutdown(wait=True, cancel_futures=True)
+        write_cache_many(pending_writes)
+
+    totals["duration_ms"] = int((time.monotonic() - started) * 1000)
+    yield ndjson_line({"type": "summary", "batch_id": batch_id, **totals})
+
+
+job_runner = BatchJobRunner(
+    lambda postal_code, job_id: get_prizm_code(postal_code, endpoint="job", batch_id=job_id),
+    job_store,
+    lookup_many=lambda postal_codes, job_id, executor: get_prizm_codes(
+        postal_codes, "job", batch_id=job_id, executor=executor
+    ),
+)
+# The janitor's expired deletes go to the cache backend in use.
+cache_janitor = CacheJanitor(cache_manager, store=cache_store)
+resegment_worker = ResegmentWorker(
+    cache_manager, lambda postal_codes: background_lookups(postal_codes, "resegment"), lambda: prizm_client.geocoder_vintage
+)
+refresh_ahead_worker = RefreshAheadWorker(cache_manager, lambda postal_codes: background_lookups(postal_codes, "refresh"))
+reporting_snapshot = ReportingSnapshot(cache_manager)
+
+
+def reporting_cache() -> Any:
+    """Where dashboard, export and report reads go: the snapshot while it is fresh, else the live cache.
+
+    Postgres needs no snapshot; its readers never block the lookup path's writers.
+    """
+    if CACHE_BACKEND == "postgres":
+        return dashboard_store
+    return reporting_snapshot.reader() or cache_manager
+
+
+def reporting_entries() -> Any:
+    """Where reporting reads of cache entries go; LMDB keeps them outside the SQLite database."""
+    return cache_store if CACHE_BACKEND == "lmdb" else reporting_cache()
+
+
+def sqlite_cache_required(feature: str) -> tuple[Response, int]:
+    """Error response for a feature that reads cache rows out of the SQLite database."""
+    message = f"{feature} needs PRIZM_CACHE_BACKEND=sqlite; it reads the SQLite cache table"
+    return jsonify({"status": "error", "error": message}), 501
+
+
+def check_cache_backend_features() -> None:
+    """Refuse to start with settings that would read the SQLite cache table while another backend holds the rows."""
+    if CACHE_BACKEND != "sqlite" and os.environ.get("PRIZM_FSA_ESTIMATE_FALLBACK", "0") == "1":
+        raise RuntimeError(f"PRIZM_FSA_ESTIMATE_FALLBACK=1 needs PRIZM_CACHE_BACKEND=sqlite, not {CACHE_BACKEND}")
+
+
+check_cache_backend_features()
+
+
+def start_background_workers() -> None:
+    if os.environ.get("PRIZM_JOB_RUNNER", "1") == "1":
+        job_runner.start()
+    if os.environ.get("PRIZM_JANITOR", "1") == "1":
+        cache_janitor.start()
+    # Candidates come from SQLite lookup events and cache rows, like the janitor's work.
+    if os.environ.get("PRIZM_RESEGMENT", "1") == "1" and CACHE_BACKEND == "sqlite":
+        resegment_worker.start()
+    if os.environ.get("PRIZM_REFRESH_AHEAD", "1") == "1" and CACHE_BACKEND == "sqlite":
+        refresh_ahead_worker.start()
+    if os.environ.get("PRIZM_REPORTING_SNAPSHOT", "1") == "1" and CACHE_BACKEND != "postgres":
+        reporting_snapshot.start()
+
+
 @app.route("/")
 @app.route("/dashboard")
 def dashboard():
@@ -338,6 +795,10 @@ def home():
             "endpoints": {
                 "single": "GET /api/prizm?postal_code=V8A0A8",
                 "batch": "POST /api/prizm/batch",
+                "batch_stream": "POST /api/prizm/batch/stream",
+                "fsa": "GET /api/prizm/fsa/V8A",
+                "nearby": "GET /api/prizm/nearby?lat=49.3&lon=-124.3&radius=2",
+                "jobs": "POST /api/jobs",
                 "dashboard": "GET /dashboard",
                 "csv_export": "GET /api/cache/export.csv",
                 "health": "GET /health",
@@ -356,7 +817,58 @@ def get_single_prizm():
     postal_code = request.args.get("postal_code")
     if not postal_code:
         return jsonify({"error": "postal_code is required"}), 400
-    return jsonify(get_prizm_code(postal_code, endpoint="single"))
+    return jsonify(get_prizm_code(postal_code, endpoint="single", budget_seconds=request_budget_seconds()))
+
+
+@app.route("/api/prizm/fsa/<fsa>", methods=["GET"])
+def get_fsa_distribution(fsa):
+    fsa = fsa.strip().upper()
+    if not re.fullmatch(r"[A-Z]\d[A-Z]", fsa):
+        return jsonify({"error": "fsa must be the first three characters of a postal code, e.g. V8A"}), 400
+    if CACHE_BACKEND != "sqlite":
+        return sqlite_cache_required("The FSA distribution")
+    distribution = cache_manager.get_fsa_distribution(fsa)
+    if not distribution:
+        return jsonify({"status": "not_found", "fsa": fsa, "error": "No cached postal codes for this FSA"}), 404
+    return jsonify({"status": "success", **distribution})
+
+
+@app.route("/api/prizm/nearby", methods=["GET"])
+def get_nearby_prizm():
+    max_radius_km = float(os.environ.get("PRIZM_NEARBY_MAX_RADIUS_KM", "50"))
+    try:
+        limit = min(int(request.args.get("limit", 100)), 1000)
+        bbox = request.args.get("bbox")
+        if bbox:
+            # bbox=min_lon,min_lat,max_lon,max_lat, the usual GeoJSON order.
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+            latitude = float(request.args.get("lat", (min_lat + max_lat) / 2))
+            longitude = float(request.args.get("lon", (min_lon + max_lon) / 2))
+            radius_km = None
+        else:
+            latitude = float(request.args["lat"])
+            longitude = float(request.args["lon"])
+            radius_km = float(request.args.get("radius", 1))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lon (with optional radius in km) or bbox=min_lon,min_lat,max_lon,max_lat are required"}), 400
+
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive number"}), 400
+    if CACHE_BACKEND != "sqlite":
+        return sqlite_cache_required("Nearby search")
+    if bbox:
+        span_km = max(max_lat - min_lat, (max_lon - min_lon) * math.cos(math.radians(latitude))) * 111.32
+        if min_lat > max_lat or min_lon > max_lon or span_km > 2 * max_radius_km:
+            return jsonify({"error": f"bbox must be ordered and span at most {2 * max_radius_km:g} km"}), 400
+        nearby = cache_manager.get_nearby(latitude, longitude, bbox=(min_lat, min_lon, max_lat, max_lon), limit=limit)
+    else:
+        if not 0 < radius_km <= max_radius_km:
+            return jsonify({"error": f"radius must be between 0 and {max_radius_km:g} km"}), 400
+        nearby = cache_manager.get_nearby(latitude, longitude, radius_km=radius_km, limit=limit)
+
+    if nearby is None:
+        return jsonify({"status": "error", "error": "Nearby lookup failed"}), 500
+    return jsonify({"status": "success", "latitude": latitude, "longitude": longitude, "radius_km": radius_km, **nearby})
 
 
 @app.route("/api/prizm/batch", methods=["POST"])
@@ -364,23 +876,99 @@ def get_batch_prizm():
     data = request.get_json(silent=True) or {}
     postal_codes = data.get("postal_codes")
 
+    error = batch_request_error(postal_codes)
+    if error:
+        return jsonify({"error": error}), 400
+
+    metrics.BATCH_SIZE.labels(endpoint="batch").observe(len(postal_codes))
+    batch_id = str(uuid.uuid4())
+    budget_seconds = request_budget_seconds()
+    results = get_prizm_codes(
+        [str(postal_code) for postal_code in postal_codes], "batch", batch_id=batch_id, budget_seconds=budget_seconds
+    )
+    return jsonify(batch_response(results))
+
+
+def batch_request_error(postal_codes: Any) -> Optional[str]:
     if not isinstance(postal_codes, list) or not postal_codes:
-        return jsonify({"error": "postal_codes must be a non-empty list"}), 400
+        return "postal_codes must be a non-empty list"
 
     max_postal_codes = int(os.environ.get("MAX_BATCH_POSTAL_CODES", "10"))
+    if len(postal_codes) > max_postal_codes:
+        return f"Too many postal codes. Maximum allowed is {max_postal_codes}."
+    return None
+
+
+def batch_response(results: list[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "results": results,
+        "total": len(results),
+        "successful": sum(1 for result in results if result["status"] == "success"),
+        "failed": sum(1 for result in results if result["status"] != "success"),
+    }
+
+
+@app.route("/api/prizm/batch/stream", methods=["POST"])
+def stream_batch_prizm():
+    postal_codes = postal_codes_from_request()
+    if not postal_codes:
+        return jsonify({"error": "Provide a non-empty postal_codes list or a CSV file"}), 400
+
+    max_postal_codes = int(os.environ.get("MAX_STREAM_BATCH_POSTAL_CODES", "5000"))
     if len(postal_codes) > max_postal_codes:
         return jsonify({"error": f"Too many postal codes. Maximum allowed is {max_postal_codes}."}), 400
 
+    metrics.BATCH_SIZE.labels(endpoint="batch_stream").observe(len(postal_codes))
     batch_id = str(uuid.uuid4())
-    results = [get_prizm_code(str(postal_code), endpoint="batch", batch_id=batch_id) for postal_code in postal_codes]
-    return jsonify(
-        {
-            "results": results,
-            "total": len(results),
-            "successful": sum(1 for result in results if result["status"] == "success"),
-            "failed": sum(1 for result in results if result["status"] != "success"),
-        }
-    )
+    response = Response(stream_with_context(stream_batch_results(postal_codes, batch_id)), mimetype="application/x-ndjson")
+    response.headers["X-Batch-Id"] = batch_id
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/jobs", methods=["POST"])
+def create_batch_job():
+    postal_codes = postal_codes_from_request()
+    if not postal_codes:
+        return jsonify({"error": "Provide a non-empty postal_codes list or a CSV file"}), 400
+
+    max_postal_codes = int(os.environ.get("MAX_JOB_POSTAL_CODES", "100000"))
+    if len(postal_codes) > max_postal_codes:
+        return jsonify({"error": f"Too many postal codes. Maximum allowed is {max_postal_codes}."}), 400
+
+    metrics.BATCH_SIZE.labels(endpoint="job").observe(len(postal_codes))
+    job_id = job_store.create_batch_job(postal_codes)
+    if not job_id:
+        return jsonify({"status": "error", "error": "Failed to queue batch job"}), 500
+
+    start_background_workers()
+    return jsonify({"status": "queued", "job_id": job_id, "total": len(postal_codes), "status_url": f"/api/jobs/{job_id}"}), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_batch_job(job_id):
+    job = job_store.get_batch_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "error": f"No batch job found for {job_id}"}), 404
+    if job["status"] in {"queued", "running"}:
+        start_background_workers()
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/results", methods=["GET"])
+def download_batch_job_results(job_id):
+    job = job_store.get_batch_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "error": f"No batch job found for {job_id}"}), 404
+    if job["status"] != "completed":
+        return jsonify({"status": "error", "error": f"Batch job {job_id} is {job['status']}", "job": job}), 409
+
+    rows = job_store.iter_batch_job_results(job_id)
+    if request.args.get("format", "ndjson") == "csv":
+        response = Response(stream_with_context(job_results_csv(rows)), mimetype="text/csv")
+        response.headers["Content-Disposition"] = f"attachment; filename=prizm-job-{job_id}.csv"
+        return response
+    return Response(stream_with_context(job_results_ndjson(rows)), mimetype="application/x-ndjson")
 
 
 @app.route("/api/segments", methods=["GET"])
@@ -388,14 +976,46 @@ def get_segments():
     return jsonify({"status": "success", "segments": prizm_client.get_all_segments()})
 
 
+@app.route("/api/upstream/connections", methods=["GET"])
+def get_upstream_connections():
+    return jsonify({"status": "success", "pool_size": prizm_client.pool_size, "connections": prizm_client.connection_stats()})
+
+
+@app.route("/api/admin/profiles", methods=["GET"])
+def list_request_profiles():
+    if not has_valid_admin_key():
+        return jsonify({"error": "Admin key required"}), 403
+    return jsonify({
+        "profiles": profiler.list_profiles(),
+        "sample_rate": profiler.sample_rate,
+        "threshold_ms": profiler.threshold_ms,
+        "max_files": profiler.max_files,
+    })
+
+
+@app.route("/api/admin/profiles/<name>", methods=["GET"])
+def download_request_profile(name):
+    if not has_valid_admin_key():
+        return jsonify({"error": "Admin key required"}), 403
+    path = profiler.profile_path(name)
+    if not path:
+        return jsonify({"status": "error", "error": f"No profile named {name}"}), 404
+    return send_file(path, mimetype="text/plain", as_attachment=True, download_name=name)
+
+
 @app.route("/api/dashboard/summary", methods=["GET"])
 def dashboard_summary():
-    return jsonify(cache_manager.get_dashboard_summary())
+    summary = reporting_entries().get_dashboard_summary(events=reporting_cache())
+    summary["reporting"] = reporting_snapshot.status()
+    # Counted by the refresh-ahead worker at the end of each pass; it only runs on SQLite.
+    if CACHE_BACKEND == "sqlite" and "lookup_events_7d" in summary:
+        summary["lookup_events_7d"]["refresh_ahead"] = refresh_ahead_worker.counts()
+    return jsonify(summary)
 
 
 @app.route("/api/cache/entries", methods=["GET"])
 def get_cache_entries():
-    entries = cache_manager.list_cache_entries(
+    entries = reporting_entries().list_cache_entries(
         status=request.args.get("status"),
         search=request.args.get("search"),
         limit=request.args.get("limit", 500, type=int),
@@ -407,34 +1027,89 @@ def get_cache_entries():
 
 @app.route("/api/cache/export.csv", methods=["GET"])
 def export_cache_csv():
-    csv_data = cache_manager.export_cache_csv(include_expired=request.args.get("include_expired") == "1")
+    csv_data = reporting_entries().export_cache_csv(include_expired=request.args.get("include_expired") == "1")
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
     response = Response(csv_data, mimetype="text/csv")
     response.headers["Content-Disposition"] = f"attachment; filename=prizm-cache-{timestamp}.csv"
     return response
 
 
+@app.route("/api/cache/export.<any(parquet, arrow):fmt>", methods=["GET"])
+def export_cache_columnar(fmt):
+    if analytics_export is None:
+        return jsonify({"status": "error", "error": "Columnar export needs pyarrow (requirements-analytics.txt)"}), 501
+    table = analytics_export.TABLES.get(request.args.get("table", "cache"))
+    if not table:
+        return jsonify({"error": f"table must be one of: {', '.join(analytics_export.TABLES)}"}), 400
+    if table == "postal_code_cache" and CACHE_BACKEND == "lmdb":
+        return sqlite_cache_required("The columnar cache export")
+
+    mimetype, extension = analytics_export.FORMATS[fmt]
+    chunks = analytics_export.stream_export(
+        reporting_cache(), table, fmt, include_expired=request.args.get("include_expired", "1") == "1"
+    )
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    response = Response(chunks, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=prizm-{table}-{timestamp}.{extension}"
+    return response
+
+
 @app.route("/api/cache/stats", methods=["GET"])
 def get_cache_stats():
-    return jsonify({"status": "success", "cache_stats": cache_manager.get_cache_stats()})
+    stats = cache_store.get_cache_stats()
+    if dashboard_store is not cache_store:
+        # LMDB holds the entries; lookup events are recorded in SQLite.
+        stats["lookup_events"] = dashboard_store.get_cache_stats().get("lookup_events")
+    return jsonify({"status": "success", "cache_stats": stats})
 
 
 @app.route("/api/cache/cleanup", methods=["POST"])
 def cleanup_cache():
-    deleted_count = cache_manager.cleanup_expired_cache()
-    return jsonify({"status": "success", "message": f"Cleaned up {deleted_count} expired cache entries"})
+    progress = cache_janitor.trigger()
+    return jsonify({"status": "accepted", "message": "Expired cache cleanup started", "progress": progress}), 202
+
+
+@app.route("/api/cache/cleanup", methods=["GET"])
+def cleanup_cache_progress():
+    return jsonify({"status": "success", "progress": cache_janitor.progress()})
+
+
+@app.route("/api/cache/resegment", methods=["POST"])
+def resegment_cache():
+    if CACHE_BACKEND != "sqlite":
+        return sqlite_cache_required("Re-segmentation")
+    progress = resegment_worker.trigger()
+    return jsonify({"status": "accepted", "message": "Re-segmentation of outdated cache entries started", "progress": progress}), 202
+
+
+@app.route("/api/cache/resegment", methods=["GET"])
+def resegment_cache_progress():
+    return jsonify({"status": "success", "progress": resegment_worker.progress()})
+
+
+@app.route("/api/cache/refresh-ahead", methods=["POST"])
+def refresh_ahead_cache():
+    if CACHE_BACKEND != "sqlite":
+        return sqlite_cache_required("Refresh-ahead")
+    progress = refresh_ahead_worker.trigger()
+    return jsonify({"status": "accepted", "message": "Refresh of popular cache entries started", "progress": progress}), 202
+
+
+@app.route("/api/cache/refresh-ahead", methods=["GET"])
+def refresh_ahead_progress():
+    return jsonify({"status": "success", "progress": refresh_ahead_worker.progress()})
 
 
 @app.route("/api/cache/clear", methods=["POST"])
 def clear_cache():
-    if cache_manager.clear_cache():
+    if cache_store.clear_cache():
         return jsonify({"status": "success", "message": "All cache entries cleared"})
     return jsonify({"status": "error", "error": "Failed to clear cache"}), 500
 
 
 @app.route("/api/cache/check/<postal_code>", methods=["GET"])
 def check_cache(postal_code):
-    cached_data = cache_manager.get_cached_data(postal_code)
+    cached_data = cache_store.get_cached_data(postal_code)
     return jsonify(
         {
             "status": "success",
@@ -447,21 +1122,21 @@ def check_cache(postal_code):
 
 @app.route("/api/cache/delete/<postal_code>", methods=["DELETE"])
 def delete_cache_entry(postal_code):
-    if cache_manager.delete_cached_data(postal_code):
+    if cache_store.delete_cached_data(postal_code):
         return jsonify({"status": "success", "message": f"Successfully deleted cache entry for {postal_code}"})
     return jsonify({"status": "error", "error": f"No cache entry found for {postal_code}"}), 404
 
 
 @app.route("/api/cache/confirm/<postal_code>", methods=["POST"])
 def confirm_cache_entry(postal_code):
-    if cache_manager.confirm_data(postal_code):
+    if cache_store.confirm_data(postal_code):
         return jsonify({"status": "success", "message": f"Successfully confirmed data for {postal_code}"})
     return jsonify({"status": "error", "error": f"No valid cache entry found for {postal_code}"}), 404
 
 
 @app.route("/api/cache/unconfirm/<postal_code>", methods=["POST"])
 def unconfirm_cache_entry(postal_code):
-    if cache_manager.unconfirm_data(postal_code):
+    if cache_store.unconfirm_data(postal_code):
         return jsonify({"status": "success", "message": f"Successfully unconfirmed data for {postal_code}"})
     return jsonify({"status": "error", "error": f"No valid cache entry found for {postal_code}"}), 404
 
@@ -469,21 +1144,24 @@ def unconfirm_cache_entry(postal_code):
 @app.route("/api/cache/unconfirmed", methods=["GET"])
 def get_unconfirmed_entries():
     limit = request.args.get("limit", 100, type=int)
-    entries = cache_manager.get_unconfirmed_entries(limit)
+    entries = cache_store.get_unconfirmed_entries(limit)
     return jsonify({"status": "success", "unconfirmed_entries": entries, "count": len(entries)})
 
 
 @app.route("/api/debug/html/<postal_code>", methods=["GET"])
 def get_debug_html(postal_code):
-    html_content = cache_manager.get_cached_html(postal_code)
+    html_content = cache_store.get_cached_html(postal_code)
     if html_content:
         return html_content, 200, {"Content-Type": "text/html; charset=utf-8"}
     return jsonify({"status": "error", "error": f"No HTML content found for postal code {postal_code}"}), 404
 
 
 def build_weekly_report(days: int = 7) -> Dict[str, Any]:
-    summary = cache_manager.get_dashboard_summary()
-    events = summary.get("lookup_events_7d") or cache_manager.get_lookup_event_summary(days)
+    reporting = reporting_snapshot.status()
+    source = reporting_cache()
+    summary = reporting_entries().get_dashboard_summary(events=source)
+    summary["reporting"] = reporting
+    events = summary.get("lookup_events_7d") or source.get_lookup_event_summary(days)
     stats = summary.get("cache_stats", {})
     daily_counts = summary.get("daily_cache_counts", [])[:days]
     failures = summary.get("recent_failures", [])[:20]
@@ -510,6 +1188,14 @@ def build_weekly_report(days: int = 7) -> Dict[str, Any]:
     else:
         lines.append("- None recorded")
 
+    lines.extend(["", "Lookup stage latency (ms, p50 / p95 / p99):"])
+    stage_latency = {stage: row for stage, row in (events.get("stage_latency_ms") or {}).items() if row.get("count")}
+    if stage_latency:
+        for stage, row in stage_latency.items():
+            lines.append(f"- {stage}: {row.get('p50')} / {row.get('p95')} / {row.get('p99')} ({row.get('count')} lookups)")
+    else:
+        lines.append("- None recorded")
+
     lines.extend(["", "Recent failures/unassigned postal codes:"])
     if failures:
         for row in failures:
@@ -517,6 +1203,8 @@ def build_weekly_report(days: int = 7) -> Dict[str, Any]:
     else:
         lines.append("- None")
 
+    if reporting["source"] == "snapshot":
+        lines.extend(["", f"Data as of {reporting['refreshed_at']} (reporting snapshot)."])
     lines.extend(["", f"Dashboard: https://{os.environ.get('RAILWAY_PUBLIC_DOMAIN', 'prizm-api-production.up.railway.app')}/dashboard"])
     return {"subject": subject, "body": "\n".join(lines), "summary": summary}
 
@@ -569,14 +1257,49 @@ def weekly_report_send():
     return jsonify({"status": "success", "recipients": recipients, "report": report})
 
 
+def cors_headers() -> Dict[str, str]:
+    return {
+        "Access-Control-Allow-Origin": os.environ.get("CORS_ALLOW_ORIGIN", "*"),
+        "Access-Control-Allow-Headers": "Content-Type, X-API-Key, Authorization, X-Admin-Key, X-Profile",
+        "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
+    }
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(body, content_type=content_type)
+
+
 @app.after_request
 def add_cors_headers(response):
-    response.headers["Access-Control-Allow-Origin"] = os.environ.get("CORS_ALLOW_ORIGIN", "*")
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, X-API-Key, Authorization"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, DELETE, OPTIONS"
+    response.headers.update(cors_headers())
+    return response
+
+
+@app.after_request
+def observe_request_latency(response):
+    # Streaming responses are timed up to their headers; the body is still being generated.
+    started = g.get("request_started")
+    if started is not None:
+        metrics.REQUEST_LATENCY.labels(
+            endpoint=request_endpoint_label(), method=request.method, status=str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def finish_request_profile(response):
+    session = g.pop("profile", None)
+    if session is not None:
+        duration_ms = (time.perf_counter() - g.request_started) * 1000
+        name = profiler.finish(session, f"{request.method} {request_endpoint_label()}", duration_ms)
+        if name and has_valid_admin_key():
+            response.headers["X-Profile-Name"] = name
     return response
 
 
 if __name__ == "__main__":
+    start_background_workers()
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port, debug=os.environ.get("FLASK_DEBUG") == "1")
@@ -0,0 +1,207 @@
+"""ASGI entry point for the optional async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+The single and batch lookup routes are served natively on the event loop with
+AsyncPrizmClient, so slow upstream calls do not hold a thread each. SQLite
+access runs on a small dedicated thread pool. Every other route is passed
+through to the Flask app unchanged.
+
+Requires the packages in requirements-async.txt.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import Headers
+
+import app as prizm_app
+from prizm_client import AsyncPrizmClient, PrizmDeadlineExceeded, PrizmLookupError, normalize_postal_code
+
+logger = logging.getLogger(__name__)
+
+
+class PrizmASGIApp:
+    def __init__(self, flask_app: Any, client: Optional[AsyncPrizmClient] = None) -> None:
+        self.flask_app = flask_app
+        self.fallback = WsgiToAsgi(flask_app)
+        self.client = client
+        self.db_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("PRIZM_ASGI_DB_THREADS", "4")),
+            thread_name_prefix="prizm-db",
+        )
+        self.batch_concurrency = int(os.environ.get("PRIZM_ASYNC_BATCH_CONCURRENCY", "10"))
+        self.routes: Dict[tuple[str, str], Callable[..., Awaitable[tuple[int, Dict[str, Any]]]]] = {
+            ("GET", "/api/prizm"): self.single_lookup,
+            ("POST", "/api/prizm/batch"): self.batch_lookup,
+        }
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+
+        handler = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        headers = Headers([(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope.get("headers", [])])
+        if not prizm_app.api_key_is_valid(headers):
+            await self.send_json(send, 401, {"error": "Unauthorized"})
+            return
+
+        status, payload = await handler(scope, receive, headers)
+        await self.send_json(send, status, payload)
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.client is None:
+                    self.client = AsyncPrizmClient()
+                prizm_app.start_background_workers()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.client is not None:
+                    await self.client.aclose()
+                self.db_executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def send_json(self, send: Callable, status: int, payload: Dict[str, Any]) -> None:
+        body = f"{self.flask_app.json.dumps(payload)}\n".encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+        headers.extend((key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in prizm_app.cors_headers().items())
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def read_body(self, receive: Callable) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def run_db(self, func: Callable, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, functools.partial(func, *args))
+
+    async def get_prizm_code(
+        self,
+        postal_code: str,
+        endpoint: str = "single",
+        batch_id: Optional[str] = None,
+        budget_seconds: Optional[float] = None,
+        cache_read: Optional[tuple[Optional[Dict[str, Any]], Dict[str, int]]] = None,
+        pending_writes: Optional[list] = None,
+    ) -> Dict[str, Any]:
+        """`cache_read` is (cached data, timings) from a bulk read the caller already made;
+        `pending_writes` queues the cache write for the caller's write_cache_many."""
+        started = time.monotonic()
+        deadline = prizm_app.lookup_deadline(budget_seconds)
+        formatted_postal_code = normalize_postal_code(postal_code)
+        cache_key = formatted_postal_code or postal_code
+        if cache_read is None:
+            timings: Dict[str, int] = {}
+            cached_data = await self.run_db(functools.partial(prizm_app.read_cache, cache_key, timings=timings))
+        else:
+            cached_data, timings = cache_read[0], dict(cache_read[1])
+        if cached_data:
+            return await self.run_db(
+                prizm_app.cached_lookup_result, cache_key, cached_data, endpoint, batch_id, started, timings
+            )
+
+        source = "upstream" if formatted_postal_code else "validation"
+        payloads = prizm_app.upstream_payload_list()
+        try:
+            result = await self.client.lookup(postal_code, deadline=deadline, timings=timings, payloads=payloads)
+            should_cache = True
+        except PrizmDeadlineExceeded as exc:
+            logger.warning("PRIZM lookup for %s ran out of budget: %s", postal_code, exc)
+            should_cache = False
+            result, source = await self.run_db(prizm_app.deadline_fallback_result, cache_key, postal_code, exc)
+        except (PrizmLookupError, httpx.HTTPError) as exc:
+            logger.exception("PRIZM lookup failed for %s", postal_code)
+            should_cache = False
+            result, source = await self.run_db(prizm_app.lookup_failure_result, cache_key, postal_code, exc)
+
+        return await self.run_db(
+            prizm_app.finish_upstream_lookup,
+            cache_key,
+            result,
+            source,
+            should_cache,
+            endpoint,
+            batch_id,
+            started,
+            timings,
+            pending_writes,
+            payloads,
+        )
+
+    async def single_lookup(self, scope: Dict[str, Any], receive: Callable, headers: Headers) -> tuple[int, Dict[str, Any]]:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        postal_code = (query.get("postal_code") or [""])[0]
+        if not postal_code:
+            return 400, {"error": "postal_code is required"}
+        return 200, await self.get_prizm_code(
+            postal_code, endpoint="single", budget_seconds=prizm_app.request_budget_seconds(headers)
+        )
+
+    async def batch_lookup(self, scope: Dict[str, Any], receive: Callable, headers: Headers) -> tuple[int, Dict[str, Any]]:
+        try:
+            data = self.flask_app.json.loads(await self.read_body(receive) or b"{}")
+        except ValueError:
+            data = {}
+        postal_codes = data.get("postal_codes") if isinstance(data, dict) else None
+
+        error = prizm_app.batch_request_error(postal_codes)
+        if error:
+            return 400, {"error": error}
+
+        batch_id = str(uuid.uuid4())
+        budget_seconds = prizm_app.request_budget_seconds(headers)
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        postal_codes = [str(postal_code) for postal_code in postal_codes]
+        read_timings: Dict[str, int] = {}
+        cached = await self.run_db(
+            functools.partial(
+                prizm_app.read_cache_many,
+                [normalize_postal_code(postal_code) or postal_code for postal_code in postal_codes],
+                timings=read_timings,
+            )
+        )
+
+        async def lookup(postal_code: str, cached_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.get_prizm_code(
+                    postal_code,
+                    endpoint="batch",
+                    batch_id=batch_id,
+                    budget_seconds=budget_seconds,
+                    cache_read=(cached_data, read_timings),
+                    pending_writes=pending_writes,
+                )
+
+        pending_writes: list = []
+        try:
+            results = await asyncio.gather(
+                *(lookup(postal_code, cached_data) for postal_code, cached_data in zip(postal_codes, cached))
+            )
+        finally:
+            await self.run_db(prizm_app.write_cache_many, pending_writes)
+        return 200, prizm_app.batch_response(list(results))
+
+
+app = PrizmASGIApp(prizm_app.app)
@@ -0,0 +1,162 @@
+"""Background processing for queued batch lookup jobs.
+
+Jobs and their postal codes live in the cache database (`batch_jobs` and
+`batch_job_items`), so any web worker can pick up a job after a restart. A
+worker leases a job, looks up pending postal codes with bounded concurrency and
+checkpoints every chunk of results before renewing its lease. A job whose
+worker dies is reclaimed once its lease expires and resumes from the last
+checkpoint.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_RESULT_FIELDS = [
+    "index",
+    "input_postal_code",
+    "postal_code",
+    "status",
+    "message",
+    "segment_number",
+    "segment_name",
+    "segment_description",
+    "who_they_are",
+    "average_household_income",
+    "average_household_net_worth",
+    "average_household_net_worth_amount",
+    "education",
+    "urbanity",
+    "occupation",
+    "diversity",
+    "family_life",
+    "tenure",
+    "home_type",
+    "income_level",
+    "lifestage",
+    "social_group",
+    "official_language",
+    "population",
+    "households",
+    "percent_total_households",
+    "latitude",
+    "longitude",
+]
+
+
+class BatchJobRunner:
+    """Claims queued jobs from the cache database and processes them on daemon threads."""
+
+    def __init__(
+        self,
+        lookup: Callable[[str, str], Dict[str, Any]],
+        cache_manager: Any,
+        lookup_many: Optional[Callable[[list[str], str, Executor], list[Dict[str, Any]]]] = None,
+        workers: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        checkpoint_size: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        self.lookup = lookup
+        # Resolves a whole checkpoint chunk at once (one bulk cache read); falls back to `lookup` per code.
+        self.lookup_many = lookup_many
+        self.cache_manager = cache_manager
+        self.workers = workers or int(os.environ.get("PRIZM_JOB_WORKERS", "1"))
+        self.concurrency = concurrency or int(os.environ.get("PRIZM_JOB_CONCURRENCY", "4"))
+        self.checkpoint_size = checkpoint_size or int(os.environ.get("PRIZM_JOB_CHECKPOINT_SIZE", "20"))
+        self.lease_seconds = lease_seconds or int(os.environ.get("PRIZM_JOB_LEASE_SECONDS", "300"))
+        self.poll_interval = poll_interval or float(os.environ.get("PRIZM_JOB_POLL_SECONDS", "2"))
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self) -> None:
+        """Start the worker threads once per process; later calls only wake idle workers."""
+        with self._lock:
+            if not self._threads:
+                self._stop.clear()
+                for number in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"prizm-job-worker-{number}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                logger.info("Started %s batch job worker(s)", self.workers)
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout=5)
+            self._threads = []
+
+    def _worker_id(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def _run(self) -> None:
+        worker_id = self._worker_id()
+        while not self._stop.is_set():
+            job_id = self.cache_manager.claim_batch_job(worker_id, self.lease_seconds)
+            if not job_id:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.process_job(job_id, worker_id)
+
+    def process_job(self, job_id: str, worker_id: str) -> None:
+        """Work through a leased job chunk by chunk, checkpointing after each chunk."""
+        logger.info("Processing batch job %s on %s", job_id, worker_id)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                while not self._stop.is_set():
+                    items = self.cache_manager.get_pending_batch_job_items(job_id, self.checkpoint_size)
+                    if not items:
+                        break
+                    if self.lookup_many:
+                        lookups = self.lookup_many([postal_code for _, postal_code in items], job_id, executor)
+                        results = [(item_id, result) for (item_id, _), result in zip(items, lookups)]
+                    else:
+                        results = list(
+                            executor.map(lambda item: (item[0], self.lookup(item[1], job_id)), items)
+                        )
+                    if not self.cache_manager.checkpoint_batch_job(job_id, results):
+                        raise RuntimeError("Failed to checkpoint batch job results")
+                    if not self.cache_manager.renew_batch_job_lease(job_id, worker_id, self.lease_seconds):
+                        logger.warning("Lost lease on batch job %s; another worker will resume it", job_id)
+                        return
+        except Exception as exc:
+            logger.exception("Batch job %s failed", job_id)
+            self.cache_manager.finish_batch_job(job_id, "failed", error=str(exc))
+            return
+
+        if not self._stop.is_set():
+            self.cache_manager.finish_batch_job(job_id, "completed")
+            logger.info("Completed batch job %s", job_id)
+
+
+def job_results_ndjson(rows: Iterator[tuple[int, str, Optional[Dict[str, Any]]]]) -> Iterator[str]:
+    for index, postal_code, result in rows:
+        yield json.dumps({"index": index, "input_postal_code": postal_code, "result": result}, separators=(",", ":")) + "\n"
+
+
+def job_results_csv(rows: Iterator[tuple[int, str, Optional[Dict[str, Any]]]]) -> Iterator[str]:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=JOB_RESULT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for index, postal_code, result in rows:
+        writer.writerow({**(result or {}), "index": index, "input_postal_code": postal_code})
+        if output.tell() > 64 * 1024:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    yield output.getvalue()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Load benchmark for the PRIZM API against a local upstream stand-in.
+
+Starts fake_upstream.FakeUpstream and a gunicorn server for app:app backed by a
+fresh cache database, drives each scenario at every concurrency level, and
+writes throughput and latency percentiles as JSON:
+
+    python benchmark.py --concurrency 1,8,32 --duration 10 --output bench.json
+
+Compare against an earlier run; exits 1 if any scenario regressed by more than
+--threshold (p95 latency up, or throughput down):
+
+    python benchmark.py --baseline bench.json
+
+Use --url to benchmark a server that is already running. That server must be
+configured to use the fake upstream (PRIZM_GEOCODER_API_URL/PRIZM_SUPABASE_URL).
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from fake_upstream import FakeUpstream
+
+SCENARIOS = ("single_cold", "single_warm", "batch", "cache_entries", "export")
+FSA_LETTERS = "ABCEGHJKLMNPRSTVXY"
+LDU_LETTERS = "ABCEGHJKLMNPRSTVWXYZ"
+# The API's default MAX_BATCH_POSTAL_CODES; the local server runs with it.
+MAX_BATCH_SIZE = 10
+
+
+def percentile(sorted_values: list[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def latency_summary(latencies_ms: list[float]) -> Dict[str, Optional[float]]:
+    values = sorted(latencies_ms)
+    return {
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None,
+    }
+
+
+class PostalCodes:
+    """Thread-safe source of distinct, valid postal codes for cold-cache scenarios."""
+
+    def __init__(self, seed: int) -> None:
+        self.random = random.Random(seed)
+        self.seen: set[str] = set()
+        self.lock = threading.Lock()
+
+    def next(self) -> str:
+        with self.lock:
+            while True:
+                code = (
+                    f"{self.random.choice(FSA_LETTERS)}{self.random.randint(0, 9)}{self.random.choice(LDU_LETTERS)}"
+                    f"{self.random.randint(0, 9)}{self.random.choice(LDU_LETTERS)}{self.random.randint(0, 9)}"
+                )
+                if code not in self.seen:
+                    self.seen.add(code)
+                    return code
+
+
+def run_scenario(
+    base_url: str,
+    headers: Dict[str, str],
+    make_request: Callable[[requests.Session], requests.Response],
+    concurrency: int,
+    duration: float,
+    max_requests: Optional[int],
+) -> Dict[str, Any]:
+    """Run `make_request` from `concurrency` threads until the duration or request count is reached."""
+    latencies: list[float] = []
+    errors = 0
+    issued = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def claim() -> bool:
+        nonlocal issued
+        with lock:
+            if time.monotonic() >= stop_at or (max_requests is not None and issued >= max_requests):
+                return False
+            issued += 1
+            return True
+
+    def worker() -> None:
+        nonlocal errors
+        session = requests.Session()
+        session.headers.update(headers)
+        while claim():
+            started = time.perf_counter()
+            try:
+                response = make_request(session)
+                _ = response.content  # include body transfer in the measured latency
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+                errors += failed
+        session.close()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {key: round(value, 2) if value is not None else None for key, value in latency_summary(latencies).items()},
+    }
+
+
+def scenario_requests(base_url: str, warm_codes: list[str], postal_codes: PostalCodes, batch_size: int) -> Dict[str, Callable]:
+    return {
+        "single_cold": lambda session: session.get(f"{base_url}/api/prizm", params={"postal_code": postal_codes.next()}),
+        "single_warm": lambda session: session.get(f"{base_url}/api/prizm", params={"postal_code": random.choice(warm_codes)}),
+        "batch": lambda session: session.post(
+            f"{base_url}/api/prizm/batch",
+            json={"postal_codes": random.sample(warm_codes, batch_size // 2) + [postal_codes.next() for _ in range(batch_size - batch_size // 2)]},
+        ),
+        "cache_entries": lambda session: session.get(f"{base_url}/api/cache/entries", params={"limit": "500"}),
+        "export": lambda session: session.get(f"{base_url}/api/cache/export.csv"),
+    }
+
+
+def compare_to_baseline(results: list[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> list[Dict[str, Any]]:
+    """Pair results with the baseline by (scenario, concurrency) and flag p95 or throughput regressions."""
+    previous = {(row["scenario"], row["concurrency"]): row for row in baseline.get("results", [])}
+    comparisons = []
+    for row in results:
+        before = previous.get((row["scenario"], row["concurrency"]))
+        if not before:
+            continue
+        p95_before, p95_after = before["latency_ms"].get("p95"), row["latency_ms"].get("p95")
+        rps_before, rps_after = before.get("throughput_rps") or 0, row.get("throughput_rps") or 0
+        p95_change = (p95_after - p95_before) / p95_before if p95_before and p95_after is not None else None
+        rps_change = (rps_after - rps_before) / rps_before if rps_before else None
+        reasons = []
+        if p95_change is not None and p95_change > threshold:
+            reasons.append(f"p95 latency up {p95_change:.0%}")
+        if rps_change is not None and rps_change < -threshold:
+            reasons.append(f"throughput down {-rps_change:.0%}")
+        comparisons.append({
+            "scenario": row["scenario"],
+            "concurrency": row["concurrency"],
+            "p95_change": round(p95_change, 4) if p95_change is not None else None,
+            "throughput_change": round(rps_change, 4) if rps_change is not None else None,
+            "regression": bool(reasons),
+            "reasons": reasons,
+        })
+    return comparisons
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api_server(upstream_url: str, db_path: str, workers: int, threads: int) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "PRIZM_GEOCODER_API_URL": upstream_url,
+        "PRIZM_SUPABASE_URL": upstream_url,
+        "PRIZM_CACHE_DB_PATH": db_path,
+        "PRIZM_JOB_RUNNER": "0",
+        "GUNICORN_THREADS": str(threads),
+        "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="prizm-bench-metrics-"),
+    }
+    env.pop("PRIZM_API_KEY", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads), "app:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API server did not become healthy within 30 seconds")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PRIZM API against a local upstream stand-in")
+    parser.add_argument("--url", help="benchmark an already-running API instead of starting one")
+    parser.add_argument("--api-key", default=os.environ.get("PRIZM_API_KEY"), help="API key for --url targets")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario and concurrency level")
+    parser.add_argument("--requests", type=int, help="stop each run after this many requests")
+    parser.add_argument(
+        "--batch-size", type=int, default=MAX_BATCH_SIZE, help=f"postal codes per batch request, at most {MAX_BATCH_SIZE}"
+    )
+    parser.add_argument("--warm-codes", type=int, default=200, help="postal codes cached before the warm scenarios")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the local server")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker for the local server")
+    parser.add_argument("--latency-ms", type=float, default=40, help="median fake upstream latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        # Larger batches are rejected with a 400 and would only measure the validation path.
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH_SIZE} (the API's MAX_BATCH_POSTAL_CODES)")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    random.seed(args.seed)
+
+    upstream = None
+    server = None
+    tmpdir = tempfile.TemporaryDirectory(prefix="prizm-bench-")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            upstream = FakeUpstream(
+                latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, error_rate=args.error_rate, seed=args.seed
+            ).start()
+            server, base_url = start_api_server(
+                upstream.url, os.path.join(tmpdir.name, "bench.db"), args.workers, args.threads
+            )
+
+        headers = {"X-API-Key": args.api_key} if args.api_key else {}
+        postal_codes = PostalCodes(args.seed)
+        warm_codes = [postal_codes.next() for _ in range(max(args.warm_codes, args.batch_size))]
+        with requests.Session() as session:
+            session.headers.update(headers)
+            for start in range(0, len(warm_codes), MAX_BATCH_SIZE):
+                batch = warm_codes[start:start + MAX_BATCH_SIZE]
+                session.post(f"{base_url}/api/prizm/batch", json={"postal_codes": batch}).raise_for_status()
+
+        requests_by_scenario = scenario_requests(base_url, warm_codes, postal_codes, args.batch_size)
+        results = []
+        for scenario in scenarios:
+            for concurrency in levels:
+                run = run_scenario(base_url, headers, requests_by_scenario[scenario], concurrency, args.duration, args.requests)
+                results.append({"scenario": scenario, "concurrency": concurrency, **run})
+                print(
+                    f"{scenario:>14} c={concurrency:<4} {run['throughput_rps']:>9.1f} req/s  "
+                    f"p50={run['latency_ms']['p50']}ms p95={run['latency_ms']['p95']}ms errors={run['errors']}",
+                    file=sys.stderr,
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if upstream is not None:
+            upstream.stop()
+        tmpdir.cleanup()
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "target": args.url or "local",
+            "workers": args.workers,
+            "threads": args.threads,
+            "duration_s": args.duration,
+            "batch_size": args.batch_size,
+            "upstream": {"latency_ms": args.latency_ms, "latency_sigma": args.latency_sigma, "error_rate": args.error_rate},
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            comparisons = compare_to_baseline(results, json.load(handle), args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "results": comparisons}
+        regressed = any(row["regression"] for row in comparisons)
+        for row in comparisons:
+            if row["regression"]:
+                print(f"REGRESSION {row['scenario']} c={row['concurrency']}: {', '.join(row['reasons'])}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""Storage backend interface for the postal code cache.
+
+The lookup path, cache admin routes and dashboard in app.py read and write
+cached results through this interface only: point and bulk get/put, delete,
+scan, stats, confirmation, dashboard queries and lookup events.
+`CacheManager` (SQLite, cache_manager_new.py) implements it, as does
+`LMDBCacheBackend` (lmdb_cache.py), a memory-mapped key-value store tuned for
+point lookups, and `PostgresCacheBackend` (postgres_cache.py), a server
+database shared by several instances. PRIZM_CACHE_BACKEND picks the engine.
+
+Every backend normalizes a lookup result into the same stored fields here and
+builds responses from those fields here, so a cached postal code reads back
+identically from any engine. `test_prizm_api.CacheBackendConformance` runs the
+same checks against every backend.
+"""
+
+import csv
+import io
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from metrics import timed_db
+from segment_net_worth import average_household_net_worth, average_household_net_worth_amount
+
+# Lookup stages timed per event, stored as `<stage>_ms` columns on lookup_events.
+LOOKUP_STAGES = ("cache_read", "rural", "geocoder", "segment", "cache_write")
+
+# Lookup event endpoints of the background workers that refresh cache rows. Their lookups do not count
+# towards a postal code's popularity, nor as request-path hits or misses.
+BACKGROUND_ENDPOINTS = ("refresh", "resegment")
+
+# Stored per cached postal code (postal_code_cache columns); geography and attributes are kept separately.
+# vintage and source record what produced the row: the geocoder vintage, and "geocoder", "rural" or "import".
+ENTRY_FIELDS = (
+    "segment_number",
+    "segment_name",
+    "segment_description",
+    "who_they_are",
+    "average_household_income",
+    "education",
+    "urbanity",
+    "average_household_net_worth",
+    "average_household_net_worth_amount",
+    "average_household_income_display",
+    "average_household_net_worth_display",
+    "occupation",
+    "diversity",
+    "family_life",
+    "tenure",
+    "home_type",
+    "income_level",
+    "lifestage",
+    "social_group",
+    "official_language",
+    "population",
+    "households",
+    "percent_total_households",
+    "latitude",
+    "longitude",
+    "message",
+    "geocoder_found",
+    "status",
+    "vintage",
+    "source",
+)
+
+# Fields stored as text whatever type the lookup result used (the TEXT columns in SQLite).
+TEXT_FIELDS = {
+    "segment_number",
+    "segment_name",
+    "segment_description",
+    "who_they_are",
+    "education",
+    "urbanity",
+    "occupation",
+    "diversity",
+    "family_life",
+    "tenure",
+    "home_type",
+    "income_level",
+    "lifestage",
+    "social_group",
+    "official_language",
+    "population",
+    "households",
+    "percent_total_households",
+    "message",
+    "vintage",
+    "source",
+}
+
+# (postal_code, lookup result) pairs, as taken by cache_many.
+CacheEntry = Tuple[str, Dict[str, Any]]
+# Cache duration in days for a lookup result, e.g. app.cache_duration_for_result.
+DurationPolicy = Callable[[Dict[str, Any]], int]
+
+
+class CacheBackend(ABC):
+    """Cache storage used by the lookup path; implementations must pass the conformance tests."""
+
+    cache_duration_days: int
+
+    @abstractmethod
+    def get_cached_data(self, postal_code: str, include_expired: bool = False) -> Optional[Dict[str, Any]]:
+        """The cached response for a postal code, with `_cache_info`; None on a miss or expired entry."""
+
+    @abstractmethod
+    def cache_data(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        custom_duration_days: Optional[int] = None,
+        html_content: Optional[str] = None,
+    ) -> bool:
+        """Store (or replace) a lookup result; returns False if it could not be written."""
+
+    @abstractmethod
+    def delete_cached_data(self, postal_code: str) -> bool:
+        """Remove a postal code; returns whether it was cached."""
+
+    @abstractmethod
+    def iter_cache_entries(self, include_expired: bool = False, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Every cached response (without `_cache_info`) in postal code order."""
+
+    @abstractmethod
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """At least total_entries, valid_entries, expired_entries, status_breakdown and lookup_events."""
+
+    @abstractmethod
+    def record_lookup_event(
+        self,
+        postal_code: str,
+        status: str,
+        source: str,
+        endpoint: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        message: Optional[str] = None,
+        from_cache: bool = False,
+        duration_ms: Optional[int] = None,
+        stage_timings: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Record a lookup attempt; stage_timings maps LOOKUP_STAGES to ms."""
+
+    @abstractmethod
+    def iter_lookup_events(self, days: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Recorded lookup events, oldest first, optionally only those from the last `days` days."""
+
+    def get_cached_many(self, postal_codes: Iterable[str], include_expired: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Cached responses keyed by normalized postal code; misses are left out."""
+        results = {}
+        for postal_code in postal_codes:
+            cached = self.get_cached_data(postal_code, include_expired=include_expired)
+            if cached is not None:
+                results[self.normalize_postal_code(postal_code)] = cached
+        return results
+
+    def cache_many(
+        self,
+        entries: Iterable[CacheEntry],
+        custom_duration_days: Optional[int] = None,
+        duration_policy: Optional[DurationPolicy] = None,
+    ) -> int:
+        """Store several lookup results; returns how many were written.
+
+        Each entry is cached for duration_policy(result) days when a policy is given, else for
+        custom_duration_days, else for the backend's default duration.
+        """
+        return sum(
+            1
+            for postal_code, data in entries
+            if self.cache_data(postal_code, data, self._duration_days(data, custom_duration_days, duration_policy))
+        )
+
+    def is_cached(self, postal_code: str) -> bool:
+        return self.get_cached_data(postal_code) is not None
+
+    def close(self) -> None:
+        """Release handles held open between calls (none by default)."""
+
+    @abstractmethod
+    def clear_cache(self) -> bool:
+        """Remove every cached postal code."""
+
+    @abstractmethod
+    def confirm_data(self, postal_code: str) -> bool:
+        """Mark an unexpired entry as checked by a person; returns whether there was one."""
+
+    @abstractmethod
+    def unconfirm_data(self, postal_code: str) -> bool:
+        """Clear an unexpired entry's confirmed flag; returns whether there was one."""
+
+    @abstractmethod
+    def get_unconfirmed_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Unconfirmed unexpired success entries, newest first."""
+
+    @abstractmethod
+    def get_cached_html(self, postal_code: str) -> Optional[str]:
+        """The upstream HTML stored with an unexpired entry, if any."""
+
+    @abstractmethod
+    def delete_expired_batch(self, batch_size: int = 500) -> int:
+        """Delete up to batch_size expired entries; returns how many were deleted."""
+
+    @abstractmethod
+    def list_cache_entries(
+        self,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0,
+        include_expired: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Dashboard rows (responses plus cached_at, expires_at, confirmed), newest first."""
+
+    @abstractmethod
+    def get_daily_cache_counts(self, days: int = 14) -> List[Dict[str, Any]]:
+        """Entries first cached (or re-cached with a new segment) per day over the last `days` days, newest day first."""
+
+    @abstractmethod
+    def get_lookup_event_summary(self, days: int = 7) -> Dict[str, Any]:
+        """Lookup event counts, by_day and stage_latency_ms over the last `days` days."""
+
+    def get_dashboard_summary(self, events: Optional["CacheBackend"] = None) -> Dict[str, Any]:
+        """Dashboard figures; lookup event figures come from `events` when another store records them."""
+        return {
+            "cache_stats": self.get_cache_stats(),
+            "daily_cache_counts": self.get_daily_cache_counts(30),
+            "lookup_events_7d": (events or self).get_lookup_event_summary(7),
+            "recent_failures": self.list_cache_entries(status="error", limit=50),
+        }
+
+    @timed_db
+    def export_cache_csv(self, include_expired: bool = False) -> str:
+        rows = self.list_cache_entries(limit=5000, include_expired=include_expired)
+        output = io.StringIO()
+        fieldnames = [
+            "postal_code",
+            "status",
+            "message",
+            "segment_number",
+            "segment_name",
+            "segment_description",
+            "who_they_are",
+            "average_household_income",
+            "average_household_net_worth",
+            "average_household_net_worth_amount",
+            "education",
+            "urbanity",
+            "occupation",
+            "diversity",
+            "family_life",
+            "tenure",
+            "home_type",
+            "income_level",
+            "lifestage",
+            "social_group",
+            "official_language",
+            "population",
+            "households",
+            "percent_total_households",
+            "latitude",
+            "longitude",
+            "cached_at",
+            "expires_at",
+            "confirmed",
+        ]
+        writer = csv.DictWriter(output, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, "") for field in fieldnames})
+        return output.getvalue()
+
+    def _duration_days(
+        self,
+        data: Dict[str, Any],
+        custom_duration_days: Optional[int] = None,
+        duration_policy: Optional[DurationPolicy] = None,
+    ) -> int:
+        if duration_policy is not None:
+            return duration_policy(data)
+        return custom_duration_days if custom_duration_days is not None else self.cache_duration_days
+
+    def _latency_percentiles(self, values: List[List[int]]) -> Dict[str, Dict[str, Optional[int]]]:
+        """Nearest-rank p50/p95/p99 per lookup stage, from each stage's timings in LOOKUP_STAGES order."""
+        stages = {}
+        for stage, stage_values in zip(LOOKUP_STAGES, values):
+            stage_values.sort()
+            count = len(stage_values)
+            stats: Dict[str, Optional[int]] = {"count": count}
+            for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+                stats[name] = stage_values[max(0, math.ceil(fraction * count) - 1)] if count else None
+            stages[stage] = stats
+        return stages
+
+    def normalize_postal_code(self, postal_code: str) -> str:
+        """The key a postal code is cached under: A1A 1A1 when valid, else trimmed and upper-cased."""
+        compact = (postal_code or "").strip().upper().replace(" ", "")
+        if len(compact) == 6 and re.fullmatch(r"[A-Z]\d[A-Z]\d[A-Z]\d", compact):
+            return f"{compact[:3]} {compact[3:]}"
+        return (postal_code or "").strip().upper()
+
+    def _parse_currency_to_int(self, value: Optional[Any]) -> Optional[Any]:
+        """Convert simple currency strings to integers; keep ranges as text."""
+        if value is None or value == "" or value == "Unknown":
+            return None
+        if isinstance(value, (int, float)):
+            return int(value)
+
+        cleaned = re.sub(r"[$,\s]", "", str(value))
+        try:
+            return int(float(cleaned))
+        except (ValueError, TypeError):
+            return str(value).strip()
+
+    def _format_currency_from_int(self, value: Optional[Any]) -> Optional[str]:
+        """Convert integer 95199 to '$95,199'; return range labels unchanged."""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value if value.startswith("$") else f"${value}"
+        return f"${int(value):,}"
+
+    def _normalize_status(self, status: Optional[str]) -> str:
+        """Normalize status values to 'success', 'error', or 'invalid'."""
+        if not status:
+            return "error"
+        status_lower = status.lower()
+        if "success" in status_lower:
+            return "success"
+        if "invalid" in status_lower and "format" in status_lower:
+            return "invalid"
+        if status_lower == "invalid":
+            return "invalid"
+        return "error"
+
+    def _blank_to_none(self, value: Any) -> Optional[Any]:
+        if value is None:
+            return None
+        if isinstance(value, str) and value.strip() == "":
+            return None
+        return value
+
+    def _currency_values(self, data: Dict[str, Any]) -> tuple:
+        """Parse and format the currency fields once, at write time.
+
+        Returns (income, income display, net worth, net worth display, net worth amount). Net worth
+        follows the per-segment table whenever the segment is known, as API responses always have.
+        """
+        income = self._parse_currency_to_int(data.get("average_household_income"))
+        net_worth = self._parse_currency_to_int(data.get("average_household_net_worth"))
+        amount = self._parse_currency_to_int(data.get("average_household_net_worth_amount"))
+        if isinstance(amount, str):
+            amount = None
+        segment_number = data.get("segment_number")
+        known_amount = average_household_net_worth_amount(segment_number)
+        if known_amount is not None:
+            amount = known_amount
+        net_worth_display = self._format_currency_from_int(net_worth) or average_household_net_worth(segment_number) or None
+        return income, self._format_currency_from_int(income), net_worth, net_worth_display, amount
+
+    def _entry_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize a lookup result into the ENTRY_FIELDS values a backend stores."""
+        fields = {}
+        for name in TEXT_FIELDS:
+            value = self._blank_to_none(data.get(name))
+            fields[name] = value if value is None or isinstance(value, str) else str(value)
+        for name in ("latitude", "longitude"):
+            value = data.get(name)
+            try:
+                fields[name] = float(value) if value is not None else None
+            except (TypeError, ValueError):
+                fields[name] = value
+        (
+            fields["average_household_income"],
+            fields["average_household_income_display"],
+            fields["average_household_net_worth"],
+            fields["average_household_net_worth_display"],
+            fields["average_household_net_worth_amount"],
+        ) = self._currency_values(data)
+        fields["geocoder_found"] = data.get("geocoder_found")
+        fields["status"] = self._normalize_status(data.get("status"))
+        return fields
+
+    def _response_from_fields(
+        self,
+        fields: Mapping[str, Any],
+        geography: Optional[Any] = None,
+        attributes: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        """Build the API response for stored fields (an sqlite3.Row or a dict with the ENTRY_FIELDS keys)."""
+        data = {
+            "postal_code": fields["postal_code"],
+            "segment_number": fields["segment_number"],
+            "segment_name": fields["segment_name"],
+            "segment_description": fields["segment_description"],
+            "who_they_are": fields["who_they_are"],
+            # Display strings are formatted once at write time; only older rows fall back to formatting here.
+            "average_household_income": fields["average_household_income_display"]
+            or self._format_currency_from_int(fields["average_household_income"]),
+            "education": fields["education"],
+            "urbanity": fields["urbanity"],
+            "average_household_net_worth": fields["average_household_net_worth_display"]
+            or self._format_currency_from_int(fields["average_household_net_worth"]),
+            "average_household_net_worth_amount": fields["average_household_net_worth_amount"],
+            "occupation": fields["occupation"],
+            "diversity": fields["diversity"],
+            "family_life": fields["family_life"],
+            "tenure": fields["tenure"],
+            "home_type": fields["home_type"],
+            "income_level": fields["income_level"],
+            "lifestage": fields["lifestage"],
+            "social_group": fields["social_group"],
+            "official_language": fields["official_language"],
+            "population": fields["population"],
+            "households": fields["households"],
+            "percent_total_households": fields["percent_total_households"],
+            "latitude": fields["latitude"],
+            "longitude": fields["longitude"],
+            "geography": geography,
+            "attributes": attributes,
+            "message": fields["message"],
+            "geocoder_found": bool(fields["geocoder_found"]) if fields["geocoder_found"] is not None else None,
+            "status": fields["status"],
+            "vintage": fields["vintage"],
+            "source": fields["source"],
+        }
+        return {k: v for k, v in data.items() if v is not None}
+
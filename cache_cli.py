@@ -5,9 +5,16 @@ CLI tool for managing the PRIZM API cache
 
 import argparse
 import csv
+import itertools
 import json
 import sys
-from cache_manager_new import cache_manager
+from cache_janitor import CacheJanitor
+from cache_manager_new import cache_manager, cache_store
+from payload_store import payload_store
+from prizm_client import BasePrizmClient
+from refresh_ahead import RefreshAheadWorker
+from reporting_snapshot import ReportingSnapshot
+from resegment_worker import ResegmentWorker
 
 
 IMPORT_FIELDS = [
@@ -26,13 +33,40 @@ IMPORT_FIELDS = [
     "tenure",
     "home_type",
     "status",
+    "vintage",
 ]
 
 
+IMPORT_CHUNK = 1000
+
+
 def import_csv(path, success_days, invalid_days, error_days, replace):
     imported = 0
     skipped = 0
     failed = 0
+    durations = {"success": success_days, "invalid": invalid_days}
+    # Rows are written with cache_store.cache_many, IMPORT_CHUNK rows per write transaction
+    # (a single COPY on Postgres); the duration policy picks each row's cache duration.
+    pending = []
+
+    def duration_for(data):
+        return durations.get(data["status"], error_days)
+
+    def flush():
+        nonlocal imported, skipped, failed
+        entries = pending[:]
+        pending.clear()
+        if not replace:
+            cached = cache_store.get_cached_many(postal_code for postal_code, _ in entries)
+            skipped += sum(1 for postal_code, _ in entries if cache_store.normalize_postal_code(postal_code) in cached)
+            entries = [
+                (postal_code, data)
+                for postal_code, data in entries
+                if cache_store.normalize_postal_code(postal_code) not in cached
+            ]
+        written = cache_store.cache_many(entries, duration_policy=duration_for) if entries else 0
+        imported += written
+        failed += len(entries) - written
 
     with open(path, newline="", encoding="utf-8-sig") as handle:
         reader = csv.DictReader(handle)
@@ -42,29 +76,60 @@ def import_csv(path, success_days, invalid_days, error_days, replace):
                 skipped += 1
                 continue
 
-            if not replace and cache_manager.is_cached(postal_code):
-                skipped += 1
-                continue
-
             status = (row.get("status") or "error").strip().lower()
             data = {field: (row.get(field) or "").strip() for field in IMPORT_FIELDS}
             data["status"] = status
+            data["source"] = "import"
 
-            if status == "success":
-                duration_days = success_days
-            elif status == "invalid":
-                duration_days = invalid_days
-            else:
-                duration_days = error_days
+            pending.append((postal_code, data))
+            if len(pending) >= IMPORT_CHUNK:
+                flush()
 
-            if cache_manager.cache_data(postal_code, data, custom_duration_days=duration_days):
-                imported += 1
-            else:
-                failed += 1
+    flush()
 
     return imported, skipped, failed
 
 
+def rederive(vintage, success_days, invalid_days, error_days):
+    """Rebuild cache rows from the stored upstream payloads of one geocoder vintage, without calling upstream.
+
+    Postal codes without stored payloads are left alone; those whose segment row was never stored count as missing.
+    """
+    client = BasePrizmClient(geocoder_vintage=vintage)
+    segments = payload_store.get_payloads(client.geocoder_vintage, "segment")
+    durations = {"success": success_days, "invalid": invalid_days}
+    rebuilt = 0
+    missing = 0
+    failed = 0
+    pending = []
+
+    def duration_for(data):
+        return durations.get(data["status"], error_days)
+
+    def flush():
+        nonlocal rebuilt, failed
+        written = cache_store.cache_many(pending, duration_policy=duration_for)
+        rebuilt += written
+        failed += len(pending) - written
+        pending.clear()
+
+    rows = payload_store.iter_payloads(client.geocoder_vintage, ("geocoder", "rural"))
+    for postal_code, group in itertools.groupby(rows, key=lambda row: row[0]):
+        payloads = {endpoint: payload for _, endpoint, payload in group}
+        result = client.response_from_payloads(postal_code, payloads.get("rural"), payloads.get("geocoder"), segments)
+        if result is None:
+            missing += 1
+            continue
+        pending.append((postal_code, result))
+        if len(pending) >= IMPORT_CHUNK:
+            flush()
+
+    if pending:
+        flush()
+
+    return rebuilt, missing, failed
+
+
 def main():
     parser = argparse.ArgumentParser(description="Manage PRIZM API cache")
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
@@ -73,7 +138,8 @@ def main():
     subparsers.add_parser('stats', help='Show cache statistics')
     
     # Cleanup command
-    subparsers.add_parser('cleanup', help='Clean up expired cache entries')
+    cleanup_parser = subparsers.add_parser('cleanup', help='Clean up expired cache entries')
+    cleanup_parser.add_argument('--batch-size', type=int, default=500, help='Expired entries deleted per transaction')
     
     # Clear command
     clear_parser = subparsers.add_parser('clear', help='Clear all cache entries')
@@ -115,6 +181,48 @@ def main():
     import_parser.add_argument('--invalid-days', type=int, default=90, help='Cache duration for invalid postal codes')
     import_parser.add_argument('--error-days', type=int, default=30, help='Cache duration for non-quota error results')
     import_parser.add_argument('--replace', action='store_true', help='Replace existing valid cache entries')
+
+    # Re-derive command
+    rederive_parser = subparsers.add_parser('rederive', help='Rebuild cache rows from stored upstream payloads')
+    rederive_parser.add_argument('--vintage', default=None, help='Geocoder vintage to rebuild from (default: PRIZM_GEOCODER_VINTAGE)')
+    rederive_parser.add_argument('--success-days', type=int, default=3650, help='Cache duration for successful lookups')
+    rederive_parser.add_argument('--invalid-days', type=int, default=90, help='Cache duration for invalid postal codes')
+    rederive_parser.add_argument('--error-days', type=int, default=30, help='Cache duration for postal codes without a segment')
+
+    # Vintage commands
+    tag_parser = subparsers.add_parser('tag-vintage', help='Record a geocoder vintage on cache rows that have none')
+    tag_parser.add_argument('--vintage', default=None, help='Vintage to record (default: PRIZM_GEOCODER_VINTAGE)')
+    tag_parser.add_argument('--batch-size', type=int, default=10000, help='Rows tagged per transaction')
+
+    resegment_parser = subparsers.add_parser('resegment', help='Look up cache rows from an older geocoder vintage again')
+    resegment_parser.add_argument('--batch-size', type=int, default=None, help='Postal codes looked up per batch')
+    resegment_parser.add_argument('--include-untagged', action='store_true', help='Also look up rows without a vintage')
+
+    refresh_parser = subparsers.add_parser('refresh-ahead', help='Refresh popular cache entries that are about to expire')
+    refresh_parser.add_argument('--lookups-per-hour', type=int, default=None, help='Upstream budget (default: PRIZM_REFRESH_AHEAD_LOOKUPS_PER_HOUR or 600)')
+
+    # Columnar export command
+    export_parser = subparsers.add_parser('export', help='Export the cache or lookup events as Parquet or Arrow')
+    export_parser.add_argument('output', help='File to write')
+    export_parser.add_argument('--table', choices=['cache', 'events'], default='cache')
+    export_parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    export_parser.add_argument('--valid-only', action='store_true', help='Skip expired cache entries')
+    export_parser.add_argument('--batch-size', type=int, default=50000, help='Rows per record batch')
+
+    # FSA index command
+    subparsers.add_parser('rebuild-fsa-index', help='Recount PRIZM segments per FSA from the cache')
+
+    # Spatial index and vacuum commands
+    subparsers.add_parser('rebuild-spatial-index', help='Re-key the nearby R*Tree after an outside VACUUM')
+    subparsers.add_parser('vacuum', help='VACUUM the cache database into auto_vacuum=INCREMENTAL and rebuild the R*Tree')
+
+    # Lookup event rollup command
+    rollup_parser = subparsers.add_parser('rollup-events', help='Roll old lookup events into daily aggregates')
+    rollup_parser.add_argument('--retention-days', type=int, default=None, help='Days of raw events to keep (default: PRIZM_EVENT_RETENTION_DAYS or 30)')
+    rollup_parser.add_argument('--batch-size', type=int, default=5000, help='Events aggregated and deleted per transaction')
+
+    # Reporting snapshot command
+    subparsers.add_parser('refresh-snapshot', help='Copy the cache database into the reporting snapshot now')
     
     args = parser.parse_args()
     
@@ -143,10 +251,20 @@ def main():
             print(f"  Database size: {stats.get('database_size_bytes', 0):,} bytes")
             print(f"  Oldest entry: {stats.get('oldest_entry', 'N/A')}")
             print(f"  Newest entry: {stats.get('newest_entry', 'N/A')}")
+            print(f"  Lookup events (approx.): {stats.get('lookup_events', 0):,}")
+            print(f"  Rolled-up lookup events: {stats.get('lookup_events_rolled_up', 0):,}")
             
         elif args.command == 'cleanup':
-            deleted_count = cache_manager.cleanup_expired_cache()
-            print(f"Cleaned up {deleted_count} expired cache entries")
+            janitor = CacheJanitor(cache_manager, batch_size=args.batch_size)
+            progress = janitor.run_once(
+                on_progress=lambda p: print(f"  deleted {p['deleted']} expired entries ({p['batches']} batches)", end='\r')
+            )
+            if progress.get('skipped_at'):
+                print("Another process is already cleaning the cache")
+                return 1
+            print()
+            print(f"Cleaned up {progress['deleted']} expired cache entries")
+            print(f"Rolled up {progress['rolled_up_events']} lookup events, freed {progress['freed_pages']} pages")
             
         elif args.command == 'clear':
             if not args.confirm:
@@ -268,6 +386,113 @@ def main():
             print(f"Imported {imported} rows, skipped {skipped}, failed {failed}")
             if failed:
                 return 1
+
+        elif args.command == 'rederive':
+            rebuilt, missing, failed = rederive(
+                args.vintage,
+                success_days=args.success_days,
+                invalid_days=args.invalid_days,
+                error_days=args.error_days,
+            )
+            print(f"Rebuilt {rebuilt} cache rows, {missing} postal codes without stored payloads, failed {failed}")
+            if failed:
+                return 1
+
+        elif args.command == 'tag-vintage':
+            vintage = BasePrizmClient(geocoder_vintage=args.vintage).geocoder_vintage
+            tagged = cache_manager.tag_untagged_entries(vintage, batch_size=args.batch_size)
+            print(f"Tagged {tagged} cache rows with vintage {vintage}")
+
+        elif args.command == 'resegment':
+            import app
+
+            worker = ResegmentWorker(
+                cache_manager,
+                lambda postal_codes: app.background_lookups(postal_codes, 'resegment'),
+                lambda: app.prizm_client.geocoder_vintage,
+                batch_size=args.batch_size,
+                include_untagged=args.include_untagged or None,
+            )
+            progress = worker.run_once(
+                on_progress=lambda p: print(f"  looked up {p['looked_up']} of {p['outdated']} postal codes", end='\r')
+            )
+            if progress.get('skipped_at'):
+                print("Another process is already re-segmenting the cache")
+                return 1
+            print()
+            print(f"Looked up {progress['looked_up']} postal codes, {progress['updated']} now on vintage {progress['vintage']}")
+            if progress.get('error'):
+                print(f"Error: {progress['error']}")
+                return 1
+
+        elif args.command == 'refresh-ahead':
+            import app
+
+            worker = RefreshAheadWorker(
+                cache_manager,
+                lambda postal_codes: app.background_lookups(postal_codes, 'refresh'),
+                lookups_per_hour=args.lookups_per_hour,
+            )
+            progress = worker.run_once(
+                on_progress=lambda p: print(f"  refreshed {p['refreshed']} of {p['looked_up']} postal codes", end='\r')
+            )
+            if progress.get('skipped_at'):
+                print("Another process is already refreshing the cache")
+                return 1
+            print()
+            print(f"Refreshed {progress['refreshed']} of {progress['looked_up']} popular postal codes")
+            if progress['budget_exhausted']:
+                print("Stopped at the hourly upstream budget")
+            if progress.get('error'):
+                print(f"Error: {progress['error']}")
+                return 1
+
+        elif args.command == 'export':
+            import analytics_export
+
+            table = analytics_export.TABLES[args.table]
+            rows = analytics_export.write_export(
+                cache_manager,
+                table,
+                args.format,
+                args.output,
+                batch_size=args.batch_size,
+                include_expired=not args.valid_only,
+            )
+            print(f"Wrote {rows} {table} rows to {args.output}")
+
+        elif args.command == 'rebuild-fsa-index':
+            fsa_count = cache_manager.rebuild_fsa_index()
+            print(f"Indexed segment distributions for {fsa_count} FSAs")
+
+        elif args.command == 'rebuild-spatial-index':
+            indexed = cache_manager.rebuild_spatial_index()
+            print(f"Indexed coordinates for {indexed} cache entries")
+
+        elif args.command == 'vacuum':
+            result = cache_manager.vacuum()
+            if result.get('error'):
+                print(f"Error: {result['error']}")
+                return 1
+            print(f"Vacuumed {result['size_before']:,} bytes down to {result['size_after']:,}")
+            print(f"Indexed coordinates for {result['spatial_indexed']} cache entries")
+
+        elif args.command == 'rollup-events':
+            result = cache_manager.rollup_lookup_events(args.retention_days, batch_size=args.batch_size)
+            print(f"Rolled up {result['rolled_up']} lookup events in {result['batches']} batches")
+            if result.get('error'):
+                print(f"Error: {result['error']}")
+                return 1
+
+        elif args.command == 'refresh-snapshot':
+            result = ReportingSnapshot(cache_manager).refresh()
+            if result['status'] == 'skipped':
+                print("Another worker is refreshing the reporting snapshot")
+            elif result['status'] == 'error':
+                print(f"Error: {result['error']}")
+                return 1
+            else:
+                print(f"Copied {result['pages']} pages to {result['path']} in {result['duration_ms']}ms")
                 
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,85 @@
+"""Background cleanup of expired cache entries.
+
+The janitor deletes expired `postal_code_cache` rows in small batches in
+`expires_at` order, pausing between batches so cache writes and lookup events
+from other workers can get the write lock. The deletes go to `store`, the cache
+backend in use; the rest of the pass works on the SQLite cache database. After the deletes it rolls old
+lookup events into daily aggregates, rebuilds the per-FSA segment index, then
+runs `incremental_vacuum` and `optimize`. It is a `LeasedWorker`: one worker
+runs a pass at a time, and every worker reports that pass's progress. Each
+worker runs a pass every PRIZM_JANITOR_INTERVAL_SECONDS, and `trigger()` starts
+one straight away.
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from leased_worker import LeasedWorker
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "cache_janitor"
+
+
+class CacheJanitor(LeasedWorker):
+    """Runs batched expired-entry cleanup and database maintenance on a daemon thread."""
+
+    LEASE_NAME = LEASE_NAME
+    THREAD_NAME = "prizm-cache-janitor"
+    DESCRIPTION = "Cache janitor"
+    IDLE_FIELDS = {"phase": None}
+
+    def __init__(
+        self,
+        cache_manager: Any,
+        batch_size: Optional[int] = None,
+        pause_ms: Optional[float] = None,
+        interval_seconds: Optional[float] = None,
+        vacuum_pages: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        store: Optional[Any] = None,
+    ) -> None:
+        super().__init__(
+            cache_manager,
+            interval_seconds or float(os.environ.get("PRIZM_JANITOR_INTERVAL_SECONDS", "3600")),
+            lease_seconds or int(os.environ.get("PRIZM_JANITOR_LEASE_SECONDS", "300")),
+        )
+        self.batch_size = batch_size or int(os.environ.get("PRIZM_JANITOR_BATCH_SIZE", "500"))
+        self.pause = (pause_ms if pause_ms is not None else float(os.environ.get("PRIZM_JANITOR_PAUSE_MS", "50"))) / 1000
+        self.vacuum_pages = vacuum_pages or int(os.environ.get("PRIZM_JANITOR_VACUUM_PAGES", "1000"))
+        self.store = store or cache_manager
+
+    def _pass_fields(self) -> Dict[str, Any]:
+        return {"phase": "expired", "deleted": 0, "batches": 0, "rolled_up_events": 0, "fsa_indexed": 0, "freed_pages": 0}
+
+    def _run_pass(self, fields: Dict[str, Any], on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        total = batches = 0
+        while not self._stop.is_set():
+            deleted = self.store.delete_expired_batch(self.batch_size)
+            total += deleted
+            batches += 1
+            self._update(deleted=total, batches=batches)
+            if on_progress:
+                on_progress(self.progress())
+            if deleted < self.batch_size:
+                break
+            self._renew()
+            # Give other connections a turn at the write lock between batches.
+            self._stop.wait(self.pause)
+
+        self._update(phase="rollup")
+        rollup = self.cache_manager.rollup_lookup_events(batch_size=self.batch_size * 10, pause_seconds=self.pause)
+        self._update(rolled_up_events=rollup.get("rolled_up", 0), phase="fsa_index")
+        self._update(fsa_indexed=self.cache_manager.rebuild_fsa_index(), phase="vacuum")
+        maintenance = self.cache_manager.run_maintenance(self.vacuum_pages)
+        self._update(
+            freed_pages=maintenance.get("freed_pages", 0),
+            error=rollup.get("error") or maintenance.get("error"),
+        )
+        logger.info(
+            "Cache janitor deleted %s expired entries in %s batches, rolled up %s events",
+            total,
+            batches,
+            rollup.get("rolled_up", 0),
+        )
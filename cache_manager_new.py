@@ -5,77 +5,123 @@ Stores postal code data locally to reduce API calls to the PRIZM upstream servic
 and to support dashboard/reporting metrics.
 """
 
-import csv
-import io
+import gzip
 import json
 import logging
+import math
 import os
-import re
 import sqlite3
+import time
+import uuid
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+from cache_backend import BACKGROUND_ENDPOINTS, ENTRY_FIELDS, LOOKUP_STAGES, CacheBackend, CacheEntry, DurationPolicy
+from lazy import LazyObject
+from metrics import timed_db
+from segment_net_worth import AVERAGE_HOUSEHOLD_NET_WORTH_BY_SEGMENT, average_household_net_worth
+
+try:
+    import fcntl
+except ImportError:  # Windows; migrations are then only serialized by SQLite itself
+    fcntl = None
+
+try:
+    import lmdb_cache
+except ImportError:  # optional embedded key-value backend (requirements-lmdb.txt)
+    lmdb_cache = None
+
+try:
+    import postgres_cache
+except ImportError:  # optional shared server-database backend (requirements-postgres.txt)
+    postgres_cache = None
 
 logger = logging.getLogger(__name__)
 
+# What a cached response is built from: everything but the HTML blob, which is only checked for presence.
+CACHED_RESPONSE_COLUMNS = (
+    f"postal_code, {', '.join(ENTRY_FIELDS)}, geography_json, attributes_json, cached_at, confirmed, "
+    "html_content IS NOT NULL AND html_content != '' AS has_html"
+)
+# Postal codes per get_cached_many query, well under SQLite's bound parameter limit.
+GET_MANY_CHUNK = 500
+
+# Cached columns with an index or trigger on them. Rewriting one costs index maintenance even when its
+# value is unchanged, so upserts only set them when one of them changed.
+UPSERT_KEY_FIELDS = ("segment_number", "status", "latitude", "longitude")
+_UPSERT_SAME_KEY = " AND ".join(f"{name} IS ?" for name in UPSERT_KEY_FIELDS)
+_UPSERT_COLUMNS = ("postal_code", *ENTRY_FIELDS, "geography_json", "attributes_json", "expires_at", "html_content")
+# New postal codes are inserted; existing ones whose key fields are unchanged get their other columns
+# and expiry refreshed in place, keeping cached_at and confirmed.
+UPSERT_SQL = f"""
+    INSERT INTO postal_code_cache ({", ".join(_UPSERT_COLUMNS)})
+    VALUES ({", ".join("?" for _ in _UPSERT_COLUMNS)})
+    ON CONFLICT (postal_code) DO UPDATE SET {", ".join(
+        f"{name} = excluded.{name}" for name in _UPSERT_COLUMNS[1:] if name not in UPSERT_KEY_FIELDS
+    )}
+    WHERE {" AND ".join(f"{name} IS excluded.{name}" for name in UPSERT_KEY_FIELDS)}
+"""
+# Rows the upsert left alone because a key field changed: rewrite everything. A postal code whose
+# segment changed is a new answer, so it is no longer confirmed and cached_at moves.
+REWRITE_SQL = f"""
+    UPDATE postal_code_cache
+    SET {", ".join(f"{name} = ?" for name in _UPSERT_COLUMNS[1:])},
+        confirmed = CASE WHEN segment_number IS ? THEN confirmed ELSE 0 END,
+        cached_at = CURRENT_TIMESTAMP
+    WHERE postal_code = ? AND NOT ({_UPSERT_SAME_KEY})
+"""
 
-class CacheManager:
+# Bump whenever _migrate_schema changes so existing databases run it once more.
+SCHEMA_VERSION = 9
+
+# Lookup events recorded for API requests rather than by background workers.
+REQUEST_EVENTS = f"COALESCE(endpoint, '') NOT IN ({', '.join(repr(endpoint) for endpoint in BACKGROUND_ENDPOINTS)})"
+
+# Columns that iter_table_rows may read, per table.
+EXPORT_TABLES = {
+    "postal_code_cache": {
+        "postal_code", "status", "message", "segment_number", "segment_name", "segment_description",
+        "who_they_are", "average_household_income", "average_household_net_worth",
+        "average_household_net_worth_amount", "education", "urbanity", "occupation", "diversity",
+        "family_life", "tenure", "home_type", "income_level", "lifestage", "social_group",
+        "official_language", "population", "households", "percent_total_households", "latitude",
+        "longitude", "geocoder_found", "vintage", "source", "confirmed", "cached_at", "expires_at",
+    },
+    "lookup_events": {
+        "id", "requested_at", "postal_code", "status", "source", "endpoint", "batch_id", "message",
+        "from_cache", "duration_ms", *(f"{stage}_ms" for stage in LOOKUP_STAGES),
+    },
+}
+
+
+class CacheManager(CacheBackend):
     """Manages local caching of PRIZM postal code data with individual columns."""
 
-    def __init__(self, db_path: str = None, cache_duration_days: int = None):
+    def __init__(self, db_path: str = None, cache_duration_days: int = None, read_only: bool = False):
+        """read_only opens the file with SQLite's mode=ro and never migrates it (or takes the migrate
+        lock); writes fail. Check `schema_is_current()` before reading an older file that way."""
         self.db_path = db_path or os.environ.get("PRIZM_CACHE_DB_PATH", "prizm_cache_v2.db")
         self.cache_duration_days = cache_duration_days or int(os.environ.get("PRIZM_CACHE_DURATION_DAYS", "90"))
-        self._init_database()
+        self.event_retention_days = int(os.environ.get("PRIZM_EVENT_RETENTION_DAYS", "30"))
+        self.event_archive_dir = os.environ.get("PRIZM_EVENT_ARCHIVE_DIR")
+        self.read_only = read_only
+        if not read_only:
+            self._init_database()
 
     @contextmanager
     def _connect(self):
-        conn = sqlite3.connect(self.db_path)
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         try:
             yield conn
         finally:
             conn.close()
 
-    def _normalize_postal_code(self, postal_code: str) -> str:
-        compact = (postal_code or "").strip().upper().replace(" ", "")
-        if len(compact) == 6 and re.fullmatch(r"[A-Z]\d[A-Z]\d[A-Z]\d", compact):
-            return f"{compact[:3]} {compact[3:]}"
-        return (postal_code or "").strip().upper()
-
-    def _parse_currency_to_int(self, value: Optional[Any]) -> Optional[Any]:
-        """Convert simple currency strings to integers; keep ranges as text."""
-        if value is None or value == "" or value == "Unknown":
-            return None
-        if isinstance(value, (int, float)):
-            return int(value)
-
-        cleaned = re.sub(r"[$,\s]", "", str(value))
-        try:
-            return int(float(cleaned))
-        except (ValueError, TypeError):
-            return str(value).strip()
-
-    def _format_currency_from_int(self, value: Optional[Any]) -> Optional[str]:
-        """Convert integer 95199 to '$95,199'; return range labels unchanged."""
-        if value is None:
-            return None
-        if isinstance(value, str):
-            return value if value.startswith("$") else f"${value}"
-        return f"${int(value):,}"
-
-    def _normalize_status(self, status: Optional[str]) -> str:
-        """Normalize status values to 'success', 'error', or 'invalid'."""
-        if not status:
-            return "error"
-        status_lower = status.lower()
-        if "success" in status_lower:
-            return "success"
-        if "invalid" in status_lower and "format" in status_lower:
-            return "invalid"
-        if status_lower == "invalid":
-            return "invalid"
-        return "error"
-
     def _column_names(self, cursor: sqlite3.Cursor, table: str) -> set[str]:
         cursor.execute(f"PRAGMA table_info({table})")
         return {row[1] for row in cursor.fetchall()}
@@ -164,142 +210,441 @@ class CacheManager:
             logger.info("Backfilled %s legacy JSON cache rows", len(rows))
 
     def _init_database(self):
-        """Initialize the SQLite database with required tables and migrations."""
+        """Bring the database up to SCHEMA_VERSION; a single read when it is already current."""
         try:
+            if self._schema_version() >= SCHEMA_VERSION:
+                return
+
             db_dir = os.path.dirname(os.path.abspath(self.db_path))
             if db_dir:
                 os.makedirs(db_dir, exist_ok=True)
 
-            with self._connect() as conn:
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS postal_code_cache (
-                        postal_code TEXT PRIMARY KEY,
-                        segment_number TEXT,
-                        segment_name TEXT,
-                        segment_description TEXT,
-                        who_they_are TEXT,
-                        average_household_income INTEGER,
-                        education TEXT,
-                        urbanity TEXT,
-                        average_household_net_worth INTEGER,
-                        average_household_net_worth_amount INTEGER,
-                        occupation TEXT,
-                        diversity TEXT,
-                        family_life TEXT,
-                        tenure TEXT,
-                        home_type TEXT,
-                        income_level TEXT,
-                        lifestage TEXT,
-                        social_group TEXT,
-                        official_language TEXT,
-                        population TEXT,
-                        households TEXT,
-                        percent_total_households TEXT,
-                        latitude REAL,
-                        longitude REAL,
-                        geography_json TEXT,
-                        attributes_json TEXT,
-                        message TEXT,
-                        geocoder_found BOOLEAN,
-                        status TEXT NOT NULL DEFAULT 'error',
-                        confirmed BOOLEAN DEFAULT 0,
-                        cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        expires_at TIMESTAMP NOT NULL,
-                        html_content TEXT,
-                        CONSTRAINT chk_status CHECK (status IN ('success', 'error', 'invalid'))
+            with self._migration_lock():
+                # Another worker may have finished the migration while this one waited for the lock.
+                if self._schema_version() >= SCHEMA_VERSION:
+                    return
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    self._migrate_schema(cursor)
+                    cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                        """
                     )
-                    """
-                )
+                    cursor.execute("INSERT OR IGNORE INTO schema_version (version) VALUES (?)", (SCHEMA_VERSION,))
+                    conn.commit()
+                logger.info("Cache database at %s migrated to schema version %s", self.db_path, SCHEMA_VERSION)
 
-                self._add_missing_columns(
-                    cursor,
-                    "postal_code_cache",
-                    {
-                        "segment_number": "TEXT",
-                        "segment_name": "TEXT",
-                        "segment_description": "TEXT",
-                        "who_they_are": "TEXT",
-                        "average_household_income": "INTEGER",
-                        "education": "TEXT",
-                        "urbanity": "TEXT",
-                        "average_household_net_worth": "INTEGER",
-                        "average_household_net_worth_amount": "INTEGER",
-                        "occupation": "TEXT",
-                        "diversity": "TEXT",
-                        "family_life": "TEXT",
-                        "tenure": "TEXT",
-                        "home_type": "TEXT",
-                        "income_level": "TEXT",
-                        "lifestage": "TEXT",
-                        "social_group": "TEXT",
-                        "official_language": "TEXT",
-                        "population": "TEXT",
-                        "households": "TEXT",
-                        "percent_total_households": "TEXT",
-                        "latitude": "REAL",
-                        "longitude": "REAL",
-                        "geography_json": "TEXT",
-                        "attributes_json": "TEXT",
-                        "message": "TEXT",
-                        "geocoder_found": "BOOLEAN",
-                        "status": "TEXT DEFAULT 'error'",
-                        "confirmed": "BOOLEAN DEFAULT 0",
-                        "cached_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
-                        "expires_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
-                        "html_content": "TEXT",
-                    },
-                )
+        except sqlite3.Error as e:
+            logger.error("Failed to initialize cache database: %s", e)
+            raise
 
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_expires_at ON postal_code_cache (expires_at)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_status ON postal_code_cache (status)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_confirmed ON postal_code_cache (confirmed)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_segment_number ON postal_code_cache (segment_number)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_cached_at ON postal_code_cache (cached_at)")
-                self._migrate_json_cache_rows(cursor)
+    def schema_is_current(self) -> bool:
+        return self._schema_version() >= SCHEMA_VERSION
 
-                cursor.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS lookup_events (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        postal_code TEXT,
-                        status TEXT NOT NULL DEFAULT 'error',
-                        source TEXT NOT NULL DEFAULT 'unknown',
-                        endpoint TEXT,
-                        batch_id TEXT,
-                        message TEXT,
-                        from_cache BOOLEAN DEFAULT 0,
-                        duration_ms INTEGER
-                    )
-                    """
-                )
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_lookup_events_requested_at ON lookup_events (requested_at)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_lookup_events_status ON lookup_events (status)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_lookup_events_source ON lookup_events (source)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_lookup_events_postal_code ON lookup_events (postal_code)")
+    def _schema_version(self) -> int:
+        if not os.path.exists(self.db_path):
+            return 0
+        try:
+            with self._connect() as conn:
+                return conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            return 0  # created before schema versioning
+
+    @contextmanager
+    def _migration_lock(self):
+        """Serialize migrations across gunicorn workers with an exclusive lock next to the database file."""
+        with open(f"{self.db_path}.migrate.lock", "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _backfill_display_values(self, cursor: sqlite3.Cursor) -> None:
+        """Fill the display columns for rows written before they existed, or by bulk SQL inserts."""
+
+        def display(column: str) -> str:
+            return f"""
+                CASE typeof({column})
+                    WHEN 'integer' THEN '$' || printf('%,d', {column})
+                    WHEN 'real' THEN '$' || printf('%,d', CAST({column} AS INTEGER))
+                    WHEN 'text' THEN CASE WHEN {column} LIKE '$%' THEN {column} ELSE '$' || {column} END
+                END
+            """
+
+        cursor.execute(
+            f"""
+            UPDATE postal_code_cache SET average_household_income_display = {display("average_household_income")}
+            WHERE average_household_income_display IS NULL AND average_household_income IS NOT NULL
+            """
+        )
+        cursor.executemany(
+            f"""
+            UPDATE postal_code_cache
+            SET average_household_net_worth_amount = ?,
+                average_household_net_worth_display = COALESCE({display("average_household_net_worth")}, ?)
+            WHERE segment_number = ? AND average_household_net_worth_display IS NULL
+            """,
+            [
+                (amount, average_household_net_worth(segment), str(segment))
+                for segment, amount in AVERAGE_HOUSEHOLD_NET_WORTH_BY_SEGMENT.items()
+            ],
+        )
+        cursor.execute(
+            f"""
+            UPDATE postal_code_cache SET average_household_net_worth_display = {display("average_household_net_worth")}
+            WHERE average_household_net_worth_display IS NULL AND average_household_net_worth IS NOT NULL
+            """
+        )
 
+    @timed_db
+    def backfill_display_values(self) -> None:
+        try:
+            with self._connect() as conn:
+                self._backfill_display_values(conn.cursor())
                 conn.commit()
-                logger.info("Cache database initialized at %s", self.db_path)
+        except sqlite3.Error as e:
+            logger.error("Error backfilling display values: %s", e)
+
+    def _create_spatial_index(self, cursor: sqlite3.Cursor) -> None:
+        """R*Tree over cached coordinates, keyed by postal_code_cache rowid and kept in sync by triggers.
 
+        postal_code_cache has a TEXT primary key, so VACUUM may renumber its rowids; vacuum() rebuilds
+        the R*Tree afterwards. A file vacuumed some other way needs `cache_cli.py rebuild-spatial-index`.
+        """
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS postal_code_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite R*Tree module unavailable; nearby queries will scan the cache: %s", e)
+            return
+
+        index_new_row = """
+            DELETE FROM postal_code_rtree WHERE id = NEW.rowid;
+            INSERT INTO postal_code_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT NEW.rowid, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        """
+        # cache_data used INSERT OR REPLACE, which needed a BEFORE INSERT trigger to drop the old row's
+        # entry. Upserts keep the rowid, and that trigger would fire (and drop the entry) on every one.
+        cursor.execute("DROP TRIGGER IF EXISTS trg_postal_code_rtree_replace")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_postal_code_rtree_update")
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_postal_code_rtree_insert AFTER INSERT ON postal_code_cache
+            BEGIN {index_new_row} END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_postal_code_rtree_update
+            AFTER UPDATE OF latitude, longitude ON postal_code_cache
+            WHEN OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+            BEGIN {index_new_row} END
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_postal_code_rtree_delete AFTER DELETE ON postal_code_cache
+            BEGIN
+                DELETE FROM postal_code_rtree WHERE id = OLD.rowid;
+            END
+            """
+        )
+        cursor.execute("SELECT 1 FROM postal_code_rtree LIMIT 1")
+        if cursor.fetchone() is None:
+            self._rebuild_spatial_index(cursor)
+
+    def _rebuild_spatial_index(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postal_code_rtree'")
+        if cursor.fetchone() is None:
+            return 0
+        cursor.execute("DELETE FROM postal_code_rtree")
+        cursor.execute(
+            """
+            INSERT INTO postal_code_rtree (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT rowid, latitude, latitude, longitude, longitude
+            FROM postal_code_cache
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            """
+        )
+        return cursor.rowcount
+
+    @timed_db
+    def rebuild_spatial_index(self) -> int:
+        """Re-key the R*Tree from the current postal_code_cache rowids; returns the rows indexed."""
+        try:
+            with self._connect() as conn:
+                indexed = self._rebuild_spatial_index(conn.cursor())
+                conn.commit()
+                return indexed
         except sqlite3.Error as e:
-            logger.error("Failed to initialize cache database: %s", e)
-            raise
+            logger.error("Error rebuilding the spatial index: %s", e)
+            return 0
 
-    def get_cached_data(self, postal_code: str) -> Optional[Dict[Any, Any]]:
-        """Retrieve cached data for a postal code if it exists and hasn't expired."""
+    @timed_db
+    def vacuum(self) -> Dict[str, Any]:
+        """Rewrite the database file with VACUUM, switching it to auto_vacuum=INCREMENTAL, then rebuild
+        the R*Tree, whose keys VACUUM may have renumbered. Blocks every writer while it runs."""
         try:
-            postal_code = self._normalize_postal_code(postal_code)
+            size_before = os.path.getsize(self.db_path)
+            with self._connect() as conn:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                indexed = self._rebuild_spatial_index(conn.cursor())
+                conn.commit()
+            return {"size_before": size_before, "size_after": os.path.getsize(self.db_path), "spatial_indexed": indexed}
+        except (sqlite3.Error, OSError) as e:
+            logger.error("Error vacuuming the cache database: %s", e)
+            return {"error": str(e)}
+
+    def _migrate_schema(self, cursor: sqlite3.Cursor) -> None:
+        """Create and upgrade every table and index; each step is safe to re-run."""
+        # Only takes effect on a new, empty database file; older files keep auto_vacuum=NONE
+        # until a one-off `cache_cli.py vacuum`, which also rebuilds the R*Tree VACUUM may invalidate.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL lets readers (the reporting snapshot's backup, dashboard scans) run alongside lookup
+        # writes instead of blocking them. The mode is stored in the database file.
+        cursor.execute("PRAGMA journal_mode = WAL")
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS postal_code_cache (
+                postal_code TEXT PRIMARY KEY,
+                segment_number TEXT,
+                segment_name TEXT,
+                segment_description TEXT,
+                who_they_are TEXT,
+                average_household_income INTEGER,
+                education TEXT,
+                urbanity TEXT,
+                average_household_net_worth INTEGER,
+                average_household_net_worth_amount INTEGER,
+                average_household_income_display TEXT,
+                average_household_net_worth_display TEXT,
+                occupation TEXT,
+                diversity TEXT,
+                family_life TEXT,
+                tenure TEXT,
+                home_type TEXT,
+                income_level TEXT,
+                lifestage TEXT,
+                social_group TEXT,
+                official_language TEXT,
+                population TEXT,
+                households TEXT,
+                percent_total_households TEXT,
+                latitude REAL,
+                longitude REAL,
+                geography_json TEXT,
+                attributes_json TEXT,
+                message TEXT,
+                geocoder_found BOOLEAN,
+                status TEXT NOT NULL DEFAULT 'error',
+                vintage TEXT,
+                source TEXT,
+                confirmed BOOLEAN DEFAULT 0,
+                cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                html_content TEXT,
+                CONSTRAINT chk_status CHECK (status IN ('success', 'error', 'invalid'))
+            )
+            """
+        )
+
+        self._add_missing_columns(
+            cursor,
+            "postal_code_cache",
+            {
+                "segment_number": "TEXT",
+                "segment_name": "TEXT",
+                "segment_description": "TEXT",
+                "who_they_are": "TEXT",
+                "average_household_income": "INTEGER",
+                "education": "TEXT",
+                "urbanity": "TEXT",
+                "average_household_net_worth": "INTEGER",
+                "average_household_net_worth_amount": "INTEGER",
+                "average_household_income_display": "TEXT",
+                "average_household_net_worth_display": "TEXT",
+                "occupation": "TEXT",
+                "diversity": "TEXT",
+                "family_life": "TEXT",
+                "tenure": "TEXT",
+                "home_type": "TEXT",
+                "income_level": "TEXT",
+                "lifestage": "TEXT",
+                "social_group": "TEXT",
+                "official_language": "TEXT",
+                "population": "TEXT",
+                "households": "TEXT",
+                "percent_total_households": "TEXT",
+                "latitude": "REAL",
+                "longitude": "REAL",
+                "geography_json": "TEXT",
+                "attributes_json": "TEXT",
+                "message": "TEXT",
+                "geocoder_found": "BOOLEAN",
+                "status": "TEXT DEFAULT 'error'",
+                "vintage": "TEXT",
+                "source": "TEXT",
+                "confirmed": "BOOLEAN DEFAULT 0",
+                "cached_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+                "expires_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+                "html_content": "TEXT",
+            },
+        )
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expires_at ON postal_code_cache (expires_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status ON postal_code_cache (status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_confirmed ON postal_code_cache (confirmed)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_segment_number ON postal_code_cache (segment_number)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cached_at ON postal_code_cache (cached_at)")
+        self._migrate_json_cache_rows(cursor)
+        self._backfill_display_values(cursor)
+        self._create_spatial_index(cursor)
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS lookup_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                postal_code TEXT,
+                status TEXT NOT NULL DEFAULT 'error',
+                source TEXT NOT NULL DEFAULT 'unknown',
+                endpoint TEXT,
+                batch_id TEXT,
+                message TEXT,
+                from_cache BOOLEAN DEFAULT 0,
+                duration_ms INTEGER
+            )
+            """
+        )
+        self._add_missing_columns(cursor, "lookup_events", {f"{stage}_ms": "INTEGER" for stage in LOOKUP_STAGES})
+        # Every index on this append-heavy table is paid on each insert, so there are two. One covers
+        # the summary queries and the rollup's time-range scans. The other walks events per postal
+        # code in time order for the popularity and refresh-ahead queries.
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_lookup_events_summary
+            ON lookup_events (requested_at, status, from_cache, source)
+            """
+        )
+        for index in ("requested_at", "status", "source"):
+            cursor.execute(f"DROP INDEX IF EXISTS idx_lookup_events_{index}")
+        postal_code_index = [row[2] for row in cursor.execute("PRAGMA index_info(idx_lookup_events_postal_code)")]
+        if postal_code_index and postal_code_index != ["postal_code", "requested_at", "endpoint"]:
+            cursor.execute("DROP INDEX idx_lookup_events_postal_code")
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_lookup_events_postal_code
+            ON lookup_events (postal_code, requested_at, endpoint)
+            """
+        )
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS lookup_event_daily (
+                day TEXT NOT NULL,
+                endpoint TEXT NOT NULL DEFAULT '',
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                from_cache BOOLEAN NOT NULL DEFAULT 0,
+                lookups INTEGER NOT NULL DEFAULT 0,
+                duration_ms_total INTEGER NOT NULL DEFAULT 0,
+                duration_ms_max INTEGER,
+                PRIMARY KEY (day, endpoint, source, status, from_cache)
+            )
+            """
+        )
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsa_segments (
+                fsa TEXT NOT NULL,
+                segment_number TEXT NOT NULL,
+                segment_name TEXT,
+                postal_codes INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (fsa, segment_number)
+            ) WITHOUT ROWID
+            """
+        )
+        cursor.execute("SELECT 1 FROM fsa_segments LIMIT 1")
+        if cursor.fetchone() is None:
+            self._write_fsa_segments(cursor, self._aggregate_fsa_segments(cursor))
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS maintenance_leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at TIMESTAMP NOT NULL,
+                progress TEXT
+            )
+            """
+        )
+        self._add_missing_columns(cursor, "maintenance_leases", {"progress": "TEXT"})
+
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'queued',
+                total INTEGER NOT NULL DEFAULT 0,
+                processed INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                worker_id TEXT,
+                lease_expires_at TIMESTAMP,
+                error TEXT
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_batch_jobs_status ON batch_jobs (status, created_at)")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_job_items (
+                job_id TEXT NOT NULL,
+                item_index INTEGER NOT NULL,
+                postal_code TEXT NOT NULL,
+                status TEXT,
+                result_json TEXT,
+                processed_at TIMESTAMP,
+                PRIMARY KEY (job_id, item_index)
+            )
+            """
+        )
+
+    @timed_db
+    def get_cached_data(self, postal_code: str, include_expired: bool = False) -> Optional[Dict[Any, Any]]:
+        """Retrieve cached data for a postal code if it exists and hasn't expired.
+
+        With include_expired=True an expired row is returned too, for serving stale data
+        when the upstream services cannot answer in time.
+        """
+        try:
+            postal_code = self.normalize_postal_code(postal_code)
+            expiry_condition = "" if include_expired else "AND expires_at > datetime('now')"
 
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    SELECT *
+                    f"""
+                    SELECT {CACHED_RESPONSE_COLUMNS}
                     FROM postal_code_cache
-                    WHERE postal_code = ? AND expires_at > datetime('now')
+                    WHERE postal_code = ? {expiry_condition}
                     """,
                     (postal_code,),
                 )
@@ -309,57 +654,91 @@ class CacheManager:
                     logger.info("Cache miss for postal code %s", postal_code)
                     return None
 
-                cached_data = self._row_to_response_dict(row)
                 logger.info("Cache hit for postal code %s (cached at %s)", postal_code, row["cached_at"])
-                cached_data["_cache_info"] = {
-                    "cached_at": row["cached_at"],
-                    "from_cache": True,
-                    "has_html": bool(row["html_content"]),
-                    "confirmed": bool(row["confirmed"]),
-                }
-                return cached_data
+                return self._cached_response(row)
 
         except sqlite3.Error as e:
             logger.error("Error retrieving cached data for %s: %s", postal_code, e)
             return None
 
+    @timed_db
+    def get_cached_many(self, postal_codes: Iterable[str], include_expired: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Cached responses for several postal codes, keyed by normalized postal code; misses are left out.
+
+        Codes are normalized once and fetched with one `IN (...)` query per GET_MANY_CHUNK codes on a
+        single connection, instead of a connection and a query per code.
+        """
+        keys = sorted({self.normalize_postal_code(postal_code) for postal_code in postal_codes})
+        expiry_condition = "" if include_expired else "AND expires_at > datetime('now')"
+        results = {}
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                for start in range(0, len(keys), GET_MANY_CHUNK):
+                    chunk = keys[start : start + GET_MANY_CHUNK]
+                    cursor.execute(
+                        f"""
+                        SELECT {CACHED_RESPONSE_COLUMNS}
+                        FROM postal_code_cache
+                        WHERE postal_code IN ({", ".join("?" for _ in chunk)}) {expiry_condition}
+                        """,
+                        chunk,
+                    )
+                    for row in cursor.fetchall():
+                        results[row["postal_code"]] = self._cached_response(row)
+        except sqlite3.Error as e:
+            logger.error("Error retrieving %s cached postal codes: %s", len(keys), e)
+            return {}
+        logger.info("Cache hits for %s of %s postal codes", len(results), len(keys))
+        return results
+
+    def _cached_response(self, row: sqlite3.Row) -> Dict[str, Any]:
+        cached_data = self._row_to_response_dict(row)
+        cached_data["_cache_info"] = {
+            "cached_at": row["cached_at"],
+            "from_cache": True,
+            "has_html": bool(row["has_html"]),
+            "confirmed": bool(row["confirmed"]),
+        }
+        return cached_data
+
     def _row_to_response_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         geography = json.loads(row["geography_json"]) if row["geography_json"] else None
         attributes = json.loads(row["attributes_json"]) if row["attributes_json"] else None
+        return self._response_from_fields(row, geography, attributes)
 
-        data = {
-            "postal_code": row["postal_code"],
-            "segment_number": row["segment_number"],
-            "segment_name": row["segment_name"],
-            "segment_description": row["segment_description"],
-            "who_they_are": row["who_they_are"],
-            "average_household_income": self._format_currency_from_int(row["average_household_income"]),
-            "education": row["education"],
-            "urbanity": row["urbanity"],
-            "average_household_net_worth": self._format_currency_from_int(row["average_household_net_worth"]),
-            "average_household_net_worth_amount": row["average_household_net_worth_amount"],
-            "occupation": row["occupation"],
-            "diversity": row["diversity"],
-            "family_life": row["family_life"],
-            "tenure": row["tenure"],
-            "home_type": row["home_type"],
-            "income_level": row["income_level"],
-            "lifestage": row["lifestage"],
-            "social_group": row["social_group"],
-            "official_language": row["official_language"],
-            "population": row["population"],
-            "households": row["households"],
-            "percent_total_households": row["percent_total_households"],
-            "latitude": row["latitude"],
-            "longitude": row["longitude"],
-            "geography": geography,
-            "attributes": attributes,
-            "message": row["message"],
-            "geocoder_found": bool(row["geocoder_found"]) if row["geocoder_found"] is not None else None,
-            "status": row["status"],
-        }
-        return {k: v for k, v in data.items() if v is not None}
+    def _upsert_values(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        duration_days: int,
+        html_content: Optional[str] = None,
+    ) -> tuple:
+        """Values for _UPSERT_COLUMNS, in order."""
+        data_to_cache = data.copy()
+        data_to_cache.pop("_cache_info", None)
+        if "prizm_code" in data_to_cache and "segment_number" not in data_to_cache:
+            data_to_cache["segment_number"] = data_to_cache["prizm_code"]
+
+        fields = self._entry_fields(data_to_cache)
+        geography = data_to_cache.get("geography")
+        attributes = data_to_cache.get("attributes")
+        return (
+            postal_code,
+            *(fields[name] for name in ENTRY_FIELDS),
+            json.dumps(geography) if geography else None,
+            json.dumps(attributes) if attributes else None,
+            datetime.now() + timedelta(days=duration_days),
+            html_content,
+        )
 
+    def _upsert(self, cursor: sqlite3.Cursor, values: tuple) -> None:
+        cursor.execute(UPSERT_SQL, values)
+        if cursor.rowcount == 0:
+            key = tuple(values[_UPSERT_COLUMNS.index(name)] for name in UPSERT_KEY_FIELDS)
+            cursor.execute(REWRITE_SQL, (*values[1:], key[0], values[0], *key))
+
+    @timed_db
     def cache_data(
         self,
         postal_code: str,
@@ -367,83 +746,19 @@ class CacheManager:
         custom_duration_days: Optional[int] = None,
         html_content: Optional[str] = None,
     ) -> bool:
-        """Cache data for a postal code."""
+        """Cache data for a postal code, updating an existing row in place."""
         try:
-            postal_code = self._normalize_postal_code(postal_code)
-            data_to_cache = data.copy()
-            data_to_cache.pop("_cache_info", None)
-
+            postal_code = self.normalize_postal_code(postal_code)
             duration_days = custom_duration_days if custom_duration_days is not None else self.cache_duration_days
-            expires_at = datetime.now() + timedelta(days=duration_days)
-
-            if "prizm_code" in data_to_cache and "segment_number" not in data_to_cache:
-                data_to_cache["segment_number"] = data_to_cache["prizm_code"]
-
-            avg_income = self._parse_currency_to_int(data_to_cache.get("average_household_income"))
-            avg_net_worth = self._parse_currency_to_int(data_to_cache.get("average_household_net_worth"))
-            avg_net_worth_amount = self._parse_currency_to_int(data_to_cache.get("average_household_net_worth_amount"))
-            if isinstance(avg_net_worth_amount, str):
-                avg_net_worth_amount = None
-
-            status = self._normalize_status(data_to_cache.get("status"))
-            geography = data_to_cache.get("geography")
-            attributes = data_to_cache.get("attributes")
+            values = self._upsert_values(postal_code, data, duration_days, html_content)
 
             with self._connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO postal_code_cache (
-                        postal_code, segment_number, segment_name, segment_description,
-                        who_they_are, average_household_income, education, urbanity,
-                        average_household_net_worth, average_household_net_worth_amount,
-                        occupation, diversity, family_life, tenure, home_type,
-                        income_level, lifestage, social_group, official_language,
-                        population, households, percent_total_households,
-                        latitude, longitude, geography_json, attributes_json,
-                        message, geocoder_found, status, confirmed, expires_at, html_content
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        postal_code,
-                        self._blank_to_none(data_to_cache.get("segment_number")),
-                        self._blank_to_none(data_to_cache.get("segment_name")),
-                        self._blank_to_none(data_to_cache.get("segment_description")),
-                        self._blank_to_none(data_to_cache.get("who_they_are")),
-                        avg_income,
-                        self._blank_to_none(data_to_cache.get("education")),
-                        self._blank_to_none(data_to_cache.get("urbanity")),
-                        avg_net_worth,
-                        avg_net_worth_amount,
-                        self._blank_to_none(data_to_cache.get("occupation")),
-                        self._blank_to_none(data_to_cache.get("diversity")),
-                        self._blank_to_none(data_to_cache.get("family_life")),
-                        self._blank_to_none(data_to_cache.get("tenure")),
-                        self._blank_to_none(data_to_cache.get("home_type")),
-                        self._blank_to_none(data_to_cache.get("income_level")),
-                        self._blank_to_none(data_to_cache.get("lifestage")),
-                        self._blank_to_none(data_to_cache.get("social_group")),
-                        self._blank_to_none(data_to_cache.get("official_language")),
-                        self._blank_to_none(data_to_cache.get("population")),
-                        self._blank_to_none(data_to_cache.get("households")),
-                        self._blank_to_none(data_to_cache.get("percent_total_households")),
-                        data_to_cache.get("latitude"),
-                        data_to_cache.get("longitude"),
-                        json.dumps(geography) if geography else None,
-                        json.dumps(attributes) if attributes else None,
-                        self._blank_to_none(data_to_cache.get("message")),
-                        data_to_cache.get("geocoder_found"),
-                        status,
-                        False,
-                        expires_at,
-                        html_content,
-                    ),
-                )
+                self._upsert(conn.cursor(), values)
                 conn.commit()
                 logger.info(
                     "Cached data for postal code %s (expires: %s, duration: %s days, has_html: %s)",
                     postal_code,
-                    expires_at,
+                    values[-2],
                     duration_days,
                     html_content is not None,
                 )
@@ -453,13 +768,31 @@ class CacheManager:
             logger.error("Error caching data for %s: %s", postal_code, e)
             return False
 
-    def _blank_to_none(self, value: Any) -> Optional[Any]:
-        if value is None:
-            return None
-        if isinstance(value, str) and value.strip() == "":
-            return None
-        return value
+    @timed_db
+    def cache_many(
+        self,
+        entries: Iterable[CacheEntry],
+        custom_duration_days: Optional[int] = None,
+        duration_policy: Optional[DurationPolicy] = None,
+    ) -> int:
+        """Upsert several lookup results in one transaction (one commit, one fsync)."""
+        written = 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                for postal_code, data in entries:
+                    postal_code = self.normalize_postal_code(postal_code)
+                    duration_days = self._duration_days(data, custom_duration_days, duration_policy)
+                    self._upsert(cursor, self._upsert_values(postal_code, data, duration_days))
+                    written += 1
+                conn.commit()
+            logger.info("Cached %s postal codes in one transaction", written)
+            return written
+        except sqlite3.Error as e:
+            logger.error("Error caching %s postal codes: %s", written, e)
+            return 0
 
+    @timed_db
     def record_lookup_event(
         self,
         postal_code: str,
@@ -470,19 +803,22 @@ class CacheManager:
         message: Optional[str] = None,
         from_cache: bool = False,
         duration_ms: Optional[int] = None,
+        stage_timings: Optional[Dict[str, int]] = None,
     ) -> None:
-        """Record a lookup attempt for dashboard/reporting metrics."""
+        """Record a lookup attempt for dashboard/reporting metrics; stage_timings maps LOOKUP_STAGES to ms."""
+        stage_timings = stage_timings or {}
+        stage_columns = ", ".join(f"{stage}_ms" for stage in LOOKUP_STAGES)
         try:
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """
+                    f"""
                     INSERT INTO lookup_events (
-                        postal_code, status, source, endpoint, batch_id, message, from_cache, duration_ms
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        postal_code, status, source, endpoint, batch_id, message, from_cache, duration_ms, {stage_columns}
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?{", ?" * len(LOOKUP_STAGES)})
                     """,
                     (
-                        self._normalize_postal_code(postal_code),
+                        self.normalize_postal_code(postal_code),
                         self._normalize_status(status),
                         source,
                         endpoint,
@@ -490,15 +826,17 @@ class CacheManager:
                         message,
                         bool(from_cache),
                         duration_ms,
+                        *(stage_timings.get(stage) for stage in LOOKUP_STAGES),
                     ),
                 )
                 conn.commit()
         except sqlite3.Error as e:
             logger.warning("Failed to record lookup event for %s: %s", postal_code, e)
 
+    @timed_db
     def confirm_data(self, postal_code: str) -> bool:
         try:
-            postal_code = self._normalize_postal_code(postal_code)
+            postal_code = self.normalize_postal_code(postal_code)
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -515,9 +853,10 @@ class CacheManager:
             logger.error("Error confirming data for %s: %s", postal_code, e)
             return False
 
+    @timed_db
     def unconfirm_data(self, postal_code: str) -> bool:
         try:
-            postal_code = self._normalize_postal_code(postal_code)
+            postal_code = self.normalize_postal_code(postal_code)
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -534,6 +873,7 @@ class CacheManager:
             logger.error("Error unconfirming data for %s: %s", postal_code, e)
             return False
 
+    @timed_db
     def get_unconfirmed_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
         try:
             with self._connect() as conn:
@@ -553,9 +893,10 @@ class CacheManager:
             logger.error("Error getting unconfirmed entries: %s", e)
             return []
 
+    @timed_db
     def get_cached_html(self, postal_code: str) -> Optional[str]:
         try:
-            postal_code = self._normalize_postal_code(postal_code)
+            postal_code = self.normalize_postal_code(postal_code)
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -572,11 +913,34 @@ class CacheManager:
             logger.error("Error retrieving cached HTML for %s: %s", postal_code, e)
             return None
 
-    def cleanup_expired_cache(self) -> int:
+    @timed_db
+    def cleanup_expired_cache(self, batch_size: int = 500) -> int:
+        """Delete every expired entry, one short transaction per batch so writers are never blocked for long."""
+        deleted_count = 0
+        while True:
+            deleted = self.delete_expired_batch(batch_size)
+            deleted_count += deleted
+            if deleted < batch_size:
+                return deleted_count
+
+    @timed_db
+    def delete_expired_batch(self, batch_size: int = 500) -> int:
+        """Delete up to batch_size expired entries, oldest expiry first, walking idx_expires_at."""
         try:
             with self._connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM postal_code_cache WHERE expires_at <= datetime('now')")
+                cursor.execute(
+                    """
+                    DELETE FROM postal_code_cache
+                    WHERE rowid IN (
+                        SELECT rowid FROM postal_code_cache
+                        WHERE expires_at <= datetime('now')
+                        ORDER BY expires_at
+                        LIMIT ?
+                    )
+                    """,
+                    (int(batch_size),),
+                )
                 deleted_count = cursor.rowcount
                 conn.commit()
                 return deleted_count
@@ -584,6 +948,428 @@ class CacheManager:
             logger.error("Error cleaning up expired cache: %s", e)
             return 0
 
+    def acquire_maintenance_lease(self, name: str, owner: str, lease_seconds: int = 300) -> bool:
+        """Take or renew a named lease so only one worker runs a maintenance task at a time."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    INSERT INTO maintenance_leases (name, owner, expires_at)
+                    VALUES (?, ?, datetime('now', ?))
+                    ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE maintenance_leases.owner = excluded.owner OR maintenance_leases.expires_at <= datetime('now')
+                    """,
+                    (name, owner, f"{int(lease_seconds):+d} seconds"),
+                )
+                conn.commit()
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logger.error("Error acquiring maintenance lease %s: %s", name, e)
+            return False
+
+    def release_maintenance_lease(self, name: str, owner: str) -> None:
+        """Let the lease expire now; the row stays so its last progress can still be read."""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE maintenance_leases SET expires_at = datetime('now') WHERE name = ? AND owner = ?",
+                    (name, owner),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error("Error releasing maintenance lease %s: %s", name, e)
+
+    def save_maintenance_progress(self, name: str, owner: str, progress: Dict[str, Any]) -> None:
+        """Store a task's progress on its lease row, so any worker can report it; only the lease owner writes."""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE maintenance_leases SET progress = ? WHERE name = ? AND owner = ?",
+                    (json.dumps(progress), name, owner),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error("Error saving maintenance progress %s: %s", name, e)
+
+    def get_maintenance_progress(self, name: str) -> Optional[Dict[str, Any]]:
+        """Progress of the running or last pass of a task, whichever worker ran it; None before the first pass."""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT progress, expires_at > datetime('now') FROM maintenance_leases WHERE name = ?", (name,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error reading maintenance progress %s: %s", name, e)
+            return None
+        if row is None or row[0] is None:
+            return None
+        progress = json.loads(row[0])
+        if progress.get("state") == "running" and not row[1]:
+            # The lease ran out without a final update: the worker running the pass died.
+            progress.update(state="idle", error=progress.get("error") or "The pass stopped before it finished")
+        return progress
+
+    @timed_db
+    def backup(self, target_path: str) -> int:
+        """Copy the whole database into target_path as one self-contained file; returns its page count."""
+        source = sqlite3.connect(self.db_path)
+        target = sqlite3.connect(target_path)
+        try:
+            # One step copies every page inside a single read transaction, so the copy is consistent.
+            source.backup(target)
+            # A single self-contained file; readers never need the -wal and -shm files.
+            target.execute("PRAGMA journal_mode = DELETE")
+            return target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+    @timed_db
+    def run_maintenance(self, vacuum_pages: int = 1000) -> Dict[str, Any]:
+        """Return up to vacuum_pages free pages to the filesystem and refresh planner statistics."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+                free_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                # incremental_vacuum frees pages one step at a time; fetchall drives it to completion.
+                cursor.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+                free_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                cursor.execute("PRAGMA optimize").fetchall()
+                return {
+                    "incremental_vacuum": auto_vacuum == 2,
+                    "freed_pages": free_before - free_after,
+                    "free_pages": free_after,
+                }
+        except sqlite3.Error as e:
+            logger.error("Error running cache maintenance: %s", e)
+            return {"error": str(e)}
+
+    def _aggregate_fsa_segments(self, cursor: sqlite3.Cursor) -> List[tuple]:
+        cursor.execute(
+            """
+            SELECT substr(postal_code, 1, 3) fsa, segment_number, MAX(segment_name), COUNT(*)
+            FROM postal_code_cache
+            WHERE status = 'success' AND segment_number IS NOT NULL AND segment_number != ''
+            GROUP BY fsa, segment_number
+            """
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+    def _write_fsa_segments(self, cursor: sqlite3.Cursor, rows: List[tuple]) -> None:
+        cursor.execute("DELETE FROM fsa_segments")
+        cursor.executemany(
+            "INSERT INTO fsa_segments (fsa, segment_number, segment_name, postal_codes) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    @timed_db
+    def rebuild_fsa_index(self) -> int:
+        """Recount segments per FSA from successful cache rows; returns the number of FSAs indexed.
+
+        The GROUP BY runs as a plain read, so the write lock is only held while the much smaller
+        result replaces the old index.
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                rows = self._aggregate_fsa_segments(cursor)
+                self._write_fsa_segments(cursor, rows)
+                conn.commit()
+                return len({row[0] for row in rows})
+        except sqlite3.Error as e:
+            logger.error("Error rebuilding FSA segment index: %s", e)
+            return 0
+
+    @timed_db
+    def get_fsa_distribution(self, fsa: str) -> Optional[Dict[str, Any]]:
+        """Segment distribution for a forward sortation area, most common segment first."""
+        fsa = (fsa or "").strip().upper()[:3]
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT segment_number, segment_name, postal_codes, updated_at
+                    FROM fsa_segments
+                    WHERE fsa = ?
+                    ORDER BY postal_codes DESC, segment_number
+                    """,
+                    (fsa,),
+                )
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error reading FSA distribution for %s: %s", fsa, e)
+            return None
+        if not rows:
+            return None
+
+        total = sum(row["postal_codes"] for row in rows)
+        segments = [
+            {
+                "segment_number": row["segment_number"],
+                "segment_name": row["segment_name"],
+                "postal_codes": row["postal_codes"],
+                "share": round(row["postal_codes"] / total, 4),
+            }
+            for row in rows
+        ]
+        return {
+            "fsa": fsa,
+            "postal_codes": total,
+            "dominant_segment": segments[0],
+            "segments": segments,
+            "updated_at": rows[0]["updated_at"],
+        }
+
+    @timed_db
+    def get_segment_profile(self, segment_number: str) -> Optional[Dict[str, Any]]:
+        """Segment-level fields from any successful cache row for the segment, without postal-code specifics."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT * FROM postal_code_cache
+                    WHERE segment_number = ? AND status = 'success'
+                    LIMIT 1
+                    """,
+                    (str(segment_number),),
+                )
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error reading segment profile %s: %s", segment_number, e)
+            return None
+        if not row:
+            return None
+        profile = self._row_to_response_dict(row)
+        postal_code_fields = (
+            "postal_code", "population", "households", "percent_total_households",
+            "latitude", "longitude", "geography", "attributes", "message", "geocoder_found",
+        )
+        for key in postal_code_fields:
+            profile.pop(key, None)
+        return profile
+
+    @timed_db
+    def get_nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: Optional[float] = None,
+        bbox: Optional[tuple] = None,
+        limit: int = 100,
+    ) -> Optional[Dict[str, Any]]:
+        """Successful cache rows within radius_km of a point, or inside bbox (min_lat, min_lon, max_lat, max_lon).
+
+        Results are ordered by distance from the point and capped at limit; the segment mix covers every match.
+        """
+        if bbox is None:
+            lat_delta = radius_km / 111.32
+            lon_delta = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 0.01))
+            bbox = (latitude - lat_delta, longitude - lon_delta, latitude + lat_delta, longitude + lon_delta)
+        min_lat, min_lon, max_lat, max_lon = bbox
+
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postal_code_rtree'")
+                if cursor.fetchone():
+                    cursor.execute(
+                        """
+                        SELECT c.postal_code, c.segment_number, c.segment_name, c.latitude, c.longitude
+                        FROM postal_code_rtree r
+                        JOIN postal_code_cache c ON c.rowid = r.id
+                        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+                        AND c.status = 'success'
+                        """,
+                        (min_lat, max_lat, min_lon, max_lon),
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        SELECT postal_code, segment_number, segment_name, latitude, longitude
+                        FROM postal_code_cache
+                        WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? AND status = 'success'
+                        """,
+                        (min_lat, max_lat, min_lon, max_lon),
+                    )
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error querying nearby postal codes: %s", e)
+            return None
+
+        matches = []
+        for row in rows:
+            # The R*Tree stores 32-bit floats, so re-check the exact coordinates.
+            if not (min_lat <= row["latitude"] <= max_lat and min_lon <= row["longitude"] <= max_lon):
+                continue
+            distance = _haversine_km(latitude, longitude, row["latitude"], row["longitude"])
+            if radius_km is not None and distance > radius_km:
+                continue
+            matches.append({**dict(row), "distance_km": round(distance, 3)})
+        matches.sort(key=lambda match: match["distance_km"])
+
+        segments: Dict[str, Dict[str, Any]] = {}
+        for match in matches:
+            segment = segments.setdefault(
+                match["segment_number"],
+                {"segment_number": match["segment_number"], "segment_name": match["segment_name"], "postal_codes": 0},
+            )
+            segment["postal_codes"] += 1
+        segment_mix = sorted(segments.values(), key=lambda segment: -segment["postal_codes"])
+        for segment in segment_mix:
+            segment["share"] = round(segment["postal_codes"] / len(matches), 4)
+
+        return {"count": len(matches), "results": matches[:limit], "segments": segment_mix}
+
+    def _outdated_filter(self, include_untagged: bool, alias: str = "") -> str:
+        """Rows that came from upstream under another geocoder vintage. Untagged rows (cached before rows
+        recorded their vintage) only count when include_untagged is set."""
+        prefix = f"{alias}." if alias else ""
+        untagged = f"{prefix}vintage IS NULL OR " if include_untagged else ""
+        return f"{prefix}status != 'invalid' AND ({untagged}{prefix}vintage != ?)"
+
+    @timed_db
+    def get_resegment_candidates(
+        self,
+        vintage: str,
+        limit: int = 50,
+        hot_days: int = 7,
+        include_untagged: bool = False,
+        exclude: Iterable[str] = (),
+    ) -> List[str]:
+        """Outdated postal codes to look up again under `vintage`: the most looked-up ones over the last
+        `hot_days` first, then the rest in postal code order."""
+        exclude = set(exclude)
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"""
+                    SELECT c.postal_code
+                    FROM (
+                        SELECT postal_code, COUNT(*) hits FROM lookup_events
+                        WHERE requested_at >= datetime('now', ?) AND {REQUEST_EVENTS}
+                        GROUP BY postal_code
+                    ) h
+                    JOIN postal_code_cache c ON c.postal_code = h.postal_code
+                    WHERE {self._outdated_filter(include_untagged, "c")}
+                    ORDER BY h.hits DESC, c.postal_code
+                    LIMIT ?
+                    """,
+                    (f"-{int(hot_days)} days", vintage, limit + len(exclude)),
+                )
+                candidates = [row[0] for row in cursor.fetchall() if row[0] not in exclude]
+                if len(candidates) < limit:
+                    cursor.execute(
+                        f"SELECT postal_code FROM postal_code_cache WHERE {self._outdated_filter(include_untagged)} "
+                        "ORDER BY postal_code LIMIT ?",
+                        (vintage, limit + len(exclude) + len(candidates)),
+                    )
+                    seen = exclude.union(candidates)
+                    candidates += [row[0] for row in cursor.fetchall() if row[0] not in seen]
+                return candidates[:limit]
+        except sqlite3.Error as e:
+            logger.error("Error finding postal codes to re-segment: %s", e)
+            return []
+
+    @timed_db
+    def count_outdated_entries(self, vintage: str, include_untagged: bool = False) -> int:
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    f"SELECT COUNT(*) FROM postal_code_cache WHERE {self._outdated_filter(include_untagged)}",
+                    (vintage,),
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Error counting outdated cache entries: %s", e)
+            return 0
+
+    @timed_db
+    def tag_untagged_entries(self, vintage: str, batch_size: int = 10000) -> int:
+        """Record `vintage` on upstream rows cached before rows recorded their vintage, one short
+        transaction per batch; returns the number of rows tagged."""
+        tagged = 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        """
+                        UPDATE postal_code_cache SET vintage = ?
+                        WHERE rowid IN (
+                            SELECT rowid FROM postal_code_cache
+                            WHERE vintage IS NULL AND status != 'invalid'
+                            LIMIT ?
+                        )
+                        """,
+                        (vintage, int(batch_size)),
+                    )
+                    conn.commit()
+                    tagged += cursor.rowcount
+                    if cursor.rowcount < batch_size:
+                        return tagged
+        except sqlite3.Error as e:
+            logger.error("Error tagging cache entries with vintage %s: %s", vintage, e)
+            return tagged
+
+    @timed_db
+    def get_refresh_candidates(
+        self,
+        limit: int = 20,
+        hot_days: int = 7,
+        min_hits: int = 3,
+        ahead_hours: float = 24,
+        exclude: Iterable[str] = (),
+    ) -> List[str]:
+        """Postal codes requested at least `min_hits` times over the last `hot_days` whose rows expire
+        within `ahead_hours` (or already have), most requested first, then popular rows holding an
+        upstream error, which are retried whatever their expiry."""
+        exclude = set(exclude)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT c.postal_code
+                    FROM (
+                        SELECT postal_code, COUNT(*) hits FROM lookup_events
+                        WHERE requested_at >= datetime('now', :hot) AND {REQUEST_EVENTS}
+                        GROUP BY postal_code
+                        HAVING COUNT(*) >= :min_hits
+                    ) h
+                    JOIN postal_code_cache c ON c.postal_code = h.postal_code
+                    WHERE c.status != 'invalid' AND (c.expires_at <= datetime('now', :ahead) OR c.status = 'error')
+                    ORDER BY c.expires_at > datetime('now', :ahead), h.hits DESC, c.expires_at
+                    LIMIT :limit
+                    """,
+                    {
+                        "hot": f"-{int(hot_days)} days",
+                        "min_hits": int(min_hits),
+                        "ahead": f"+{int(ahead_hours * 3600)} seconds",
+                        "limit": limit + len(exclude),
+                    },
+                ).fetchall()
+                return [row[0] for row in rows if row[0] not in exclude][:limit]
+        except sqlite3.Error as e:
+            logger.error("Error finding postal codes to refresh: %s", e)
+            return []
+
+    @timed_db
+    def count_recent_lookups(self, endpoint: str, seconds: int = 3600) -> int:
+        """Lookup events recorded for `endpoint` over the last `seconds`, across all workers."""
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    "SELECT COUNT(*) FROM lookup_events WHERE requested_at >= datetime('now', ?) AND endpoint = ?",
+                    (f"-{int(seconds)} seconds", endpoint),
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Error counting recent %s lookups: %s", endpoint, e)
+            return 0
+
+    @timed_db
     def get_cache_stats(self) -> Dict[str, Any]:
         try:
             with self._connect() as conn:
@@ -618,8 +1404,12 @@ class CacheManager:
                 )
                 oldest, newest = cursor.fetchone()
 
-                cursor.execute("SELECT COUNT(*) FROM lookup_events")
+                # Ids only grow and retention deletes the oldest rows, so the id span approximates
+                # COUNT(*) from two index lookups instead of a full scan.
+                cursor.execute("SELECT COALESCE(MAX(id) - MIN(id) + 1, 0) FROM lookup_events")
                 lookup_events = cursor.fetchone()[0]
+                cursor.execute("SELECT COALESCE(SUM(lookups), 0) FROM lookup_event_daily")
+                lookup_events_rolled_up = cursor.fetchone()[0]
 
                 db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
 
@@ -635,11 +1425,14 @@ class CacheManager:
                     "database_size_bytes": db_size,
                     "cache_duration_days": self.cache_duration_days,
                     "lookup_events": lookup_events,
+                    "lookup_events_rolled_up": lookup_events_rolled_up,
+                    "event_retention_days": self.event_retention_days,
                 }
         except sqlite3.Error as e:
             logger.error("Error getting cache stats: %s", e)
             return {}
 
+    @timed_db
     def list_cache_entries(
         self,
         status: Optional[str] = None,
@@ -691,6 +1484,7 @@ class CacheManager:
         )
         return data
 
+    @timed_db
     def get_daily_cache_counts(self, days: int = 14) -> List[Dict[str, Any]]:
         try:
             with self._connect() as conn:
@@ -713,6 +1507,7 @@ class CacheManager:
             logger.error("Error getting daily cache counts: %s", e)
             return []
 
+    @timed_db
     def get_lookup_event_summary(self, days: int = 7) -> Dict[str, Any]:
         try:
             with self._connect() as conn:
@@ -746,60 +1541,193 @@ class CacheManager:
                     """,
                     (f"-{int(days)} days",),
                 )
-                row["by_day"] = [dict(r) for r in cursor.fetchall()]
-                return {k: (v or 0) for k, v in row.items()}
+                # Only the counts become 0 on an empty window; by_day stays a list for the rollup merge.
+                summary = {k: (v or 0) for k, v in row.items()}
+                summary["by_day"] = [dict(r) for r in cursor.fetchall()]
+                self._add_rolled_up_events(cursor, summary, days)
+                summary["stage_latency_ms"] = self._stage_latency_percentiles(cursor, days)
+                return summary
         except sqlite3.Error as e:
             logger.error("Error getting lookup event summary: %s", e)
             return {}
 
-    def get_dashboard_summary(self) -> Dict[str, Any]:
+    @timed_db
+    def get_refresh_ahead_counts(self, days: int = 7) -> Dict[str, int]:
+        """Refresh-ahead lookups, request-path cache hits on postal codes refreshed earlier in the window
+        (hits), and request-path upstream lookups of postal codes requested earlier in it (misses).
+
+        This walks every event in the window per postal code, so RefreshAheadWorker runs it once a
+        pass and keeps the result; dashboard loads read that instead.
+        """
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"""
+                    SELECT COALESCE(SUM(endpoint IS 'refresh'), 0) refreshes,
+                           COALESCE(SUM(request AND from_cache = 1 AND refreshed > 0), 0) hits,
+                           COALESCE(SUM(request AND from_cache = 0 AND source = 'upstream' AND requested > 0), 0) misses
+                    FROM (
+                        SELECT endpoint, from_cache, source, {REQUEST_EVENTS} request,
+                               SUM(endpoint IS 'refresh' AND status != 'error') OVER earlier refreshed,
+                               SUM({REQUEST_EVENTS}) OVER earlier requested
+                        FROM lookup_events
+                        WHERE requested_at >= datetime('now', ?)
+                        WINDOW earlier AS (
+                            PARTITION BY postal_code ORDER BY requested_at, id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                        )
+                    )
+                    """,
+                    (f"-{int(days)} days",),
+                ).fetchone()
+                return dict(row)
+        except sqlite3.Error as e:
+            logger.error("Error counting refresh-ahead hits and misses: %s", e)
+            return {}
+
+    def _add_rolled_up_events(self, cursor: sqlite3.Cursor, summary: Dict[str, Any], days: int) -> None:
+        """Fold daily aggregates into a summary whose window reaches past raw event retention."""
+        cursor.execute(
+            """
+            SELECT day,
+                   SUM(lookups) lookups,
+                   SUM(CASE WHEN status = 'success' THEN lookups ELSE 0 END) successful,
+                   SUM(CASE WHEN status != 'success' THEN lookups ELSE 0 END) failed,
+                   SUM(CASE WHEN from_cache = 1 THEN lookups ELSE 0 END) cache_hits,
+                   SUM(CASE WHEN source = 'upstream' THEN lookups ELSE 0 END) upstream_attempts
+            FROM lookup_event_daily
+            WHERE day >= date('now', ?)
+            GROUP BY day
+            ORDER BY day DESC
+            """,
+            (f"-{int(days)} days",),
+        )
+        rolled_up = [dict(r) for r in cursor.fetchall()]
+        for day in rolled_up:
+            for key in ("lookups", "successful", "failed", "cache_hits", "upstream_attempts"):
+                summary[key] = summary.get(key, 0) + (day[key] or 0)
+        # Rolled-up days are all older than the raw events still in the table.
+        summary["by_day"] = summary.get("by_day", []) + rolled_up
+
+    @timed_db
+    def rollup_lookup_events(
+        self,
+        retention_days: Optional[int] = None,
+        batch_size: int = 5000,
+        pause_seconds: float = 0.0,
+        max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Roll raw lookup events older than the retention window into lookup_event_daily and delete them.
+
+        Each batch aggregates and deletes the same rows in one short transaction, so an interrupted
+        run never double counts and other writers only wait for one batch at a time.
+        """
+        retention_days = self.event_retention_days if retention_days is None else retention_days
+        rolled_up = 0
+        batches = 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT date('now', ?)", (f"-{int(retention_days)} days",))
+                cutoff = cursor.fetchone()[0]
+
+                while max_batches is None or batches < max_batches:
+                    cursor.execute(
+                        """
+                        SELECT requested_at FROM lookup_events
+                        WHERE requested_at < ?
+                        ORDER BY requested_at
+                        LIMIT 1 OFFSET ?
+                        """,
+                        (cutoff, max(0, int(batch_size) - 1)),
+                    )
+                    bound = cursor.fetchone()
+                    condition = "requested_at < ?" + (" AND requested_at <= ?" if bound else "")
+                    params = (cutoff, bound[0]) if bound else (cutoff,)
+
+                    archive = self._archive_lookup_events(cursor, condition, params) if self.event_archive_dir else {}
+                    cursor.execute(
+                        f"""
+                        INSERT INTO lookup_event_daily (
+                            day, endpoint, source, status, from_cache, lookups, duration_ms_total, duration_ms_max
+                        )
+                        SELECT date(requested_at), COALESCE(endpoint, ''), source, status, COALESCE(from_cache, 0),
+                               COUNT(*), COALESCE(SUM(duration_ms), 0), MAX(duration_ms)
+                        FROM lookup_events
+                        WHERE {condition}
+                        GROUP BY 1, 2, 3, 4, 5
+                        ON CONFLICT (day, endpoint, source, status, from_cache) DO UPDATE SET
+                            lookups = lookups + excluded.lookups,
+                            duration_ms_total = duration_ms_total + excluded.duration_ms_total,
+                            duration_ms_max = MAX(COALESCE(duration_ms_max, 0), COALESCE(excluded.duration_ms_max, 0))
+                        """,
+                        params,
+                    )
+                    cursor.execute(f"DELETE FROM lookup_events WHERE {condition}", params)
+                    deleted = cursor.rowcount
+                    conn.commit()
+                    self._append_archive(archive)
+
+                    if deleted <= 0:
+                        break
+                    rolled_up += deleted
+                    batches += 1
+                    if not bound:
+                        break
+                    if pause_seconds:
+                        time.sleep(pause_seconds)
+
+            if rolled_up:
+                logger.info("Rolled up %s lookup events older than %s in %s batches", rolled_up, cutoff, batches)
+            return {"rolled_up": rolled_up, "batches": batches, "cutoff": cutoff}
+        except (sqlite3.Error, OSError) as e:
+            logger.error("Error rolling up lookup events: %s", e)
+            return {"rolled_up": rolled_up, "batches": batches, "error": str(e)}
+
+    def _archive_lookup_events(self, cursor: sqlite3.Cursor, condition: str, params: tuple) -> Dict[str, bytes]:
+        """Gzipped NDJSON of the rows about to be rolled up, by archive file (one per day).
+
+        Nothing is written until the batch commits (_append_archive), so a failed commit leaves no
+        lines behind to be archived again on the next run.
+        """
+        cursor.execute(f"SELECT * FROM lookup_events WHERE {condition} ORDER BY requested_at", params)
+        by_day: Dict[str, List[str]] = {}
+        for row in cursor.fetchall():
+            event = dict(row)
+            by_day.setdefault(str(event["requested_at"])[:10], []).append(json.dumps(event, separators=(",", ":")))
         return {
-            "cache_stats": self.get_cache_stats(),
-            "daily_cache_counts": self.get_daily_cache_counts(30),
-            "lookup_events_7d": self.get_lookup_event_summary(7),
-            "recent_failures": self.list_cache_entries(status="error", limit=50),
+            os.path.join(self.event_archive_dir, f"lookup_events-{day}.ndjson.gz"): gzip.compress(
+                ("\n".join(lines) + "\n").encode("utf-8")
+            )
+            for day, lines in by_day.items()
         }
 
-    def export_cache_csv(self, include_expired: bool = False) -> str:
-        rows = self.list_cache_entries(limit=5000, include_expired=include_expired)
-        output = io.StringIO()
-        fieldnames = [
-            "postal_code",
-            "status",
-            "message",
-            "segment_number",
-            "segment_name",
-            "segment_description",
-            "who_they_are",
-            "average_household_income",
-            "average_household_net_worth",
-            "average_household_net_worth_amount",
-            "education",
-            "urbanity",
-            "occupation",
-            "diversity",
-            "family_life",
-            "tenure",
-            "home_type",
-            "income_level",
-            "lifestage",
-            "social_group",
-            "official_language",
-            "population",
-            "households",
-            "percent_total_households",
-            "latitude",
-            "longitude",
-            "cached_at",
-            "expires_at",
-            "confirmed",
-        ]
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow({field: row.get(field, "") for field in fieldnames})
-        return output.getvalue()
+    def _append_archive(self, archive: Dict[str, bytes]) -> None:
+        """Append committed batches to their archive files; gzip readers read appended members as one stream."""
+        if archive:
+            os.makedirs(self.event_archive_dir, exist_ok=True)
+        for path, member in archive.items():
+            with open(path, "ab") as handle:
+                handle.write(member)
+
+    def _stage_latency_percentiles(self, cursor: sqlite3.Cursor, days: int) -> Dict[str, Dict[str, Optional[int]]]:
+        """Nearest-rank p50/p95/p99 per lookup stage, over events that ran that stage, from one scan of
+        the window that reads every stage column."""
+        cursor.execute(
+            f"SELECT {', '.join(f'{stage}_ms' for stage in LOOKUP_STAGES)} FROM lookup_events "
+            "WHERE requested_at >= datetime('now', ?)",
+            (f"-{int(days)} days",),
+        )
+        values: List[List[int]] = [[] for _ in LOOKUP_STAGES]
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for stage_values, column in zip(values, zip(*rows)):
+                stage_values.extend(value for value in column if value is not None)
+
+        return self._latency_percentiles(values)
 
+    @timed_db
     def clear_cache(self) -> bool:
         try:
             with self._connect() as conn:
@@ -814,9 +1742,10 @@ class CacheManager:
     def is_cached(self, postal_code: str) -> bool:
         return self.get_cached_data(postal_code) is not None
 
+    @timed_db
     def delete_cached_data(self, postal_code: str) -> bool:
         try:
-            postal_code = self._normalize_postal_code(postal_code)
+            postal_code = self.normalize_postal_code(postal_code)
             with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM postal_code_cache WHERE postal_code = ?", (postal_code,))
@@ -826,6 +1755,345 @@ class CacheManager:
             logger.error("Error deleting cached data for %s: %s", postal_code, e)
             return False
 
+    @timed_db
+    def create_batch_job(self, postal_codes: List[str]) -> Optional[str]:
+        """Queue a batch job; background workers pick it up from the database."""
+        job_id = str(uuid.uuid4())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO batch_jobs (id, total) VALUES (?, ?)", (job_id, len(postal_codes)))
+                cursor.executemany(
+                    "INSERT INTO batch_job_items (job_id, item_index, postal_code) VALUES (?, ?, ?)",
+                    ((job_id, index, postal_code) for index, postal_code in enumerate(postal_codes)),
+                )
+                conn.commit()
+                return job_id
+        except sqlite3.Error as e:
+            logger.error("Error creating batch job: %s", e)
+            return None
+
+    @timed_db
+    def claim_batch_job(self, worker_id: str, lease_seconds: int = 300) -> Optional[str]:
+        """Lease the oldest queued job, or a running job whose worker stopped renewing its lease."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET status = 'running', worker_id = ?, lease_expires_at = datetime('now', ?),
+                        started_at = COALESCE(started_at, CURRENT_TIMESTAMP), updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM batch_jobs
+                        WHERE status = 'queued' OR (status = 'running' AND lease_expires_at <= datetime('now'))
+                        ORDER BY created_at ASC
+                        LIMIT 1
+                    )
+                    RETURNING id
+                    """,
+                    (worker_id, f"{int(lease_seconds):+d} seconds"),
+                )
+                row = cursor.fetchone()
+                conn.commit()
+                return row["id"] if row else None
+        except sqlite3.Error as e:
+            logger.error("Error claiming batch job: %s", e)
+            return None
+
+    @timed_db
+    def renew_batch_job_lease(self, job_id: str, worker_id: str, lease_seconds: int = 300) -> bool:
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET lease_expires_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND worker_id = ? AND status = 'running'
+                    """,
+                    (f"{int(lease_seconds):+d} seconds", job_id, worker_id),
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error("Error renewing lease for batch job %s: %s", job_id, e)
+            return False
+
+    @timed_db
+    def get_pending_batch_job_items(self, job_id: str, limit: int = 20) -> List[tuple[int, str]]:
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT item_index, postal_code
+                    FROM batch_job_items
+                    WHERE job_id = ? AND processed_at IS NULL
+                    ORDER BY item_index ASC
+                    LIMIT ?
+                    """,
+                    (job_id, limit),
+                )
+                return [(row["item_index"], row["postal_code"]) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error("Error reading pending items for batch job %s: %s", job_id, e)
+            return []
+
+    @timed_db
+    def checkpoint_batch_job(self, job_id: str, results: List[tuple[int, Dict[str, Any]]]) -> bool:
+        """Store a chunk of results and advance the job counters in one transaction."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    UPDATE batch_job_items
+                    SET status = ?, result_json = ?, processed_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ? AND item_index = ? AND processed_at IS NULL
+                    """,
+                    (
+                        (self._normalize_status(result.get("status")), json.dumps(result), job_id, index)
+                        for index, result in results
+                    ),
+                )
+                cursor.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET processed = (SELECT COUNT(*) FROM batch_job_items WHERE job_id = ? AND processed_at IS NOT NULL),
+                        successful = (SELECT COUNT(*) FROM batch_job_items WHERE job_id = ? AND status = 'success'),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    """,
+                    (job_id, job_id, job_id),
+                )
+                cursor.execute("UPDATE batch_jobs SET failed = processed - successful WHERE id = ?", (job_id,))
+                conn.commit()
+                return True
+        except sqlite3.Error as e:
+            logger.error("Error checkpointing batch job %s: %s", job_id, e)
+            return False
+
+    @timed_db
+    def finish_batch_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP,
+                        lease_expires_at = NULL
+                    WHERE id = ?
+                    """,
+                    (status, error, job_id),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error("Error finishing batch job %s: %s", job_id, e)
+
+    @timed_db
+    def get_batch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT id, status, total, processed, successful, failed, created_at, started_at,
+                           finished_at, updated_at, error,
+                           (julianday(COALESCE(finished_at, CURRENT_TIMESTAMP)) - julianday(started_at)) * 86400.0
+                               AS elapsed_seconds
+                    FROM batch_jobs
+                    WHERE id = ?
+                    """,
+                    (job_id,),
+                )
+                row = cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error reading batch job %s: %s", job_id, e)
+            return None
+
+        if not row:
+            return None
+        job = dict(row)
+        elapsed = job.pop("elapsed_seconds") or 0
+        job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+        job["elapsed_seconds"] = round(elapsed, 1)
+        job["throughput_per_second"] = round(job["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+        return job
+
+    def iter_batch_job_results(self, job_id: str, chunk_size: int = 500):
+        """Yield (index, postal_code, result) in request order without loading the whole job."""
+        last_index = -1
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        """
+                        SELECT item_index, postal_code, result_json
+                        FROM batch_job_items
+                        WHERE job_id = ? AND item_index > ?
+                        ORDER BY item_index ASC
+                        LIMIT ?
+                        """,
+                        (job_id, last_index, chunk_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return
+                    for row in rows:
+                        result = json.loads(row["result_json"]) if row["result_json"] else None
+                        yield row["item_index"], row["postal_code"], result
+                    last_index = rows[-1]["item_index"]
+        except sqlite3.Error as e:
+            logger.error("Error reading results for batch job %s: %s", job_id, e)
+
+    def iter_table_rows(self, table: str, columns: List[str], batch_size: int = 50000, include_expired: bool = True):
+        """Yield lists of column tuples from an analytics table in rowid order, one short read per batch."""
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"unsupported export table: {table}")
+        unknown = set(columns) - EXPORT_TABLES[table]
+        if unknown:
+            raise ValueError(f"unknown {table} columns: {', '.join(sorted(unknown))}")
+        expired_filter = "" if include_expired or table != "postal_code_cache" else "AND expires_at > datetime('now')"
+        last_rowid = 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        f"""
+                        SELECT rowid, {", ".join(columns)} FROM {table}
+                        WHERE rowid > ? {expired_filter}
+                        ORDER BY rowid
+                        LIMIT ?
+                        """,
+                        (last_rowid, batch_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return
+                    last_rowid = rows[-1][0]
+                    yield [tuple(row)[1:] for row in rows]
+        except sqlite3.Error as e:
+            logger.error("Error reading %s for export: %s", table, e)
+            raise
+
+    def iter_cache_entries(self, include_expired: bool = False, batch_size: int = 1000):
+        """Yield cached responses in postal code order, one short keyset-paginated read per batch."""
+        expired_filter = "" if include_expired else "AND expires_at > datetime('now')"
+        last_postal_code = ""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        f"""
+                        SELECT postal_code, {", ".join(ENTRY_FIELDS)}, geography_json, attributes_json
+                        FROM postal_code_cache
+                        WHERE postal_code > ? {expired_filter}
+                        ORDER BY postal_code
+                        LIMIT ?
+                        """,
+                        (last_postal_code, batch_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return
+                    last_postal_code = rows[-1]["postal_code"]
+                    for row in rows:
+                        yield self._row_to_response_dict(row)
+        except sqlite3.Error as e:
+            logger.error("Error scanning cache entries: %s", e)
+            raise
+
+    def iter_lookup_events(self, days: Optional[int] = None, batch_size: int = 1000):
+        """Yield lookup events oldest first, each with its stage timings as a dict."""
+        stage_columns = ", ".join(f"{stage}_ms" for stage in LOOKUP_STAGES)
+        window_filter = "" if days is None else "AND requested_at >= datetime('now', ?)"
+        window = () if days is None else (f"-{int(days)} days",)
+        last_id = 0
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        f"""
+                        SELECT id, requested_at, postal_code, status, source, endpoint, batch_id, message,
+                               from_cache, duration_ms, {stage_columns}
+                        FROM lookup_events
+                        WHERE id > ? {window_filter}
+                        ORDER BY id
+                        LIMIT ?
+                        """,
+                        (last_id, *window, batch_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return
+                    last_id = rows[-1]["id"]
+                    for row in rows:
+                        yield {
+                            "requested_at": row["requested_at"],
+                            "postal_code": row["postal_code"],
+                            "status": row["status"],
+                            "source": row["source"],
+                            "endpoint": row["endpoint"],
+                            "batch_id": row["batch_id"],
+                            "message": row["message"],
+                            "from_cache": bool(row["from_cache"]),
+                            "duration_ms": row["duration_ms"],
+                            "stage_timings": {
+                                stage: row[f"{stage}_ms"] for stage in LOOKUP_STAGES if row[f"{stage}_ms"] is not None
+                            },
+                        }
+        except sqlite3.Error as e:
+            logger.error("Error scanning lookup events: %s", e)
+            raise
+
+
+# Embedded backends, which synthetic_cache.py compare-backends can build in a scratch directory.
+BACKENDS = ("sqlite", "lmdb")
+
+
+def create_cache_backend(name: Optional[str] = None, path: Optional[str] = None) -> CacheBackend:
+    """Build the cache backend named by PRIZM_CACHE_BACKEND: sqlite (default), lmdb or postgres.
+
+    `path` is the database file or directory; for postgres it is the DSN (default PRIZM_POSTGRES_DSN).
+    """
+    name = name or os.environ.get("PRIZM_CACHE_BACKEND", "sqlite")
+    if name == "sqlite":
+        return CacheManager(db_path=path)
+    if name == "lmdb":
+        if lmdb_cache is None:
+            raise RuntimeError("PRIZM_CACHE_BACKEND=lmdb needs lmdb and msgpack (requirements-lmdb.txt)")
+        return lmdb_cache.LMDBCacheBackend(path=path)
+    if name == "postgres":
+        if postgres_cache is None:
+            raise RuntimeError("PRIZM_CACHE_BACKEND=postgres needs psycopg and psycopg-pool (requirements-postgres.txt)")
+        return postgres_cache.PostgresCacheBackend(dsn=path)
+    raise ValueError(f"unknown cache backend: {name}")
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+# Global cache manager instance, built on first use so importing this module does not open the database
+cache_manager = LazyObject(CacheManager)
+
+# Where the lookup path reads and writes cached results: the SQLite cache_manager itself unless
+# PRIZM_CACHE_BACKEND names another engine.
+CACHE_BACKEND = os.environ.get("PRIZM_CACHE_BACKEND", "sqlite")
+cache_store = cache_manager if CACHE_BACKEND == "sqlite" else LazyObject(create_cache_backend)
+
+# Where lookup events are recorded and read. A Postgres cache_store is shared by every instance, so they
+# follow it there; otherwise they go to SQLite, which an LMDB cache_store leaves them in.
+dashboard_store = cache_store if CACHE_BACKEND == "postgres" else cache_manager
 
-# Global cache manager instance
-cache_manager = CacheManager()
+# Where batch jobs are queued, claimed and read: in Postgres any instance can run or report a job, while
+# with SQLite or LMDB jobs stay in the instance's own SQLite database.
+job_store = dashboard_store
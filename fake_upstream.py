@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Local stand-in for the PRIZM geocoder and Supabase REST API.
+
+Serves the three upstream calls PrizmClient makes (Supabase rural table,
+geocoder, Supabase segment profile) from the fixture CSVs in this repo, with a
+lognormal latency and a configurable error rate per request. Postal codes that
+are not in the fixtures get a stable segment derived from the code, so load
+tests can use as many distinct postal codes as they like.
+
+    python fake_upstream.py --port 9100 --latency-ms 40 --error-rate 0.01
+
+Then point the API at it:
+
+    PRIZM_GEOCODER_API_URL=http://127.0.0.1:9100 PRIZM_SUPABASE_URL=http://127.0.0.1:9100
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_FILES = [
+    "prizm_import_09102025.csv",
+    "prizm_import_09112025.csv",
+    "postal_code_demographics_clean.csv",
+]
+
+SEGMENT_COLUMNS = {
+    "segment_name": "PRIZM Name",
+    "segment_description": "PRIZM Descriptor",
+    "education": "Education",
+    "urbanity": "Urbanity",
+    "occupation": "Job Type",
+    "diversity": "Cultural Diversity Index",
+    "family_life": "Family Status",
+    "tenure": "Tenure",
+    "home_type": "Dwelling Type",
+}
+
+
+def load_fixtures(paths: Optional[list[str]] = None) -> tuple[Dict[str, int], Dict[int, Dict[str, Any]]]:
+    """Read postal code -> segment and segment -> Supabase-style profile rows from the fixture CSVs."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    postal_segments: Dict[str, int] = {}
+    segments: Dict[int, Dict[str, Any]] = {}
+    for path in paths or [os.path.join(base_dir, name) for name in FIXTURE_FILES]:
+        if not os.path.exists(path):
+            continue
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            for row in csv.DictReader(handle):
+                segment = (row.get("segment_number") or "").strip()
+                if not segment.isdigit():
+                    continue
+                segment_number = int(segment)
+                postal_segments[(row.get("postal_code") or "").replace(" ", "").upper()] = segment_number
+                profile = segments.setdefault(segment_number, {"Segment Number": segment_number})
+                for column, supabase_column in SEGMENT_COLUMNS.items():
+                    if row.get(column) and not profile.get(supabase_column):
+                        profile[supabase_column] = row[column].strip()
+                income = re.sub(r"[$,\s]", "", row.get("average_household_income") or "")
+                if income.isdigit() and "Average Income" not in profile:
+                    profile["Average Income"] = income
+    return postal_segments, segments
+
+
+class FakeUpstream:
+    """Threaded HTTP server answering geocoder and Supabase requests from fixture data."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 40,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        fixtures: Optional[list[str]] = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.postal_segments, self.segments = load_fixtures(fixtures)
+        self.requests = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstream":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def segment_for(self, postal_code: str) -> int:
+        compact = postal_code.replace(" ", "").upper()
+        if compact in self.postal_segments:
+            return self.postal_segments[compact]
+        return zlib.crc32(compact.encode("ascii", "ignore")) % 67 + 1
+
+    def segment_row(self, segment_number: int) -> Dict[str, Any]:
+        return self.segments.get(segment_number) or {
+            "Segment Number": segment_number,
+            "PRIZM Name": f"Segment {segment_number}",
+            "PRIZM Descriptor": f"Synthetic segment {segment_number}",
+            "Average Income": str(60000 + segment_number * 1500),
+        }
+
+    def delay_and_fail(self) -> bool:
+        """Sleep for one sampled latency; True when this request should fail."""
+        with self.random_lock:
+            self.requests += 1
+            delay = self.random.lognormvariate(math.log(max(self.latency_ms, 0.001)), self.latency_sigma) / 1000
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        return failed
+
+    def _handler_class(self) -> type:
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+                if upstream.delay_and_fail():
+                    return self.send_json(503, {"message": "injected upstream error"})
+
+                if parts.path.endswith("/rural_postal_codes"):
+                    postal_code = query.get("FSALDU", "").removeprefix("eq.")
+                    # Roughly half of rural-looking codes resolve from the table; the rest fall through to the geocoder.
+                    rows = [{"FSALDU": postal_code, "PRIZM": upstream.segment_for(postal_code)}]
+                    return self.send_json(200, rows if zlib.crc32(postal_code.encode()) % 2 else [])
+
+                if parts.path.endswith("/prizm_quick_reference"):
+                    segment = query.get('"Segment Number"', "").removeprefix("eq.")
+                    if segment.isdigit():
+                        return self.send_json(200, [upstream.segment_row(int(segment))])
+                    return self.send_json(200, [upstream.segment_row(number) for number in range(1, 68)])
+
+                self.send_json(404, {"message": "unknown table"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if upstream.delay_and_fail():
+                    return self.send_json(503, {"message": "injected upstream error"})
+
+                postal_code = ((payload.get("postalCodes") or [{}])[0].get("postalCode") or "").upper()
+                segment_number = upstream.segment_for(postal_code)
+                self.send_json(200, {
+                    "1": {
+                        "found": True,
+                        "postal": postal_code,
+                        "lat": 49.0 + segment_number / 100,
+                        "lon": -123.0 - segment_number / 100,
+                        "segmentation": {"codes": {"PZMLLIC": str(segment_number)}},
+                        "geography": {"names": {"FSA": postal_code[:3], "FSALDU": postal_code}},
+                        "attributes": {"isBusiness": False, "isApartment": False, "isLicensed": True},
+                    }
+                })
+
+            def send_json(self, status: int, payload: Any) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local PRIZM geocoder/Supabase stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=40, help="median upstream latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma; larger means a longer tail")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.host, args.port, args.latency_ms, args.latency_sigma, args.error_rate, args.seed)
+    print(f"Fake PRIZM upstream listening on {upstream.url}")
+    try:
+        upstream.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
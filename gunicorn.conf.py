@@ -0,0 +1,32 @@
+"""Gunicorn hooks. Gunicorn loads ./gunicorn.conf.py automatically; bind/worker settings stay on the command line."""
+
+import os
+import shutil
+
+# Workers share Prometheus samples through this directory. It has to be set
+# before any worker imports prometheus_client, so it is set here in the master.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prizm-metrics")
+
+
+def on_starting(server):
+    # Samples left by a previous master would be summed into the new run.
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Resume queued or orphaned batch jobs as soon as a worker boots, and open
+    # upstream connections before the first cold lookup needs them.
+    from app import prizm_client, start_background_workers
+
+    start_background_workers()
+    # Checked here so the lazily built client is not constructed at boot just to do nothing.
+    if int(os.environ.get("PRIZM_PREWARM_CONNECTIONS", "0")) > 0:
+        prizm_client.warm_connections()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
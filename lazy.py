@@ -0,0 +1,47 @@
+"""Lazily constructed module-level singletons.
+
+`cache_manager` and `prizm_client` are imported all over the app, but building
+them opens the cache database and sets up HTTP pools. A LazyObject stands in
+for the real instance and builds it on first attribute access, so importing a
+module (a gunicorn worker booting, a test importing app) does no I/O.
+"""
+
+import threading
+from typing import Any, Callable
+
+
+class LazyObject:
+    """Forwards attribute access, assignment and deletion to an instance built on first use."""
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> Any:
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def is_resolved(self) -> bool:
+        return object.__getattribute__(self, "_instance") is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # unittest.mock.patch sets and deletes attributes; they belong on the real instance.
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        if self.is_resolved():
+            return repr(self._resolve())
+        return f"<LazyObject {getattr(object.__getattribute__(self, '_factory'), '__name__', 'factory')} (not built)>"
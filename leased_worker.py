@@ -0,0 +1,145 @@
+"""Background tasks that run in passes, one worker at a time.
+
+Every web worker starts the same daemon thread for a task, and each thread
+wakes every `interval` seconds or when `trigger()` is called. A named lease row
+in the cache database (`maintenance_leases`) makes sure only one of them runs a
+pass at a time. The pass owner renews the lease between batches and stores the
+pass's progress on the same row, so `progress()` reports the same thing on
+every worker. If the owner dies, the lease runs out and another worker takes
+the next pass.
+"""
+
+import logging
+import os
+import socket
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeasedWorker(ABC):
+    """Runs a task's passes on a daemon thread under a maintenance lease.
+
+    Subclasses set LEASE_NAME, THREAD_NAME and DESCRIPTION and implement `_pass_fields` (the progress
+    a pass starts from) and `_run_pass` (the work, reported through `_update`).
+    """
+
+    LEASE_NAME = ""
+    THREAD_NAME = ""
+    DESCRIPTION = ""
+    # Progress fields reset whenever the worker goes idle.
+    IDLE_FIELDS: Dict[str, Any] = {}
+
+    def __init__(self, cache_manager: Any, interval_seconds: float, lease_seconds: int) -> None:
+        self.cache_manager = cache_manager
+        self.interval = interval_seconds
+        self.lease_seconds = lease_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._progress: Dict[str, Any] = {"state": "idle"}
+        self._owner: Optional[str] = None  # set while this worker holds the lease
+
+    def start(self) -> None:
+        """Start the worker thread once per process."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._thread = None
+
+    def trigger(self) -> Dict[str, Any]:
+        """Ask for a pass now and return without waiting for it."""
+        self.start()
+        with self._lock:
+            if self._progress["state"] == "idle":
+                self._progress["state"] = "queued"
+        self._wake.set()
+        return self.progress()
+
+    def progress(self) -> Dict[str, Any]:
+        """The pass running in this process, else the last or running pass of any worker (from the lease row)."""
+        with self._lock:
+            local = dict(self._progress)
+        if local["state"] == "running":
+            return local
+        shared = self.cache_manager.get_maintenance_progress(self.LEASE_NAME)
+        if shared is None:
+            return local
+        if local["state"] == "queued" and shared["state"] == "idle":
+            return {**shared, "state": "queued"}
+        return shared
+
+    def _update(self, **values: Any) -> None:
+        with self._lock:
+            self._progress.update(values)
+            progress = dict(self._progress)
+            owner = self._owner
+        if owner:
+            self.cache_manager.save_maintenance_progress(self.LEASE_NAME, owner, progress)
+
+    def _renew(self) -> None:
+        self.cache_manager.acquire_maintenance_lease(self.LEASE_NAME, self._owner, self.lease_seconds)
+
+    def _worker_id(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once()
+            except Exception as exc:
+                logger.exception("%s pass failed", self.DESCRIPTION)
+                self._update(state="idle", error=str(exc), **self.IDLE_FIELDS)
+
+    def run_once(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Run one full pass in the calling thread; on_progress is called after every batch."""
+        owner = self._worker_id()
+        if not self.cache_manager.acquire_maintenance_lease(self.LEASE_NAME, owner, self.lease_seconds):
+            logger.info("%s pass skipped; another worker holds the lease", self.DESCRIPTION)
+            self._update(state="idle", skipped_at=_now(), **self.IDLE_FIELDS)
+            return self.progress()
+
+        self._owner = owner
+        try:
+            fields = self._pass_fields()
+            self._update(state="running", started_at=_now(), finished_at=None, error=None, **fields)
+            self._run_pass(fields, on_progress)
+        except Exception as exc:
+            self._update(error=str(exc))
+            raise
+        finally:
+            self._update(state="idle", finished_at=_now(), **self.IDLE_FIELDS)
+            self._owner = None
+            self.cache_manager.release_maintenance_lease(self.LEASE_NAME, owner)
+
+        with self._lock:
+            return dict(self._progress)
+
+    @abstractmethod
+    def _pass_fields(self) -> Dict[str, Any]:
+        """Progress fields a new pass starts from, e.g. its counters at zero."""
+
+    @abstractmethod
+    def _run_pass(self, fields: Dict[str, Any], on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        """Do the work of one pass, reporting through _update and calling on_progress after every batch."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,481 @@
+"""Embedded LMDB cache backend with msgpack-encoded values.
+
+LMDB is a memory-mapped B+tree. A cache hit is one read-only transaction (no
+lock, no syscall once the pages are mapped) plus one msgpack decode, which
+suits the lookup path: nearly all of its work is point reads and single-key
+writes. Gunicorn workers can share one environment, and LMDB serializes their
+writers with its own lock. Needs lmdb and msgpack
+(`pip install -r requirements-lmdb.txt`).
+
+One environment (a directory) holds three named databases:
+- cache: postal code -> msgpack map of the ENTRY_FIELDS, geography, attributes,
+  cached_at, expires_at (epoch seconds), confirmed and has_html
+- html: postal code -> raw HTML, kept apart so that hits never decode it
+- events: big-endian nanosecond timestamp, pid and counter -> msgpack lookup event
+
+Dashboard and admin queries scan the cache database. The app records lookup
+events, batch jobs and maintenance leases in the SQLite cache database either
+way; the FSA index and nearby search need the SQLite backend.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import lmdb
+import msgpack
+
+from cache_backend import ENTRY_FIELDS, LOOKUP_STAGES, CacheBackend, CacheEntry, DurationPolicy
+from metrics import timed_db
+
+logger = logging.getLogger(__name__)
+
+# Fields the dashboard search matches, as the SQL backends' LIKE conditions do.
+SEARCH_FIELDS = ("postal_code", "segment_name", "segment_number", "message")
+
+
+def _utc_timestamp(epoch: Optional[float] = None) -> str:
+    """The format SQLite's CURRENT_TIMESTAMP and datetime('now') use."""
+    moment = datetime.fromtimestamp(epoch, timezone.utc) if epoch is not None else datetime.now(timezone.utc)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class LMDBCacheBackend(CacheBackend):
+    """CacheBackend on an LMDB environment; values are msgpack maps."""
+
+    def __init__(self, path: Optional[str] = None, cache_duration_days: Optional[int] = None, map_size_mb: Optional[int] = None):
+        self.path = path or os.environ.get("PRIZM_LMDB_PATH", "prizm_cache.lmdb")
+        self.cache_duration_days = cache_duration_days or int(os.environ.get("PRIZM_CACHE_DURATION_DAYS", "90"))
+        map_size_mb = map_size_mb or int(os.environ.get("PRIZM_LMDB_MAP_SIZE_MB", "8192"))
+        os.makedirs(self.path, exist_ok=True)
+        # The map size is only an address-space reservation; the file grows as data is written.
+        # Readahead is off because lookups touch random pages and readahead would evict useful ones.
+        self.env = lmdb.open(self.path, map_size=map_size_mb * 1024 * 1024, max_dbs=3, readahead=False)
+        self._cache = self.env.open_db(b"cache")
+        self._html = self.env.open_db(b"html")
+        self._events = self.env.open_db(b"events")
+        self._event_ids = itertools.count()
+
+    def close(self) -> None:
+        self.env.close()
+
+    def _pack_entry(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        duration_days: int,
+        has_html: bool,
+        previous: Optional[bytes] = None,
+    ) -> bytes:
+        """Pack a lookup result; like CacheManager, an unchanged segment keeps confirmed and cached_at."""
+        data_to_cache = data.copy()
+        data_to_cache.pop("_cache_info", None)
+        if "prizm_code" in data_to_cache and "segment_number" not in data_to_cache:
+            data_to_cache["segment_number"] = data_to_cache["prizm_code"]
+        entry = self._entry_fields(data_to_cache)
+        old = msgpack.unpackb(previous) if previous is not None else None
+        same_segment = old is not None and old["segment_number"] == entry["segment_number"]
+        entry.update(
+            postal_code=postal_code,
+            geography=data_to_cache.get("geography") or None,
+            attributes=data_to_cache.get("attributes") or None,
+            cached_at=old["cached_at"] if same_segment else _utc_timestamp(),
+            expires_at=time.time() + duration_days * 86400,
+            confirmed=old["confirmed"] if same_segment else False,
+            has_html=has_html,
+        )
+        return msgpack.packb(entry)
+
+    def _unpack_response(self, value: bytes, include_expired: bool) -> Optional[Dict[str, Any]]:
+        entry = msgpack.unpackb(value)
+        if not include_expired and entry["expires_at"] <= time.time():
+            return None
+        # Entries written before a field joined ENTRY_FIELDS do not have it.
+        for name in ENTRY_FIELDS:
+            entry.setdefault(name, None)
+        response = self._response_from_fields(entry, entry["geography"], entry["attributes"])
+        response["_cache_info"] = {
+            "cached_at": entry["cached_at"],
+            "from_cache": True,
+            "has_html": entry["has_html"],
+            "confirmed": entry["confirmed"],
+        }
+        return response
+
+    @timed_db
+    def get_cached_data(self, postal_code: str, include_expired: bool = False) -> Optional[Dict[str, Any]]:
+        postal_code = self.normalize_postal_code(postal_code)
+        try:
+            with self.env.begin(db=self._cache) as txn:
+                value = txn.get(postal_code.encode())
+        except lmdb.Error as e:
+            logger.error("Error retrieving cached data for %s: %s", postal_code, e)
+            return None
+        return None if value is None else self._unpack_response(value, include_expired)
+
+    @timed_db
+    def get_cached_many(self, postal_codes: Iterable[str], include_expired: bool = False) -> Dict[str, Dict[str, Any]]:
+        keys = {self.normalize_postal_code(postal_code) for postal_code in postal_codes}
+        try:
+            with self.env.begin(db=self._cache) as txn:
+                values = [(key, txn.get(key.encode())) for key in sorted(keys)]
+        except lmdb.Error as e:
+            logger.error("Error retrieving %s cached postal codes: %s", len(keys), e)
+            return {}
+        results = {}
+        for key, value in values:
+            response = None if value is None else self._unpack_response(value, include_expired)
+            if response is not None:
+                results[key] = response
+        return results
+
+    @timed_db
+    def cache_data(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        custom_duration_days: Optional[int] = None,
+        html_content: Optional[str] = None,
+    ) -> bool:
+        postal_code = self.normalize_postal_code(postal_code)
+        duration_days = custom_duration_days if custom_duration_days is not None else self.cache_duration_days
+        key = postal_code.encode()
+        try:
+            with self.env.begin(write=True) as txn:
+                previous = txn.get(key, db=self._cache)
+                txn.put(
+                    key,
+                    self._pack_entry(postal_code, data, duration_days, html_content is not None, previous),
+                    db=self._cache,
+                )
+                if html_content is not None:
+                    txn.put(key, html_content.encode(), db=self._html)
+                else:
+                    txn.delete(key, db=self._html)
+            return True
+        except lmdb.Error as e:
+            logger.error("Error caching data for %s: %s", postal_code, e)
+            return False
+
+    @timed_db
+    def cache_many(
+        self,
+        entries: Iterable[CacheEntry],
+        custom_duration_days: Optional[int] = None,
+        duration_policy: Optional[DurationPolicy] = None,
+    ) -> int:
+        """Store several lookup results in one write transaction."""
+        written = 0
+        try:
+            with self.env.begin(write=True) as txn:
+                for postal_code, data in entries:
+                    postal_code = self.normalize_postal_code(postal_code)
+                    key = postal_code.encode()
+                    duration_days = self._duration_days(data, custom_duration_days, duration_policy)
+                    previous = txn.get(key, db=self._cache)
+                    txn.put(key, self._pack_entry(postal_code, data, duration_days, False, previous), db=self._cache)
+                    txn.delete(key, db=self._html)
+                    written += 1
+            return written
+        except lmdb.Error as e:
+            logger.error("Error caching %s postal codes: %s", written, e)
+            return 0
+
+    @timed_db
+    def delete_cached_data(self, postal_code: str) -> bool:
+        key = self.normalize_postal_code(postal_code).encode()
+        try:
+            with self.env.begin(write=True) as txn:
+                txn.delete(key, db=self._html)
+                return txn.delete(key, db=self._cache)
+        except lmdb.Error as e:
+            logger.error("Error deleting cached data for %s: %s", postal_code, e)
+            return False
+
+    @timed_db
+    def clear_cache(self) -> bool:
+        try:
+            with self.env.begin(write=True) as txn:
+                txn.drop(self._cache, delete=False)
+                txn.drop(self._html, delete=False)
+            return True
+        except lmdb.Error as e:
+            logger.error("Error clearing cache: %s", e)
+            return False
+
+    def _set_confirmed(self, postal_code: str, confirmed: bool) -> bool:
+        key = self.normalize_postal_code(postal_code).encode()
+        try:
+            with self.env.begin(write=True, db=self._cache) as txn:
+                value = txn.get(key)
+                entry = msgpack.unpackb(value) if value is not None else None
+                if entry is None or entry["expires_at"] <= time.time():
+                    return False
+                entry["confirmed"] = confirmed
+                txn.put(key, msgpack.packb(entry))
+            return True
+        except lmdb.Error as e:
+            logger.error("Error setting confirmed=%s for %s: %s", confirmed, postal_code, e)
+            return False
+
+    @timed_db
+    def confirm_data(self, postal_code: str) -> bool:
+        return self._set_confirmed(postal_code, True)
+
+    @timed_db
+    def unconfirm_data(self, postal_code: str) -> bool:
+        return self._set_confirmed(postal_code, False)
+
+    @timed_db
+    def get_unconfirmed_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        try:
+            entries = [entry for entry in self._iter_valid_entries() if not entry["confirmed"] and entry["status"] == "success"]
+        except lmdb.Error as e:
+            logger.error("Error getting unconfirmed entries: %s", e)
+            return []
+        return [
+            {name: entry[name] for name in ("postal_code", "segment_number", "segment_name", "cached_at")}
+            for entry in heapq.nlargest(limit, entries, key=lambda entry: entry["cached_at"])
+        ]
+
+    @timed_db
+    def get_cached_html(self, postal_code: str) -> Optional[str]:
+        key = self.normalize_postal_code(postal_code).encode()
+        try:
+            with self.env.begin() as txn:
+                value = txn.get(key, db=self._cache)
+                if value is None or msgpack.unpackb(value)["expires_at"] <= time.time():
+                    return None
+                html_content = txn.get(key, db=self._html)
+        except lmdb.Error as e:
+            logger.error("Error retrieving cached HTML for %s: %s", postal_code, e)
+            return None
+        return html_content.decode() if html_content else None
+
+    @timed_db
+    def delete_expired_batch(self, batch_size: int = 500) -> int:
+        """Delete up to batch_size expired entries, in key order; LMDB keeps no index on expiry."""
+        now = time.time()
+        expired = []
+        try:
+            for batch in self._iter_batches(self._cache, b"", 10000):
+                expired.extend(key for key, value in batch if msgpack.unpackb(value)["expires_at"] <= now)
+                if len(expired) >= batch_size:
+                    break
+            deleted = 0
+            with self.env.begin(write=True) as txn:
+                for key in expired[:batch_size]:
+                    value = txn.get(key, db=self._cache)
+                    # Skip entries cached again since the scan.
+                    if value is None or msgpack.unpackb(value)["expires_at"] > now:
+                        continue
+                    txn.delete(key, db=self._html)
+                    deleted += txn.delete(key, db=self._cache)
+            return deleted
+        except lmdb.Error as e:
+            logger.error("Error cleaning up expired cache: %s", e)
+            return 0
+
+    def _iter_batches(self, db: Any, start: bytes, batch_size: int) -> Iterator[list]:
+        """Yield (key, value) lists in key order from `start`, one short read transaction per batch."""
+        last = None
+        while True:
+            batch = []
+            with self.env.begin(db=db) as txn:
+                cursor = txn.cursor()
+                if not cursor.set_range(last or start):
+                    return
+                for key, value in cursor:
+                    if key == last:
+                        continue
+                    batch.append((key, value))
+                    if len(batch) >= batch_size:
+                        break
+            if not batch:
+                return
+            last = batch[-1][0]
+            yield batch
+
+    def _iter_valid_entries(self, include_expired: bool = False) -> Iterator[Dict[str, Any]]:
+        """Stored entries (unpacked, every ENTRY_FIELDS key present) in postal code order."""
+        now = time.time()
+        for batch in self._iter_batches(self._cache, b"", 10000):
+            for _, value in batch:
+                entry = msgpack.unpackb(value)
+                if include_expired or entry["expires_at"] > now:
+                    for name in ENTRY_FIELDS:
+                        entry.setdefault(name, None)
+                    yield entry
+
+    def iter_cache_entries(self, include_expired: bool = False, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        for batch in self._iter_batches(self._cache, b"", batch_size):
+            for _, value in batch:
+                response = self._unpack_response(value, include_expired)
+                if response is not None:
+                    response.pop("_cache_info")
+                    yield response
+
+    @timed_db
+    def get_cache_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        total_entries = valid_entries = confirmed_entries = 0
+        status_counts: Dict[str, int] = {}
+        oldest = newest = None
+        try:
+            for batch in self._iter_batches(self._cache, b"", 10000):
+                for _, value in batch:
+                    entry = msgpack.unpackb(value)
+                    total_entries += 1
+                    if entry["expires_at"] <= now:
+                        continue
+                    valid_entries += 1
+                    confirmed_entries += bool(entry["confirmed"])
+                    status_counts[entry["status"]] = status_counts.get(entry["status"], 0) + 1
+                    oldest = min(oldest or entry["cached_at"], entry["cached_at"])
+                    newest = max(newest or entry["cached_at"], entry["cached_at"])
+            with self.env.begin() as txn:
+                lookup_events = txn.stat(self._events)["entries"]
+            info, stat = self.env.info(), self.env.stat()
+        except lmdb.Error as e:
+            logger.error("Error getting cache stats: %s", e)
+            return {}
+        return {
+            "total_entries": total_entries,
+            "valid_entries": valid_entries,
+            "expired_entries": total_entries - valid_entries,
+            "confirmed_entries": confirmed_entries,
+            "unconfirmed_entries": valid_entries - confirmed_entries,
+            "status_breakdown": status_counts,
+            "oldest_entry": oldest,
+            "newest_entry": newest,
+            "database_size_bytes": (info["last_pgno"] + 1) * stat["psize"],
+            "cache_duration_days": self.cache_duration_days,
+            "lookup_events": lookup_events,
+        }
+
+    # Dashboard queries scan every entry; LMDB has no secondary indexes to narrow them.
+
+    @timed_db
+    def list_cache_entries(
+        self,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0,
+        include_expired: bool = False,
+    ) -> List[Dict[str, Any]]:
+        limit = max(1, min(int(limit), 5000))
+        offset = max(0, int(offset))
+        status = self._normalize_status(status) if status else None
+        needle = search.strip().upper() if search else None
+        try:
+            entries = [
+                entry
+                for entry in self._iter_valid_entries(include_expired)
+                if (status is None or entry["status"] == status)
+                and (needle is None or any(needle in str(entry[name] or "").upper() for name in SEARCH_FIELDS))
+            ]
+        except lmdb.Error as e:
+            logger.error("Error listing cache entries: %s", e)
+            return []
+        # Newest first, then postal code order, as the SQL backends sort.
+        entries.sort(key=lambda entry: entry["cached_at"], reverse=True)
+        return [self._dashboard_row(entry) for entry in entries[offset : offset + limit]]
+
+    def _dashboard_row(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        data = self._response_from_fields(entry, entry["geography"], entry["attributes"])
+        data.update(
+            {
+                "cached_at": entry["cached_at"],
+                "expires_at": _utc_timestamp(entry["expires_at"]),
+                "confirmed": bool(entry["confirmed"]),
+            }
+        )
+        return data
+
+    @timed_db
+    def get_daily_cache_counts(self, days: int = 14) -> List[Dict[str, Any]]:
+        since = _utc_timestamp(time.time() - int(days) * 86400)
+        counts: Dict[str, Dict[str, Any]] = {}
+        try:
+            for entry in self._iter_valid_entries(include_expired=True):
+                if entry["cached_at"] < since:
+                    continue
+                date = entry["cached_at"][:10]
+                day = counts.setdefault(date, {"day": date, "total": 0, "successful": 0, "failed": 0})
+                day["total"] += 1
+                day["successful" if entry["status"] == "success" else "failed"] += 1
+        except lmdb.Error as e:
+            logger.error("Error getting daily cache counts: %s", e)
+            return []
+        return [counts[day] for day in sorted(counts, reverse=True)]
+
+    @timed_db
+    def get_lookup_event_summary(self, days: int = 7) -> Dict[str, Any]:
+        keys = ("lookups", "successful", "failed", "cache_hits", "upstream_attempts")
+        summary: Dict[str, Any] = dict.fromkeys(keys, 0)
+        by_day: Dict[str, Dict[str, Any]] = {}
+        timings: List[List[int]] = [[] for _ in LOOKUP_STAGES]
+        try:
+            for event in self.iter_lookup_events(days):
+                date = event["requested_at"][:10]
+                day = by_day.setdefault(date, {"day": date, **dict.fromkeys(keys, 0)})
+                for counts in (summary, day):
+                    counts["lookups"] += 1
+                    counts["successful" if event["status"] == "success" else "failed"] += 1
+                    counts["cache_hits"] += bool(event["from_cache"])
+                    counts["upstream_attempts"] += event["source"] == "upstream"
+                for stage_timings, stage in zip(timings, LOOKUP_STAGES):
+                    if stage in event["stage_timings"]:
+                        stage_timings.append(event["stage_timings"][stage])
+        except lmdb.Error as e:
+            logger.error("Error getting lookup event summary: %s", e)
+            return {}
+        summary["by_day"] = [by_day[day] for day in sorted(by_day, reverse=True)]
+        summary["stage_latency_ms"] = self._latency_percentiles(timings)
+        return summary
+
+    @timed_db
+    def record_lookup_event(
+        self,
+        postal_code: str,
+        status: str,
+        source: str,
+        endpoint: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        message: Optional[str] = None,
+        from_cache: bool = False,
+        duration_ms: Optional[int] = None,
+        stage_timings: Optional[Dict[str, int]] = None,
+    ) -> None:
+        stage_timings = stage_timings or {}
+        event = {
+            "requested_at": _utc_timestamp(),
+            "postal_code": self.normalize_postal_code(postal_code),
+            "status": status,
+            "source": source,
+            "endpoint": endpoint,
+            "batch_id": batch_id,
+            "message": message,
+            "from_cache": bool(from_cache),
+            "duration_ms": duration_ms,
+            "stage_timings": {stage: stage_timings[stage] for stage in LOOKUP_STAGES if stage_timings.get(stage) is not None},
+        }
+        # Time-ordered keys; pid and a per-process counter keep events from different workers apart.
+        key = struct.pack(">QIQ", time.time_ns(), os.getpid(), next(self._event_ids))
+        try:
+            with self.env.begin(write=True, db=self._events) as txn:
+                txn.put(key, msgpack.packb(event))
+        except lmdb.Error as e:
+            logger.error("Error recording lookup event for %s: %s", postal_code, e)
+
+    def iter_lookup_events(self, days: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        start = b"" if days is None else struct.pack(">Q", time.time_ns() - int(days) * 86400 * 10**9)
+        for batch in self._iter_batches(self._events, start, batch_size):
+            for _, value in batch:
+                yield msgpack.unpackb(value)
@@ -0,0 +1,101 @@
+"""Prometheus metrics for the PRIZM API.
+
+Under gunicorn, every worker is a separate process. gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR at a shared directory so each worker writes its
+samples there and /metrics aggregates all of them. Without that variable (tests,
+`python app.py`) metrics live in the default in-process registry.
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+REQUEST_LATENCY = Histogram(
+    "prizm_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "prizm_cache_lookups_total",
+    "Cache lookups by tier and outcome",
+    ["tier", "result"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "prizm_upstream_request_duration_seconds",
+    "Upstream call latency by target",
+    ["target"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "prizm_upstream_errors_total",
+    "Failed upstream calls by target and error type",
+    ["target", "error"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "prizm_cache_db_duration_seconds",
+    "SQLite time by CacheManager method",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "prizm_batch_size",
+    "Postal codes per batch request or job",
+    ["endpoint"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000),
+)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Exposition text for /metrics, aggregated across workers when multiprocess mode is on."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def observe_cache_lookup(tier: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(tier=tier, result="hit" if hit else "miss").inc()
+
+
+@contextmanager
+def upstream_call(target: str) -> Iterator[None]:
+    """Time one upstream call; failures are counted by exception type and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as exc:
+        UPSTREAM_ERRORS.labels(target=target, error=type(exc).__name__).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(target=target).observe(time.perf_counter() - started)
+
+
+def timed_db(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Record the duration of a CacheManager method under its own name."""
+    histogram = DB_QUERY_LATENCY.labels(method=func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
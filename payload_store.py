@@ -0,0 +1,140 @@
+"""Store of raw upstream payloads, so cache rows can be re-derived offline.
+
+The client keeps only a handful of fields from each upstream response. When that
+mapping changes, every cached postal code would need a fresh upstream call. So
+each cached lookup also stores the raw responses it was built from: the geocoder
+result or rural postal code row, and the segment row. They are stored as
+zlib-compressed JSON, keyed by (lookup key, geocoder vintage, endpoint). The
+lookup key is the postal code, or the segment number for segment rows.
+`cache_cli.py rederive` rebuilds cache rows from them without spending quota.
+
+The store is its own SQLite file, next to the cache manager's database
+(`<cache db>.payloads`) unless PRIZM_PAYLOAD_DB_PATH says otherwise. Keeping it
+out of the cache database keeps it out of the reporting snapshot copies too.
+It is local to each instance, also with the Postgres backend, so `rederive`
+only sees the payloads of lookups that instance made.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from cache_manager_new import cache_manager
+from lazy import LazyObject
+from metrics import timed_db
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamPayloadStore:
+    """Compressed raw upstream payloads in a SQLite file, keyed by (lookup key, vintage, endpoint)."""
+
+    def __init__(self, db_path: Optional[str] = None):
+        # Resolved here rather than at import so that importing this module does not build cache_manager.
+        self.db_path = db_path or os.environ.get("PRIZM_PAYLOAD_DB_PATH") or f"{cache_manager.db_path}.payloads"
+        self._init_database()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_database(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS upstream_payloads (
+                    lookup_key TEXT NOT NULL,
+                    vintage TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (lookup_key, vintage, endpoint)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.commit()
+
+    @timed_db
+    def store_payloads(self, payloads: Iterable[tuple]) -> int:
+        """Store (lookup key, vintage, endpoint, payload) tuples in one transaction; a newer payload
+        replaces the stored one."""
+        rows = [
+            (lookup_key, vintage, endpoint, zlib.compress(json.dumps(payload, separators=(",", ":")).encode()))
+            for lookup_key, vintage, endpoint, payload in payloads
+        ]
+        if not rows:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO upstream_payloads (lookup_key, vintage, endpoint, payload)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (lookup_key, vintage, endpoint) DO UPDATE SET
+                        payload = excluded.payload,
+                        fetched_at = CURRENT_TIMESTAMP
+                    """,
+                    rows,
+                )
+                conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            logger.error("Error storing %s upstream payloads: %s", len(rows), e)
+            return 0
+
+    @timed_db
+    def get_payloads(self, vintage: str, endpoint: str) -> Dict[str, Any]:
+        """Every payload for one vintage and endpoint, by lookup key (meant for the small segment table)."""
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT lookup_key, payload FROM upstream_payloads WHERE vintage = ? AND endpoint = ?",
+                    (vintage, endpoint),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error reading %s upstream payloads: %s", endpoint, e)
+            return {}
+        return {row["lookup_key"]: json.loads(zlib.decompress(row["payload"])) for row in rows}
+
+    def iter_payloads(self, vintage: str, endpoints: Iterable[str], batch_size: int = 1000) -> Iterator[tuple]:
+        """Yield (lookup key, endpoint, payload) for one vintage in lookup key order, one short
+        keyset-paginated read per batch."""
+        endpoints = tuple(endpoints)
+        last = ("", "")
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute(
+                        f"""
+                        SELECT lookup_key, endpoint, payload FROM upstream_payloads
+                        WHERE vintage = ? AND endpoint IN ({", ".join("?" for _ in endpoints)})
+                          AND (lookup_key, endpoint) > (?, ?)
+                        ORDER BY lookup_key, endpoint
+                        LIMIT ?
+                        """,
+                        (vintage, *endpoints, *last, batch_size),
+                    )
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return
+                    last = (rows[-1]["lookup_key"], rows[-1]["endpoint"])
+                    for row in rows:
+                        yield row["lookup_key"], row["endpoint"], json.loads(zlib.decompress(row["payload"]))
+        except sqlite3.Error as e:
+            logger.error("Error scanning upstream payloads: %s", e)
+            raise
+
+
+# Global payload store, built on first use like cache_manager
+payload_store = LazyObject(UpstreamPayloadStore)
@@ -0,0 +1,851 @@
+"""PostgreSQL cache backend for running several web instances against one cache.
+
+SQLite on local disk limits a deployment to one instance. With
+PRIZM_CACHE_BACKEND=postgres, every instance reads and writes the cache and
+the lookup event log in one Postgres database. The dashboard, CSV export and
+weekly report read the same data, so every instance shows the same numbers.
+Connections come from a psycopg_pool pool in each worker
+(PRIZM_POSTGRES_POOL_MIN / PRIZM_POSTGRES_POOL_MAX). Needs psycopg and
+psycopg-pool (`pip install -r requirements-postgres.txt`).
+
+Writes are `INSERT ... ON CONFLICT DO UPDATE` upserts. cache_many streams rows
+into a temporary table with COPY and upserts them all in one statement. This
+is the path CSV imports take.
+
+The table stores what CacheManager stores, with native types: timestamptz for
+cached_at / expires_at, JSONB for geography and attributes, BIGINT for
+currency amounts. Range labels such as "$1M to $2.15M" are kept only in the
+display columns.
+
+Batch jobs live here too (`batch_jobs` / `batch_job_items`), so a job queued on
+one instance can be run and polled on any other; workers claim jobs with
+`FOR UPDATE SKIP LOCKED`. The janitor deletes expired rows here, again with
+SKIP LOCKED, so passes on several instances at once do not contend.
+Maintenance leases, the FSA index and nearby search stay on each instance's
+local SQLite database.
+"""
+
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import ConnectionPool
+
+from cache_backend import ENTRY_FIELDS, LOOKUP_STAGES, TEXT_FIELDS, CacheBackend, CacheEntry, DurationPolicy
+from metrics import timed_db
+
+logger = logging.getLogger(__name__)
+
+COLUMN_TYPES = {
+    **{name: "TEXT" for name in TEXT_FIELDS},
+    "average_household_income": "BIGINT",
+    "average_household_net_worth": "BIGINT",
+    "average_household_net_worth_amount": "BIGINT",
+    "average_household_income_display": "TEXT",
+    "average_household_net_worth_display": "TEXT",
+    "latitude": "DOUBLE PRECISION",
+    "longitude": "DOUBLE PRECISION",
+    "geocoder_found": "BOOLEAN",
+    "status": "TEXT NOT NULL",
+}
+
+# Every postal_code_cache column the backend writes, in COPY / INSERT order.
+WRITE_COLUMNS = (
+    "postal_code",
+    *ENTRY_FIELDS,
+    "geography_json",
+    "attributes_json",
+    "confirmed",
+    "cached_at",
+    "expires_at",
+    "html_content",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS postal_code_cache (
+    postal_code TEXT PRIMARY KEY,
+    {", ".join(f"{name} {COLUMN_TYPES[name]}" for name in ENTRY_FIELDS)},
+    geography_json JSONB,
+    attributes_json JSONB,
+    confirmed BOOLEAN NOT NULL DEFAULT FALSE,
+    cached_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    html_content TEXT
+);
+-- Columns added to ENTRY_FIELDS after a database was created.
+ALTER TABLE postal_code_cache {", ".join(f"ADD COLUMN IF NOT EXISTS {name} {COLUMN_TYPES[name]}" for name in ENTRY_FIELDS)};
+CREATE INDEX IF NOT EXISTS idx_postal_code_cache_expires_at ON postal_code_cache (expires_at);
+CREATE INDEX IF NOT EXISTS idx_postal_code_cache_cached_at ON postal_code_cache (cached_at);
+CREATE INDEX IF NOT EXISTS idx_postal_code_cache_status ON postal_code_cache (status, expires_at);
+
+CREATE TABLE IF NOT EXISTS lookup_events (
+    id BIGSERIAL PRIMARY KEY,
+    requested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    postal_code TEXT NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    endpoint TEXT,
+    batch_id TEXT,
+    message TEXT,
+    from_cache BOOLEAN NOT NULL DEFAULT FALSE,
+    duration_ms INTEGER,
+    {", ".join(f"{stage}_ms INTEGER" for stage in LOOKUP_STAGES)}
+);
+CREATE INDEX IF NOT EXISTS idx_lookup_events_requested_at ON lookup_events (requested_at);
+
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    worker_id TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_batch_jobs_status ON batch_jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS batch_job_items (
+    job_id TEXT NOT NULL,
+    item_index INTEGER NOT NULL,
+    postal_code TEXT NOT NULL,
+    status TEXT,
+    result_json JSONB,
+    processed_at TIMESTAMPTZ,
+    PRIMARY KEY (job_id, item_index)
+);
+"""
+
+# Arbitrary key for pg_advisory_xact_lock, so workers booting together create the schema once.
+SCHEMA_LOCK_KEY = 0x7072697A6D
+
+# percentile_disc is the nearest-rank percentile CacheManager computes with LIMIT 1 OFFSET.
+STAGE_PERCENTILES = ", ".join(
+    f"COUNT({stage}_ms) {stage}_count, "
+    f"percentile_disc(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY {stage}_ms) {stage}_percentiles"
+    for stage in LOOKUP_STAGES
+)
+
+# Same semantics as CacheManager: a postal code whose segment is unchanged keeps confirmed and cached_at.
+# (Postgres needs no SQLite-style key-field split: a HOT update skips indexes whose values did not change.)
+_SAME_SEGMENT = "postal_code_cache.segment_number IS NOT DISTINCT FROM EXCLUDED.segment_number"
+UPSERT_SET = ", ".join(
+    f"{column} = CASE WHEN {_SAME_SEGMENT} THEN postal_code_cache.{column} ELSE EXCLUDED.{column} END"
+    if column in ("confirmed", "cached_at")
+    else f"{column} = EXCLUDED.{column}"
+    for column in WRITE_COLUMNS
+    if column != "postal_code"
+)
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Format a timestamptz the way SQLite's CURRENT_TIMESTAMP reads back (UTC, whole seconds)."""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S") if value is not None else None
+
+
+class PostgresCacheBackend(CacheBackend):
+    """CacheBackend on a PostgreSQL database shared by every instance."""
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        cache_duration_days: Optional[int] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ):
+        self.dsn = dsn or os.environ.get("PRIZM_POSTGRES_DSN") or os.environ.get("DATABASE_URL", "")
+        if not self.dsn:
+            raise RuntimeError("PRIZM_CACHE_BACKEND=postgres needs PRIZM_POSTGRES_DSN or DATABASE_URL")
+        self.cache_duration_days = cache_duration_days or int(os.environ.get("PRIZM_CACHE_DURATION_DAYS", "90"))
+        self.pool = ConnectionPool(
+            self.dsn,
+            min_size=min_size or int(os.environ.get("PRIZM_POSTGRES_POOL_MIN", "1")),
+            max_size=max_size or int(os.environ.get("PRIZM_POSTGRES_POOL_MAX", "10")),
+            kwargs={"row_factory": dict_row},
+            name="prizm-cache",
+            open=True,
+        )
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+            conn.execute(SCHEMA)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _write_values(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        duration_days: int,
+        html_content: Optional[str],
+        now: datetime,
+    ) -> tuple:
+        """Column values for WRITE_COLUMNS, coerced to the Postgres column types."""
+        data_to_cache = data.copy()
+        data_to_cache.pop("_cache_info", None)
+        if "prizm_code" in data_to_cache and "segment_number" not in data_to_cache:
+            data_to_cache["segment_number"] = data_to_cache["prizm_code"]
+        fields = self._entry_fields(data_to_cache)
+        for name in ("average_household_income", "average_household_net_worth", "average_household_net_worth_amount"):
+            if not isinstance(fields[name], int):
+                fields[name] = None
+        for name in ("latitude", "longitude"):
+            if not isinstance(fields[name], float):
+                fields[name] = None
+        if fields["geocoder_found"] is not None:
+            fields["geocoder_found"] = bool(fields["geocoder_found"])
+        geography = data_to_cache.get("geography")
+        attributes = data_to_cache.get("attributes")
+        return (
+            postal_code,
+            *(fields[name] for name in ENTRY_FIELDS),
+            Jsonb(geography) if geography else None,
+            Jsonb(attributes) if attributes else None,
+            False,
+            now,
+            now + timedelta(days=duration_days),
+            html_content,
+        )
+
+    def _response(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return self._response_from_fields(row, row["geography_json"], row["attributes_json"])
+
+    def _cached_response(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._response(row)
+        response["_cache_info"] = {
+            "cached_at": _timestamp(row["cached_at"]),
+            "from_cache": True,
+            "has_html": row["has_html"],
+            "confirmed": row["confirmed"],
+        }
+        return response
+
+    def _dashboard_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        data = self._response(row)
+        data.update(
+            {
+                "cached_at": _timestamp(row["cached_at"]),
+                "expires_at": _timestamp(row["expires_at"]),
+                "confirmed": row["confirmed"],
+            }
+        )
+        return data
+
+    # Everything but html_content, which only /api/debug/html reads.
+    _SELECT = f"""
+        SELECT postal_code, {", ".join(ENTRY_FIELDS)}, geography_json, attributes_json, confirmed,
+               cached_at, expires_at, html_content IS NOT NULL AS has_html
+        FROM postal_code_cache
+    """
+
+    @timed_db
+    def get_cached_data(self, postal_code: str, include_expired: bool = False) -> Optional[Dict[str, Any]]:
+        postal_code = self.normalize_postal_code(postal_code)
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    f"{self._SELECT} WHERE postal_code = %s AND (%s OR expires_at > now())",
+                    (postal_code, include_expired),
+                ).fetchone()
+        except psycopg.Error as e:
+            logger.error("Error retrieving cached data for %s: %s", postal_code, e)
+            return None
+        if row is None:
+            logger.info("Cache miss for postal code %s", postal_code)
+            return None
+        return self._cached_response(row)
+
+    @timed_db
+    def get_cached_many(self, postal_codes: Iterable[str], include_expired: bool = False) -> Dict[str, Dict[str, Any]]:
+        keys = sorted({self.normalize_postal_code(postal_code) for postal_code in postal_codes})
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"{self._SELECT} WHERE postal_code = ANY(%s) AND (%s OR expires_at > now())",
+                    (keys, include_expired),
+                ).fetchall()
+        except psycopg.Error as e:
+            logger.error("Error retrieving %s cached postal codes: %s", len(keys), e)
+            return {}
+        return {row["postal_code"]: self._cached_response(row) for row in rows}
+
+    @timed_db
+    def cache_data(
+        self,
+        postal_code: str,
+        data: Dict[Any, Any],
+        custom_duration_days: Optional[int] = None,
+        html_content: Optional[str] = None,
+    ) -> bool:
+        postal_code = self.normalize_postal_code(postal_code)
+        duration_days = custom_duration_days if custom_duration_days is not None else self.cache_duration_days
+        values = self._write_values(postal_code, data, duration_days, html_content, datetime.now(timezone.utc))
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    f"""
+                    INSERT INTO postal_code_cache ({", ".join(WRITE_COLUMNS)})
+                    VALUES ({", ".join("%s" for _ in WRITE_COLUMNS)})
+                    ON CONFLICT (postal_code) DO UPDATE SET {UPSERT_SET}
+                    """,
+                    values,
+                )
+            logger.info("Cached data for postal code %s (duration: %s days)", postal_code, duration_days)
+            return True
+        except psycopg.Error as e:
+            logger.error("Error caching data for %s: %s", postal_code, e)
+            return False
+
+    @timed_db
+    def cache_many(
+        self,
+        entries: Iterable[CacheEntry],
+        custom_duration_days: Optional[int] = None,
+        duration_policy: Optional[DurationPolicy] = None,
+    ) -> int:
+        """COPY the entries into a temporary table, then upsert them in one statement."""
+        now = datetime.now(timezone.utc)
+        # One row per postal code (the last one wins), since ON CONFLICT cannot touch a row twice.
+        rows = {}
+        for postal_code, data in entries:
+            postal_code = self.normalize_postal_code(postal_code)
+            duration_days = self._duration_days(data, custom_duration_days, duration_policy)
+            rows[postal_code] = self._write_values(postal_code, data, duration_days, None, now)
+        if not rows:
+            return 0
+        columns = ", ".join(WRITE_COLUMNS)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    "CREATE TEMP TABLE cache_import (LIKE postal_code_cache INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                with conn.cursor() as cursor:
+                    with cursor.copy(f"COPY cache_import ({columns}) FROM STDIN") as copy:
+                        for values in rows.values():
+                            copy.write_row(values)
+                    cursor.execute(
+                        f"""
+                        INSERT INTO postal_code_cache ({columns})
+                        SELECT {columns} FROM cache_import
+                        ON CONFLICT (postal_code) DO UPDATE SET {UPSERT_SET}
+                        """
+                    )
+                    return cursor.rowcount
+        except psycopg.Error as e:
+            logger.error("Error caching %s postal codes: %s", len(rows), e)
+            return 0
+
+    @timed_db
+    def delete_cached_data(self, postal_code: str) -> bool:
+        postal_code = self.normalize_postal_code(postal_code)
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute("DELETE FROM postal_code_cache WHERE postal_code = %s", (postal_code,)).rowcount > 0
+        except psycopg.Error as e:
+            logger.error("Error deleting cached data for %s: %s", postal_code, e)
+            return False
+
+    @timed_db
+    def delete_expired_batch(self, batch_size: int = 500) -> int:
+        """Delete up to batch_size expired entries, oldest expiry first; rows another pass holds are skipped."""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(
+                    """
+                    DELETE FROM postal_code_cache
+                    WHERE postal_code IN (
+                        SELECT postal_code FROM postal_code_cache
+                        WHERE expires_at <= now()
+                        ORDER BY expires_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    """,
+                    (int(batch_size),),
+                ).rowcount
+        except psycopg.Error as e:
+            logger.error("Error cleaning up expired cache: %s", e)
+            return 0
+
+    @timed_db
+    def clear_cache(self) -> bool:
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("TRUNCATE postal_code_cache")
+            return True
+        except psycopg.Error as e:
+            logger.error("Error clearing cache: %s", e)
+            return False
+
+    def _set_confirmed(self, postal_code: str, confirmed: bool) -> bool:
+        postal_code = self.normalize_postal_code(postal_code)
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE postal_code_cache SET confirmed = %s WHERE postal_code = %s AND expires_at > now()",
+                    (confirmed, postal_code),
+                )
+                return cursor.rowcount > 0
+        except psycopg.Error as e:
+            logger.error("Error setting confirmed=%s for %s: %s", confirmed, postal_code, e)
+            return False
+
+    @timed_db
+    def confirm_data(self, postal_code: str) -> bool:
+        return self._set_confirmed(postal_code, True)
+
+    @timed_db
+    def unconfirm_data(self, postal_code: str) -> bool:
+        return self._set_confirmed(postal_code, False)
+
+    @timed_db
+    def get_unconfirmed_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT postal_code, segment_number, segment_name, cached_at
+                    FROM postal_code_cache
+                    WHERE NOT confirmed AND expires_at > now() AND status = 'success'
+                    ORDER BY cached_at DESC
+                    LIMIT %s
+                    """,
+                    (limit,),
+                ).fetchall()
+        except psycopg.Error as e:
+            logger.error("Error getting unconfirmed entries: %s", e)
+            return []
+        return [{**row, "cached_at": _timestamp(row["cached_at"])} for row in rows]
+
+    @timed_db
+    def get_cached_html(self, postal_code: str) -> Optional[str]:
+        postal_code = self.normalize_postal_code(postal_code)
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT html_content FROM postal_code_cache WHERE postal_code = %s AND expires_at > now()",
+                    (postal_code,),
+                ).fetchone()
+        except psycopg.Error as e:
+            logger.error("Error retrieving cached HTML for %s: %s", postal_code, e)
+            return None
+        return row["html_content"] if row and row["html_content"] else None
+
+    def iter_cache_entries(self, include_expired: bool = False, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        last = ""
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"""
+                    {self._SELECT}
+                    WHERE postal_code > %s AND (%s OR expires_at > now())
+                    ORDER BY postal_code
+                    LIMIT %s
+                    """,
+                    (last, include_expired, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._response(row)
+            last = rows[-1]["postal_code"]
+
+    @timed_db
+    def get_cache_stats(self) -> Dict[str, Any]:
+        try:
+            with self.pool.connection() as conn:
+                totals = conn.execute(
+                    """
+                    SELECT COUNT(*) total_entries,
+                           COUNT(*) FILTER (WHERE expires_at > now()) valid_entries,
+                           COUNT(*) FILTER (WHERE expires_at > now() AND confirmed) confirmed_entries,
+                           MIN(cached_at) FILTER (WHERE expires_at > now()) oldest_entry,
+                           MAX(cached_at) FILTER (WHERE expires_at > now()) newest_entry
+                    FROM postal_code_cache
+                    """
+                ).fetchone()
+                status_counts = {
+                    row["status"]: row["entries"]
+                    for row in conn.execute(
+                        "SELECT status, COUNT(*) entries FROM postal_code_cache WHERE expires_at > now() GROUP BY status"
+                    )
+                }
+                # Same id-span estimate as CacheManager: two index lookups instead of a full count.
+                lookup_events = conn.execute("SELECT COALESCE(MAX(id) - MIN(id) + 1, 0) n FROM lookup_events").fetchone()["n"]
+                size = conn.execute(
+                    "SELECT pg_total_relation_size('postal_code_cache') + pg_total_relation_size('lookup_events') n"
+                ).fetchone()["n"]
+        except psycopg.Error as e:
+            logger.error("Error getting cache stats: %s", e)
+            return {}
+        return {
+            "total_entries": totals["total_entries"],
+            "valid_entries": totals["valid_entries"],
+            "expired_entries": totals["total_entries"] - totals["valid_entries"],
+            "confirmed_entries": totals["confirmed_entries"],
+            "unconfirmed_entries": totals["valid_entries"] - totals["confirmed_entries"],
+            "status_breakdown": status_counts,
+            "oldest_entry": _timestamp(totals["oldest_entry"]),
+            "newest_entry": _timestamp(totals["newest_entry"]),
+            "database_size_bytes": size,
+            "cache_duration_days": self.cache_duration_days,
+            "lookup_events": lookup_events,
+        }
+
+    @timed_db
+    def list_cache_entries(
+        self,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 500,
+        offset: int = 0,
+        include_expired: bool = False,
+    ) -> List[Dict[str, Any]]:
+        limit = max(1, min(int(limit), 5000))
+        offset = max(0, int(offset))
+        conditions = [] if include_expired else ["expires_at > now()"]
+        params: list[Any] = []
+
+        if status:
+            conditions.append("status = %s")
+            params.append(self._normalize_status(status))
+        if search:
+            like = f"%{search.strip()}%"
+            conditions.append(
+                "(postal_code ILIKE %s OR segment_name ILIKE %s OR segment_number ILIKE %s OR message ILIKE %s)"
+            )
+            params.extend([like, like, like, like])
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.extend([limit, offset])
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"{self._SELECT} {where_clause} ORDER BY cached_at DESC, postal_code ASC LIMIT %s OFFSET %s",
+                    params,
+                ).fetchall()
+        except psycopg.Error as e:
+            logger.error("Error listing cache entries: %s", e)
+            return []
+        return [self._dashboard_row(row) for row in rows]
+
+    @timed_db
+    def get_daily_cache_counts(self, days: int = 14) -> List[Dict[str, Any]]:
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(
+                    """
+                    SELECT to_char(cached_at AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day,
+                           COUNT(*) total,
+                           COUNT(*) FILTER (WHERE status = 'success') successful,
+                           COUNT(*) FILTER (WHERE status != 'success') failed
+                    FROM postal_code_cache
+                    WHERE cached_at >= now() - make_interval(days => %s::int)
+                    GROUP BY 1
+                    ORDER BY 1 DESC
+                    """,
+                    (int(days),),
+                ).fetchall()
+        except psycopg.Error as e:
+            logger.error("Error getting daily cache counts: %s", e)
+            return []
+
+    @timed_db
+    def get_lookup_event_summary(self, days: int = 7) -> Dict[str, Any]:
+        counts = """
+            COUNT(*) lookups,
+            COUNT(*) FILTER (WHERE status = 'success') successful,
+            COUNT(*) FILTER (WHERE status != 'success') failed,
+            COUNT(*) FILTER (WHERE from_cache) cache_hits,
+            COUNT(*) FILTER (WHERE source = 'upstream') upstream_attempts
+        """
+        window = "requested_at >= now() - make_interval(days => %s::int)"
+        try:
+            with self.pool.connection() as conn:
+                summary = conn.execute(f"SELECT {counts} FROM lookup_events WHERE {window}", (int(days),)).fetchone()
+                summary["by_day"] = conn.execute(
+                    f"""
+                    SELECT to_char(requested_at AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day, {counts}
+                    FROM lookup_events
+                    WHERE {window}
+                    GROUP BY 1
+                    ORDER BY 1 DESC
+                    """,
+                    (int(days),),
+                ).fetchall()
+                percentiles = conn.execute(
+                    f"SELECT {STAGE_PERCENTILES} FROM lookup_events WHERE {window}", (int(days),)
+                ).fetchone()
+        except psycopg.Error as e:
+            logger.error("Error getting lookup event summary: %s", e)
+            return {}
+        summary["stage_latency_ms"] = {
+            stage: {
+                "count": percentiles[f"{stage}_count"],
+                **dict(zip(("p50", "p95", "p99"), percentiles[f"{stage}_percentiles"] or (None, None, None))),
+            }
+            for stage in LOOKUP_STAGES
+        }
+        return summary
+
+    @timed_db
+    def record_lookup_event(
+        self,
+        postal_code: str,
+        status: str,
+        source: str,
+        endpoint: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        message: Optional[str] = None,
+        from_cache: bool = False,
+        duration_ms: Optional[int] = None,
+        stage_timings: Optional[Dict[str, int]] = None,
+    ) -> None:
+        stage_timings = stage_timings or {}
+        columns = (
+            "postal_code, status, source, endpoint, batch_id, message, from_cache, duration_ms, "
+            + ", ".join(f"{stage}_ms" for stage in LOOKUP_STAGES)
+        )
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    f"INSERT INTO lookup_events ({columns}) VALUES (%s, %s, %s, %s, %s, %s, %s, %s{', %s' * len(LOOKUP_STAGES)})",
+                    (
+                        self.normalize_postal_code(postal_code),
+                        self._normalize_status(status),
+                        source,
+                        endpoint,
+                        batch_id,
+                        message,
+                        bool(from_cache),
+                        duration_ms,
+                        *(stage_timings.get(stage) for stage in LOOKUP_STAGES),
+                    ),
+                )
+        except psycopg.Error as e:
+            logger.warning("Failed to record lookup event for %s: %s", postal_code, e)
+
+    def iter_lookup_events(self, days: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        window = "" if days is None else "AND requested_at >= now() - make_interval(days => %s::int)"
+        last = 0
+        while True:
+            params = (last, int(days), batch_size) if days is not None else (last, batch_size)
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT * FROM lookup_events WHERE id > %s {window} ORDER BY id LIMIT %s",
+                    params,
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield {
+                    "requested_at": _timestamp(row["requested_at"]),
+                    "postal_code": row["postal_code"],
+                    "status": row["status"],
+                    "source": row["source"],
+                    "endpoint": row["endpoint"],
+                    "batch_id": row["batch_id"],
+                    "message": row["message"],
+                    "from_cache": row["from_cache"],
+                    "duration_ms": row["duration_ms"],
+                    "stage_timings": {
+                        stage: row[f"{stage}_ms"] for stage in LOOKUP_STAGES if row[f"{stage}_ms"] is not None
+                    },
+                }
+            last = rows[-1]["id"]
+
+    # Batch jobs, with the same semantics as CacheManager's.
+
+    @timed_db
+    def create_batch_job(self, postal_codes: List[str]) -> Optional[str]:
+        """Queue a batch job; background workers on any instance pick it up from the database."""
+        job_id = str(uuid.uuid4())
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("INSERT INTO batch_jobs (id, total) VALUES (%s, %s)", (job_id, len(postal_codes)))
+                with conn.cursor() as cursor:
+                    with cursor.copy("COPY batch_job_items (job_id, item_index, postal_code) FROM STDIN") as copy:
+                        for index, postal_code in enumerate(postal_codes):
+                            copy.write_row((job_id, index, postal_code))
+            return job_id
+        except psycopg.Error as e:
+            logger.error("Error creating batch job: %s", e)
+            return None
+
+    @timed_db
+    def claim_batch_job(self, worker_id: str, lease_seconds: int = 300) -> Optional[str]:
+        """Lease the oldest queued job, or a running job whose worker stopped renewing its lease."""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET status = 'running', worker_id = %s, lease_expires_at = now() + make_interval(secs => %s::int),
+                        started_at = COALESCE(started_at, now()), updated_at = now()
+                    WHERE id = (
+                        SELECT id FROM batch_jobs
+                        WHERE status = 'queued' OR (status = 'running' AND lease_expires_at <= now())
+                        ORDER BY created_at ASC
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id
+                    """,
+                    (worker_id, int(lease_seconds)),
+                ).fetchone()
+        except psycopg.Error as e:
+            logger.error("Error claiming batch job: %s", e)
+            return None
+        return row["id"] if row else None
+
+    @timed_db
+    def renew_batch_job_lease(self, job_id: str, worker_id: str, lease_seconds: int = 300) -> bool:
+        try:
+            with self.pool.connection() as conn:
+                return (
+                    conn.execute(
+                        """
+                        UPDATE batch_jobs
+                        SET lease_expires_at = now() + make_interval(secs => %s::int), updated_at = now()
+                        WHERE id = %s AND worker_id = %s AND status = 'running'
+                        """,
+                        (int(lease_seconds), job_id, worker_id),
+                    ).rowcount
+                    > 0
+                )
+        except psycopg.Error as e:
+            logger.error("Error renewing lease for batch job %s: %s", job_id, e)
+            return False
+
+    @timed_db
+    def get_pending_batch_job_items(self, job_id: str, limit: int = 20) -> List[tuple[int, str]]:
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT item_index, postal_code
+                    FROM batch_job_items
+                    WHERE job_id = %s AND processed_at IS NULL
+                    ORDER BY item_index ASC
+                    LIMIT %s
+                    """,
+                    (job_id, limit),
+                ).fetchall()
+        except psycopg.Error as e:
+            logger.error("Error reading pending items for batch job %s: %s", job_id, e)
+            return []
+        return [(row["item_index"], row["postal_code"]) for row in rows]
+
+    @timed_db
+    def checkpoint_batch_job(self, job_id: str, results: List[tuple[int, Dict[str, Any]]]) -> bool:
+        """Store a chunk of results and advance the job counters in one transaction."""
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.executemany(
+                        """
+                        UPDATE batch_job_items
+                        SET status = %s, result_json = %s, processed_at = now()
+                        WHERE job_id = %s AND item_index = %s AND processed_at IS NULL
+                        """,
+                        [
+                            (self._normalize_status(result.get("status")), Jsonb(result), job_id, index)
+                            for index, result in results
+                        ],
+                    )
+                    cursor.execute(
+                        """
+                        UPDATE batch_jobs
+                        SET processed = counts.processed, successful = counts.successful,
+                            failed = counts.processed - counts.successful, updated_at = now()
+                        FROM (
+                            SELECT COUNT(processed_at) processed, COUNT(*) FILTER (WHERE status = 'success') successful
+                            FROM batch_job_items
+                            WHERE job_id = %s
+                        ) counts
+                        WHERE id = %s
+                        """,
+                        (job_id, job_id),
+                    )
+            return True
+        except psycopg.Error as e:
+            logger.error("Error checkpointing batch job %s: %s", job_id, e)
+            return False
+
+    @timed_db
+    def finish_batch_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    """
+                    UPDATE batch_jobs
+                    SET status = %s, error = %s, finished_at = now(), updated_at = now(), lease_expires_at = NULL
+                    WHERE id = %s
+                    """,
+                    (status, error, job_id),
+                )
+        except psycopg.Error as e:
+            logger.error("Error finishing batch job %s: %s", job_id, e)
+
+    @timed_db
+    def get_batch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    """
+                    SELECT id, status, total, processed, successful, failed, created_at, started_at,
+                           finished_at, updated_at, error,
+                           EXTRACT(EPOCH FROM COALESCE(finished_at, now()) - started_at) AS elapsed_seconds
+                    FROM batch_jobs
+                    WHERE id = %s
+                    """,
+                    (job_id,),
+                ).fetchone()
+        except psycopg.Error as e:
+            logger.error("Error reading batch job %s: %s", job_id, e)
+            return None
+
+        if not row:
+            return None
+        job = {**row, **{name: _timestamp(row[name]) for name in ("created_at", "started_at", "finished_at", "updated_at")}}
+        elapsed = float(job.pop("elapsed_seconds") or 0)
+        job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 1.0
+        job["elapsed_seconds"] = round(elapsed, 1)
+        job["throughput_per_second"] = round(job["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+        return job
+
+    def iter_batch_job_results(self, job_id: str, chunk_size: int = 500):
+        """Yield (index, postal_code, result) in request order without loading the whole job."""
+        last_index = -1
+        try:
+            while True:
+                with self.pool.connection() as conn:
+                    rows = conn.execute(
+                        """
+                        SELECT item_index, postal_code, result_json
+                        FROM batch_job_items
+                        WHERE job_id = %s AND item_index > %s
+                        ORDER BY item_index ASC
+                        LIMIT %s
+                        """,
+                        (job_id, last_index, chunk_size),
+                    ).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield row["item_index"], row["postal_code"], row["result_json"]
+                last_index = rows[-1]["item_index"]
+        except psycopg.Error as e:
+            logger.error("Error reading results for batch job %s: %s", job_id, e)
@@ -1,10 +1,21 @@
 import logging
 import os
 import re
-from typing import Any, Dict, Optional
+import asyncio
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 
+import metrics
 from segment_net_worth import average_household_net_worth, average_household_net_worth_amount
 
 logger = logging.getLogger(__name__)
@@ -13,11 +24,72 @@ DEFAULT_GEOCODER_API_URL = "https://api.environicsanalytics.com/geocoder-openaut
 DEFAULT_SUPABASE_URL = "https://rkfddhcgcubrelqdzajw.supabase.co"
 DEFAULT_SUPABASE_KEY = "sb_publishable_C5R7JrownCY44ufZmGj5oQ_d4wQAd7M"
 
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    KEEPALIVE_SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 20),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+    ]
+
 
 class PrizmLookupError(Exception):
     """Raised when the upstream PRIZM data services cannot satisfy a lookup."""
 
 
+class PrizmDeadlineExceeded(PrizmLookupError):
+    """Raised when a lookup runs out of its request budget.
+
+    `partial` holds what the lookup resolved before the budget ran out (the
+    segment number without its profile details), or None.
+    """
+
+    def __init__(self, message: str, partial: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(message)
+        self.partial = partial
+
+
+class Deadline:
+    """A request-level time budget shared by every upstream call in one lookup."""
+
+    def __init__(self, seconds: float) -> None:
+        self.budget_seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout_for(self, hops_left: int, cap: float) -> float:
+        """Split the remaining budget evenly across the hops still to run, capped at the per-call timeout."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise PrizmDeadlineExceeded(f"Lookup budget of {self.budget_seconds:g}s exhausted")
+        return min(cap, remaining / max(1, hops_left))
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies per upstream table."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key: str, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
 def normalize_postal_code(postal_code: str) -> Optional[str]:
     """Return a Canadian postal code as A1A 1A1, or None if invalid."""
     if not postal_code:
@@ -50,7 +122,9 @@ def format_currency(value: Any) -> str:
     return f"${number}" if number else ""
 
 
-class PrizmClient:
+class BasePrizmClient:
+    """Configuration, request shapes and response mapping shared by the sync and async clients."""
+
     def __init__(
         self,
         geocoder_api_url: Optional[str] = None,
@@ -66,82 +140,89 @@ class PrizmClient:
         self.supabase_url = (supabase_url or os.environ.get("PRIZM_SUPABASE_URL") or DEFAULT_SUPABASE_URL).rstrip("/")
         self.supabase_key = supabase_key or os.environ.get("PRIZM_SUPABASE_KEY") or DEFAULT_SUPABASE_KEY
         self.timeout_seconds = timeout_seconds or float(os.environ.get("PRIZM_UPSTREAM_TIMEOUT", "12"))
-        self.session = requests.Session()
-
-    def lookup(self, postal_code: str) -> Dict[str, Any]:
-        formatted = normalize_postal_code(postal_code)
-        if not formatted:
-            return self._invalid_response(postal_code, "Invalid Canadian postal code format")
-
-        rural_result = self._lookup_rural_postal_code(formatted)
-        if rural_result:
-            segment_number = int(rural_result["PRIZM"])
-            geocoder_result = {
-                "found": True,
-                "postal": compact_postal_code(formatted),
-                "geography": {"names": {"FSALDU": compact_postal_code(formatted)}},
-                "attributes": {},
-            }
-        else:
-            geocoder_result = self._lookup_geocoder(formatted)
-            if not geocoder_result.get("found"):
-                return self._not_found_response(formatted, geocoder_result)
-
-            segment_code = geocoder_result.get("segmentation", {}).get("codes", {}).get("PZMLLIC")
-            segment_number = int(segment_code) if segment_code and str(segment_code).isdigit() else None
-            if segment_number is None or segment_number == 68:
-                return self._not_found_response(formatted, geocoder_result)
-
-        segment = self.get_segment(segment_number)
-        if not segment:
-            raise PrizmLookupError(f"No PRIZM segment details found for segment {segment_number}")
+        self.hedge_requests = os.environ.get("PRIZM_HEDGE_REQUESTS", "0") == "1"
+        self.hedge_min_delay = float(os.environ.get("PRIZM_HEDGE_MIN_DELAY_MS", "50")) / 1000
+        self.hedge_default_delay = float(os.environ.get("PRIZM_HEDGE_DEFAULT_DELAY_MS", "1000")) / 1000
+        self.latencies = LatencyTracker()
+        self.hedges_sent = 0
+        self._hedge_lock = threading.Lock()
+
+    def _hop_timeout(self, deadline: Optional[Deadline], hops_left: int) -> float:
+        if deadline is None:
+            return self.timeout_seconds
+        return deadline.timeout_for(hops_left, self.timeout_seconds)
+
+    def _count_hedge(self) -> None:
+        with self._hedge_lock:
+            self.hedges_sent += 1
+
+    def _hedge_delay(self, table: str) -> float:
+        """Fire a duplicate once a call has run longer than the recent p95 for its table."""
+        p95 = self.latencies.percentile(table, 95)
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_default_delay)
+
+    def _partial_response(
+        self, postal_code: str, segment_number: int, geocoder_result: Dict[str, Any], message: str
+    ) -> Dict[str, Any]:
+        response = self._build_response(postal_code, segment_number, {}, geocoder_result)
+        response["status"] = "partial"
+        response["message"] = message
+        return response
 
-        return self._build_response(formatted, segment_number, segment, geocoder_result)
+    def _segment_params(self, segment_number: int) -> Dict[str, str]:
+        return {
+            "select": "*",
+            '"Segment Number"': f"eq.{segment_number}",
+            "limit": "1",
+        }
 
-    def get_segment(self, segment_number: int) -> Optional[Dict[str, Any]]:
-        rows = self._supabase_get(
-            "prizm_quick_reference",
-            {
-                "select": "*",
-                '"Segment Number"': f"eq.{segment_number}",
-                "limit": "1",
-            },
-        )
-        return rows[0] if rows else None
+    def _all_segments_params(self) -> Dict[str, str]:
+        return {
+            "select": "*",
+            "order": '"Segment Number".asc',
+        }
 
-    def _lookup_rural_postal_code(self, postal_code: str) -> Optional[Dict[str, Any]]:
+    def _is_rural_candidate(self, postal_code: str) -> bool:
         compact = compact_postal_code(postal_code)
         # The PRIZM frontend ships a Supabase table for rural postal codes. Urban
         # postal codes still require the geocoder service.
-        if len(compact) < 2 or compact[1] != "0":
-            return None
+        return len(compact) >= 2 and compact[1] == "0"
 
-        rows = self._supabase_get(
-            "rural_postal_codes",
-            {
-                "select": "*",
-                "FSALDU": f"eq.{compact}",
-                "limit": "1",
-            },
-        )
-        return rows[0] if rows else None
+    def _rural_params(self, postal_code: str) -> Dict[str, str]:
+        return {
+            "select": "*",
+            "FSALDU": f"eq.{compact_postal_code(postal_code)}",
+            "limit": "1",
+        }
 
-    def get_all_segments(self) -> list[Dict[str, Any]]:
-        rows = self._supabase_get(
-            "prizm_quick_reference",
-            {
-                "select": "*",
-                "order": '"Segment Number".asc',
-            },
-        )
-        return [self._segment_summary(row) for row in rows]
+    def _rural_geocoder_result(self, postal_code: str) -> Dict[str, Any]:
+        """Stands in for the geocoder result of a postal code found in the rural table."""
+        return {
+            "source": "rural",
+            "found": True,
+            "postal": compact_postal_code(postal_code),
+            "geography": {"names": {"FSALDU": compact_postal_code(postal_code)}},
+            "attributes": {},
+        }
 
-    def _lookup_geocoder(self, postal_code: str) -> Dict[str, Any]:
-        url = (
+    def _geocoder_segment_number(self, geocoder_result: Dict[str, Any]) -> Optional[int]:
+        """Return the PRIZM segment from a geocoder result, or None when it has no usable segment."""
+        if not geocoder_result.get("found"):
+            return None
+        segment_code = geocoder_result.get("segmentation", {}).get("codes", {}).get("PZMLLIC")
+        segment_number = int(segment_code) if segment_code and str(segment_code).isdigit() else None
+        if segment_number == 68:
+            return None
+        return segment_number
+
+    def _geocoder_url(self) -> str:
+        return (
             f"{self.geocoder_api_url}/{self.geocoder_country}/"
             f"{self.geocoder_vintage}/PostalCode/RuralEnhanced"
         )
-        payload = {
+
+    def _geocoder_payload(self, postal_code: str) -> Dict[str, Any]:
+        return {
             "includeGeography": "All",
             "includeSegmentation": "All",
             "includeAttributes": True,
@@ -154,32 +235,57 @@ class PrizmClient:
             ],
         }
 
-        response = self.session.post(
-            url,
-            json=payload,
-            headers={"Accept": "application/json"},
-            timeout=self.timeout_seconds,
-        )
-        if response.status_code == 403:
+    def _check_geocoder_status(self, status_code: int) -> None:
+        if status_code == 403:
             raise PrizmLookupError("PRIZM geocoder quota is unavailable; try again later")
-        response.raise_for_status()
 
-        data = response.json()
-        return data.get("1", {})
+    def _supabase_url(self, table: str) -> str:
+        return f"{self.supabase_url}/rest/v1/{table}"
 
-    def _supabase_get(self, table: str, params: Dict[str, str]) -> list[Dict[str, Any]]:
-        response = self.session.get(
-            f"{self.supabase_url}/rest/v1/{table}",
-            params=params,
-            headers={
-                "apikey": self.supabase_key,
-                "Authorization": f"Bearer {self.supabase_key}",
-                "Accept": "application/json",
-            },
-            timeout=self.timeout_seconds,
-        )
-        response.raise_for_status()
-        return response.json()
+    def _record_stage(self, timings: Optional[Dict[str, int]], stage: Optional[str], started: float) -> None:
+        if timings is not None and stage:
+            timings[stage] = int((time.monotonic() - started) * 1000)
+
+    def _record_payload(self, payloads: Optional[list], endpoint: str, lookup_key: str, payload: Any) -> None:
+        """Keep a raw upstream payload as (lookup key, vintage, endpoint, payload) for the upstream payload store."""
+        if payloads is not None and payload is not None:
+            payloads.append((lookup_key, self.geocoder_vintage, endpoint, payload))
+
+    def response_from_payloads(
+        self,
+        postal_code: str,
+        rural_row: Optional[Dict[str, Any]],
+        geocoder_result: Optional[Dict[str, Any]],
+        segments: Dict[str, Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        """Rebuild a lookup result from stored upstream payloads without calling upstream, the way lookup
+        maps them; None when a payload it needs was never stored. `segments` maps segment numbers to rows."""
+        if rural_row:
+            segment_number = int(rural_row["PRIZM"])
+            geocoder_result = self._rural_geocoder_result(postal_code)
+        elif geocoder_result is not None:
+            segment_number = self._geocoder_segment_number(geocoder_result)
+            if segment_number is None:
+                return self._not_found_response(postal_code, geocoder_result)
+        else:
+            return None
+        segment = segments.get(str(segment_number))
+        if not segment:
+            return None
+        return self._build_response(postal_code, segment_number, segment, geocoder_result)
+
+    def _upstream_target(self, table: str) -> str:
+        return "supabase_rural" if table == "rural_postal_codes" else "supabase_segment"
+
+    def _supabase_headers(self) -> Dict[str, str]:
+        return {
+            "apikey": self.supabase_key,
+            "Authorization": f"Bearer {self.supabase_key}",
+            "Accept": "application/json",
+        }
+
+    def _missing_segment_error(self, segment_number: int) -> PrizmLookupError:
+        return PrizmLookupError(f"No PRIZM segment details found for segment {segment_number}")
 
     def _build_response(
         self,
@@ -229,6 +335,8 @@ class PrizmClient:
                 "is_licensed": attributes.get("isLicensed"),
             },
             "status": "success",
+            "vintage": self.geocoder_vintage,
+            "source": geocoder_result.get("source", "geocoder"),
         }
 
     def _segment_summary(self, row: Dict[str, Any]) -> Dict[str, Any]:
@@ -281,4 +389,393 @@ class PrizmClient:
         response = self._invalid_response(postal_code, "Postal code was not assigned to a PRIZM segment")
         response["status"] = "error"
         response["geocoder_found"] = bool(geocoder_result.get("found"))
+        response["vintage"] = self.geocoder_vintage
+        response["source"] = "geocoder"
         return response
+
+
+def default_pool_size() -> int:
+    """Enough pooled connections per upstream host for every thread that can call it at once."""
+    request_threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+    stream_threads = int(os.environ.get("STREAM_BATCH_CONCURRENCY", "4"))
+    job_threads = int(os.environ.get("PRIZM_JOB_WORKERS", "1")) * int(os.environ.get("PRIZM_JOB_CONCURRENCY", "4"))
+    return request_threads + stream_threads + job_threads
+
+
+class ResetRetry(Retry):
+    """Retry failed connects and resets of idle keep-alive connections, but never a read timeout."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            raise error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets use TCP keep-alive so idle connections survive between lookups."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PrizmClient(BasePrizmClient):
+    def __init__(self, *args: Any, pool_size: Optional[int] = None, retries: Optional[int] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool_size = pool_size or int(os.environ.get("PRIZM_UPSTREAM_POOL_SIZE") or default_pool_size())
+        retries = retries if retries is not None else int(os.environ.get("PRIZM_UPSTREAM_RETRIES", "2"))
+        self.adapter = KeepAliveHTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.pool_size,
+            max_retries=ResetRetry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=0,
+                other=0,
+                backoff_factor=float(os.environ.get("PRIZM_UPSTREAM_RETRY_BACKOFF", "0.1")),
+                allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+                raise_on_status=False,
+            ),
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._hedge_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="prizm-hedge")
+
+    def warm_connections(self, count: Optional[int] = None) -> None:
+        """Open and TLS-handshake pooled connections to each upstream host in the background."""
+        count = count if count is not None else int(os.environ.get("PRIZM_PREWARM_CONNECTIONS", "0"))
+        if count <= 0:
+            return
+
+        def warm(url: str) -> None:
+            try:
+                self.session.head(url, timeout=self.timeout_seconds)
+            except requests.RequestException as exc:
+                logger.warning("Failed to pre-warm upstream connection to %s: %s", url, exc)
+
+        def run() -> None:
+            urls = [self.geocoder_api_url, self.supabase_url]
+            with ThreadPoolExecutor(max_workers=min(count, self.pool_size) * len(urls)) as executor:
+                list(executor.map(warm, [url for url in urls for _ in range(min(count, self.pool_size))]))
+            logger.info("Pre-warmed upstream connections: %s", self.connection_stats())
+
+        threading.Thread(target=run, name="prizm-prewarm", daemon=True).start()
+
+    def connection_stats(self) -> list[Dict[str, Any]]:
+        """Per-host request and connection counts; requests beyond opened connections reused a pooled one."""
+        pools = self.adapter.poolmanager.pools
+        stats = []
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent = pool.num_requests
+            connections_opened = pool.num_connections
+            stats.append(
+                {
+                    "host": pool.host,
+                    "scheme": pool.scheme,
+                    "requests": requests_sent,
+                    "connections_opened": connections_opened,
+                    "connections_reused": max(0, requests_sent - connections_opened),
+                    "reuse_ratio": round(1 - connections_opened / requests_sent, 4) if requests_sent else 0.0,
+                    "idle_connections": pool.pool.qsize() if pool.pool is not None else 0,
+                    "pool_size": self.pool_size,
+                }
+            )
+        return stats
+
+    def lookup(
+        self,
+        postal_code: str,
+        deadline: Optional[Deadline] = None,
+        timings: Optional[Dict[str, int]] = None,
+        payloads: Optional[list] = None,
+    ) -> Dict[str, Any]:
+        """Resolve a postal code; if `timings` is given, each upstream hop's duration is stored in it by stage,
+        and if `payloads` is given, the raw upstream payloads are appended to it (see _record_payload)."""
+        formatted = normalize_postal_code(postal_code)
+        if not formatted:
+            return self._invalid_response(postal_code, "Invalid Canadian postal code format")
+
+        rural_result = None
+        if self._is_rural_candidate(formatted):
+            rural_result = self._call(
+                deadline, 3, lambda timeout: self._lookup_rural_postal_code(formatted, timeout), timings, "rural"
+            )
+        self._record_payload(payloads, "rural", formatted, rural_result)
+        if rural_result:
+            segment_number = int(rural_result["PRIZM"])
+            geocoder_result = self._rural_geocoder_result(formatted)
+        else:
+            geocoder_result = self._call(
+                deadline, 2, lambda timeout: self._lookup_geocoder(formatted, timeout), timings, "geocoder"
+            )
+            self._record_payload(payloads, "geocoder", formatted, geocoder_result)
+            segment_number = self._geocoder_segment_number(geocoder_result)
+            if segment_number is None:
+                return self._not_found_response(formatted, geocoder_result)
+
+        try:
+            segment = self._call(
+                deadline, 1, lambda timeout: self.get_segment(segment_number, timeout), timings, "segment"
+            )
+        except PrizmDeadlineExceeded as exc:
+            exc.partial = self._partial_response(formatted, segment_number, geocoder_result, str(exc))
+            raise
+        if not segment:
+            raise self._missing_segment_error(segment_number)
+        self._record_payload(payloads, "segment", str(segment_number), segment)
+
+        return self._build_response(formatted, segment_number, segment, geocoder_result)
+
+    def _call(
+        self,
+        deadline: Optional[Deadline],
+        hops_left: int,
+        func: Callable[[float], Any],
+        timings: Optional[Dict[str, int]] = None,
+        stage: Optional[str] = None,
+    ) -> Any:
+        """Run one upstream hop with its share of the request budget as its timeout; a timeout set by the
+        budget rather than the per-call cap is reported as PrizmDeadlineExceeded."""
+        timeout = self._hop_timeout(deadline, hops_left)
+        started = time.monotonic()
+        try:
+            return func(timeout)
+        except requests.Timeout as exc:
+            if deadline is not None and timeout < self.timeout_seconds:
+                raise PrizmDeadlineExceeded(f"Lookup budget of {deadline.budget_seconds:g}s exhausted") from exc
+            raise
+        finally:
+            self._record_stage(timings, stage, started)
+
+    def get_segment(self, segment_number: int, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        rows = self._supabase_get("prizm_quick_reference", self._segment_params(segment_number), timeout)
+        return rows[0] if rows else None
+
+    def _lookup_rural_postal_code(self, postal_code: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if not self._is_rural_candidate(postal_code):
+            return None
+        rows = self._supabase_get("rural_postal_codes", self._rural_params(postal_code), timeout)
+        return rows[0] if rows else None
+
+    def get_all_segments(self) -> list[Dict[str, Any]]:
+        rows = self._supabase_get("prizm_quick_reference", self._all_segments_params())
+        return [self._segment_summary(row) for row in rows]
+
+    def _lookup_geocoder(self, postal_code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        with metrics.upstream_call("geocoder"):
+            response = self.session.post(
+                self._geocoder_url(),
+                json=self._geocoder_payload(postal_code),
+                headers={"Accept": "application/json"},
+                timeout=timeout or self.timeout_seconds,
+            )
+            self._check_geocoder_status(response.status_code)
+            response.raise_for_status()
+            data = response.json()
+        return data.get("1", {})
+
+    def _supabase_get(self, table: str, params: Dict[str, str], timeout: Optional[float] = None) -> list[Dict[str, Any]]:
+        timeout = timeout or self.timeout_seconds
+        if self.hedge_requests:
+            return self._hedged_supabase_get(table, params, timeout)
+        return self._supabase_get_once(table, params, timeout)
+
+    def _supabase_get_once(self, table: str, params: Dict[str, str], timeout: float) -> list[Dict[str, Any]]:
+        started = time.monotonic()
+        with metrics.upstream_call(self._upstream_target(table)):
+            response = self.session.get(
+                self._supabase_url(table),
+                params=params,
+                headers=self._supabase_headers(),
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            rows = response.json()
+        self.latencies.observe(table, time.monotonic() - started)
+        return rows
+
+    def _hedged_supabase_get(self, table: str, params: Dict[str, str], timeout: float) -> list[Dict[str, Any]]:
+        """Send a duplicate of an idempotent Supabase GET if the first is slower than usual; first success wins."""
+        started = time.monotonic()
+        pending = {self._hedge_executor.submit(self._supabase_get_once, table, params, timeout)}
+        done, _ = wait(pending, timeout=min(self._hedge_delay(table), timeout))
+        if not done:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining > 0:
+                self._count_hedge()
+                pending.add(self._hedge_executor.submit(self._supabase_get_once, table, params, remaining))
+
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # A loser still queued for a pool thread never starts; one already sending runs out within
+            # its own timeout, and its result is dropped.
+            for future in pending:
+                future.cancel()
+
+
+class AsyncPrizmClient(BasePrizmClient):
+    """Non-blocking PrizmClient for the ASGI serving mode. Requires the optional httpx dependency."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        import httpx
+
+        self._timeout_errors = (httpx.TimeoutException,)
+        max_connections = int(os.environ.get("PRIZM_ASYNC_MAX_CONNECTIONS", "100"))
+        self.http = httpx.AsyncClient(
+            timeout=self.timeout_seconds,
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=float(os.environ.get("PRIZM_UPSTREAM_KEEPALIVE_SECONDS", "120")),
+                ),
+                # httpx only retries failed connects, which covers dropped idle connections.
+                retries=int(os.environ.get("PRIZM_UPSTREAM_RETRIES", "2")),
+            ),
+        )
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def lookup(
+        self,
+        postal_code: str,
+        deadline: Optional[Deadline] = None,
+        timings: Optional[Dict[str, int]] = None,
+        payloads: Optional[list] = None,
+    ) -> Dict[str, Any]:
+        formatted = normalize_postal_code(postal_code)
+        if not formatted:
+            return self._invalid_response(postal_code, "Invalid Canadian postal code format")
+
+        rural_result = None
+        if self._is_rural_candidate(formatted):
+            rural_result = await self._call(
+                deadline, 3, lambda timeout: self._lookup_rural_postal_code(formatted, timeout), timings, "rural"
+            )
+        self._record_payload(payloads, "rural", formatted, rural_result)
+        if rural_result:
+            segment_number = int(rural_result["PRIZM"])
+            geocoder_result = self._rural_geocoder_result(formatted)
+        else:
+            geocoder_result = await self._call(
+                deadline, 2, lambda timeout: self._lookup_geocoder(formatted, timeout), timings, "geocoder"
+            )
+            self._record_payload(payloads, "geocoder", formatted, geocoder_result)
+            segment_number = self._geocoder_segment_number(geocoder_result)
+            if segment_number is None:
+                return self._not_found_response(formatted, geocoder_result)
+
+        try:
+            segment = await self._call(
+                deadline, 1, lambda timeout: self.get_segment(segment_number, timeout), timings, "segment"
+            )
+        except PrizmDeadlineExceeded as exc:
+            exc.partial = self._partial_response(formatted, segment_number, geocoder_result, str(exc))
+            raise
+        if not segment:
+            raise self._missing_segment_error(segment_number)
+        self._record_payload(payloads, "segment", str(segment_number), segment)
+
+        return self._build_response(formatted, segment_number, segment, geocoder_result)
+
+    async def _call(
+        self,
+        deadline: Optional[Deadline],
+        hops_left: int,
+        call: Callable[[float], Any],
+        timings: Optional[Dict[str, int]] = None,
+        stage: Optional[str] = None,
+    ) -> Any:
+        timeout = self._hop_timeout(deadline, hops_left)
+        started = time.monotonic()
+        try:
+            return await call(timeout)
+        except self._timeout_errors as exc:
+            if deadline is not None and timeout < self.timeout_seconds:
+                raise PrizmDeadlineExceeded(f"Lookup budget of {deadline.budget_seconds:g}s exhausted") from exc
+            raise
+        finally:
+            self._record_stage(timings, stage, started)
+
+    async def get_segment(self, segment_number: int, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        rows = await self._supabase_get("prizm_quick_reference", self._segment_params(segment_number), timeout)
+        return rows[0] if rows else None
+
+    async def _lookup_rural_postal_code(self, postal_code: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if not self._is_rural_candidate(postal_code):
+            return None
+        rows = await self._supabase_get("rural_postal_codes", self._rural_params(postal_code), timeout)
+        return rows[0] if rows else None
+
+    async def get_all_segments(self) -> list[Dict[str, Any]]:
+        rows = await self._supabase_get("prizm_quick_reference", self._all_segments_params())
+        return [self._segment_summary(row) for row in rows]
+
+    async def _lookup_geocoder(self, postal_code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        with metrics.upstream_call("geocoder"):
+            response = await self.http.post(
+                self._geocoder_url(),
+                json=self._geocoder_payload(postal_code),
+                headers={"Accept": "application/json"},
+                timeout=timeout or self.timeout_seconds,
+            )
+            self._check_geocoder_status(response.status_code)
+            response.raise_for_status()
+            data = response.json()
+        return data.get("1", {})
+
+    async def _supabase_get(self, table: str, params: Dict[str, str], timeout: Optional[float] = None) -> list[Dict[str, Any]]:
+        timeout = timeout or self.timeout_seconds
+        if not self.hedge_requests:
+            return await self._supabase_get_once(table, params, timeout)
+
+        started = time.monotonic()
+        pending = {asyncio.ensure_future(self._supabase_get_once(table, params, timeout))}
+        done, _ = await asyncio.wait(pending, timeout=min(self._hedge_delay(table), timeout))
+        if not done:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining > 0:
+                self._count_hedge()
+                pending.add(asyncio.ensure_future(self._supabase_get_once(table, params, remaining)))
+
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _supabase_get_once(self, table: str, params: Dict[str, str], timeout: float) -> list[Dict[str, Any]]:
+        started = time.monotonic()
+        with metrics.upstream_call(self._upstream_target(table)):
+            response = await self.http.get(
+                self._supabase_url(table),
+                params=params,
+                headers=self._supabase_headers(),
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            rows = response.json()
+        self.latencies.observe(table, time.monotonic() - started)
+        return rows
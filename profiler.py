@@ -0,0 +1,175 @@
+"""Opt-in sampling profiler for individual requests.
+
+A single background thread samples the stacks of the request threads that are
+being profiled (via sys._current_frames) every few milliseconds. When a request
+finishes, its samples are written in collapsed-stack format
+(`frame;frame;frame count`). flamegraph.pl, speedscope and inferno all read
+this format. Profiles go to a directory that keeps only the newest
+PRIZM_PROFILE_MAX_FILES files.
+
+Nothing is sampled unless PRIZM_PROFILE_SAMPLE_RATE or
+PRIZM_PROFILE_THRESHOLD_MS is set, or an admin asks for a profile with the
+X-Profile header. When off, the per-request cost is one attribute check.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME_RE = re.compile(r"^[0-9]{8}T[0-9]{9}Z-[a-z0-9_]+-[0-9]+ms-[0-9a-f]{8}\.collapsed$")
+
+
+class ProfileSession:
+    def __init__(self, thread_id: int, keep: bool) -> None:
+        self.thread_id = thread_id
+        # Forced and 1-in-N profiles are always written; threshold-only ones only when the request was slow.
+        self.keep = keep
+        self.samples: Counter = Counter()
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        threshold_ms: Optional[float] = None,
+        interval_ms: Optional[float] = None,
+        max_files: Optional[int] = None,
+    ) -> None:
+        self.directory = directory or os.environ.get("PRIZM_PROFILE_DIR", "/tmp/prizm-profiles")
+        self.sample_rate = sample_rate if sample_rate is not None else int(os.environ.get("PRIZM_PROFILE_SAMPLE_RATE", "0"))
+        self.threshold_ms = threshold_ms if threshold_ms is not None else float(os.environ.get("PRIZM_PROFILE_THRESHOLD_MS", "0"))
+        self.interval = (interval_ms if interval_ms is not None else float(os.environ.get("PRIZM_PROFILE_INTERVAL_MS", "5"))) / 1000
+        self.max_files = max_files or int(os.environ.get("PRIZM_PROFILE_MAX_FILES", "50"))
+        self.enabled = self.sample_rate > 0 or self.threshold_ms > 0
+        self._sessions: Dict[int, ProfileSession] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._requests = 0
+
+    def start(self, forced: bool = False) -> Optional[ProfileSession]:
+        """Begin sampling the calling thread if this request is selected; returns None otherwise."""
+        selected = False
+        if not forced:
+            if not self.enabled:
+                return None
+            with self._lock:
+                self._requests += 1
+                selected = self.sample_rate > 0 and self._requests % self.sample_rate == 0
+            # With a threshold every request is sampled; only slow ones are kept.
+            if not selected and self.threshold_ms <= 0:
+                return None
+
+        session = ProfileSession(threading.get_ident(), keep=forced or selected)
+        with self._lock:
+            self._sessions[session.thread_id] = session
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name="prizm-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return session
+
+    def finish(self, session: ProfileSession, label: str, duration_ms: float) -> Optional[str]:
+        """Stop sampling; write the profile if it was forced, sampled 1-in-N, or slower than the threshold."""
+        with self._lock:
+            self._sessions.pop(session.thread_id, None)
+        slow = self.threshold_ms > 0 and duration_ms >= self.threshold_ms
+        if not session.samples or not (session.keep or slow):
+            return None
+        try:
+            return self._write(session, label, duration_ms)
+        except OSError as e:
+            logger.warning("Failed to write request profile: %s", e)
+            return None
+
+    def discard(self, session: ProfileSession) -> None:
+        with self._lock:
+            self._sessions.pop(session.thread_id, None)
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = list(self._sessions.values())
+            if not sessions:
+                self._wake.clear()
+                self._wake.wait(30)
+                continue
+            frames = sys._current_frames()
+            for session in sessions:
+                frame = frames.get(session.thread_id)
+                if frame is not None and session.thread_id != own_id:
+                    session.samples[self._collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _collapse(self, frame: Optional[FrameType]) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack)).replace(" ", "_")
+
+    def _write(self, session: ProfileSession, label: str, duration_ms: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.now(timezone.utc)
+        timestamp = f"{now:%Y%m%dT%H%M%S}{now.microsecond // 1000:03d}Z"
+        slug = re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_") or "request"
+        name = f"{timestamp}-{slug}-{int(duration_ms)}ms-{uuid.uuid4().hex[:8]}.collapsed"
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in session.samples.most_common():
+                handle.write(f"{stack} {count}\n")
+        self._trim()
+        logger.info("Wrote request profile %s (%s samples)", name, sum(session.samples.values()))
+        return name
+
+    def _trim(self) -> None:
+        for name in self._profile_names()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # another worker trimmed it first
+
+    def _profile_names(self) -> List[str]:
+        """Profile file names, newest first."""
+        try:
+            names = [name for name in os.listdir(self.directory) if PROFILE_NAME_RE.match(name)]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        profiles = []
+        for name in self._profile_names():
+            timestamp, label, duration, _ = name.removesuffix(".collapsed").split("-")
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                "name": name,
+                "captured_at": datetime.strptime(timestamp, "%Y%m%dT%H%M%S%fZ").replace(tzinfo=timezone.utc).isoformat(),
+                "request": label,
+                "duration_ms": int(duration.removesuffix("ms")),
+                "size_bytes": size,
+            })
+        return profiles
+
+    def profile_path(self, name: str) -> Optional[str]:
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
@@ -0,0 +1,134 @@
+"""Background refresh of popular cache rows before they expire.
+
+Rows expire on a fixed schedule (`cache_duration_for_result`), so a postal code
+requested many times a day pays a full upstream lookup on the request path
+whenever its row runs out. This worker ranks postal codes by API lookup events
+over the last PRIZM_REFRESH_AHEAD_HOT_DAYS and looks up the ones requested at
+least PRIZM_REFRESH_AHEAD_MIN_HITS times again once their rows are within
+PRIZM_REFRESH_AHEAD_HOURS of expiring, most requested first. Popular rows that
+hold an upstream error are retried on every pass instead of waiting out their
+error TTL. The fresh result is written through the normal upsert, which
+extends the row's expiry.
+
+With the default TTLs a success row lives 3650 days, so in practice the worker
+retries popular error rows, and only refreshes success rows when
+PRIZM_SUCCESS_CACHE_DAYS is set short.
+
+Its lookups are recorded with endpoint `refresh`. The upstream budget,
+PRIZM_REFRESH_AHEAD_LOOKUPS_PER_HOUR, is counted from those events, so it holds
+across workers, and lookups are spread evenly over the hour. It is a
+`LeasedWorker`: one worker runs a pass at a time, and every worker reports that
+pass's progress. Each pass ends by counting refresh-ahead hits and misses over
+the last 7 days into its progress, which the dashboard shows, so dashboard
+loads do not run that scan.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from leased_worker import LeasedWorker
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "refresh_ahead"
+ENDPOINT = "refresh"
+COUNTS_DAYS = 7
+
+
+class RefreshAheadWorker(LeasedWorker):
+    """Refreshes frequently requested cache rows ahead of expiry on a daemon thread."""
+
+    LEASE_NAME = LEASE_NAME
+    THREAD_NAME = "prizm-refresh-ahead"
+    DESCRIPTION = "Refresh-ahead"
+
+    def __init__(
+        self,
+        cache_manager: Any,
+        lookup_many: Callable[[List[str]], List[Dict[str, Any]]],  # one result per postal code, in order
+        lookups_per_hour: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        interval_seconds: Optional[float] = None,
+        hot_days: Optional[int] = None,
+        min_hits: Optional[int] = None,
+        ahead_hours: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            cache_manager,
+            interval_seconds or float(os.environ.get("PRIZM_REFRESH_AHEAD_INTERVAL_SECONDS", "900")),
+            lease_seconds or int(os.environ.get("PRIZM_REFRESH_AHEAD_LEASE_SECONDS", "300")),
+        )
+        self.lookup_many = lookup_many
+        self.lookups_per_hour = lookups_per_hour or int(os.environ.get("PRIZM_REFRESH_AHEAD_LOOKUPS_PER_HOUR", "600"))
+        self.batch_size = batch_size or int(os.environ.get("PRIZM_REFRESH_AHEAD_BATCH_SIZE", "20"))
+        self.hot_days = hot_days or int(os.environ.get("PRIZM_REFRESH_AHEAD_HOT_DAYS", "7"))
+        self.min_hits = min_hits or int(os.environ.get("PRIZM_REFRESH_AHEAD_MIN_HITS", "3"))
+        self.ahead_hours = ahead_hours or float(os.environ.get("PRIZM_REFRESH_AHEAD_HOURS", "24"))
+
+    def counts(self) -> Optional[Dict[str, Any]]:
+        """Refresh-ahead hits and misses as of the last pass of any worker; None before the first pass."""
+        return self.progress().get("counts_7d")
+
+    def _pass_fields(self) -> Dict[str, Any]:
+        # The last pass may have run on another worker; keep its counts on show until this pass recounts.
+        previous = self.cache_manager.get_maintenance_progress(LEASE_NAME) or {}
+        return {
+            "looked_up": 0,
+            "refreshed": 0,
+            "batches": 0,
+            "budget_exhausted": False,
+            "counts_7d": previous.get("counts_7d"),
+        }
+
+    def _run_pass(self, fields: Dict[str, Any], on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        looked_up = refreshed = batches = 0
+        # Codes whose lookup failed keep their old row and are not retried this pass.
+        attempted: set = set()
+        while not self._stop.is_set():
+            remaining = self.lookups_per_hour - self.cache_manager.count_recent_lookups(ENDPOINT, 3600)
+            if remaining <= 0:
+                self._update(budget_exhausted=True)
+                break
+            postal_codes = self.cache_manager.get_refresh_candidates(
+                limit=min(self.batch_size, remaining),
+                hot_days=self.hot_days,
+                min_hits=self.min_hits,
+                ahead_hours=self.ahead_hours,
+                exclude=attempted,
+            )
+            if not postal_codes:
+                break
+            started = time.monotonic()
+            results = self.lookup_many(postal_codes)
+            failed = [code for code, result in zip(postal_codes, results) if not _refreshed(result)]
+            attempted.update(failed)
+            looked_up += len(postal_codes)
+            refreshed += len(postal_codes) - len(failed)
+            batches += 1
+            self._update(looked_up=looked_up, refreshed=refreshed, batches=batches)
+            if on_progress:
+                on_progress(self.progress())
+            if len(failed) == len(postal_codes):
+                self._update(error="Every lookup in the last batch failed; stopping the pass")
+                break
+            self._renew()
+            # Spread the hourly budget evenly instead of spending it in one burst.
+            pace = len(postal_codes) * 3600 / self.lookups_per_hour
+            self._stop.wait(max(0.0, pace - (time.monotonic() - started)))
+
+        counts = self.cache_manager.get_refresh_ahead_counts(COUNTS_DAYS)
+        self._update(counts_7d={**counts, "counted_at": _now()})
+        logger.info("Refresh-ahead looked up %s popular postal codes, refreshed %s", looked_up, refreshed)
+
+
+def _refreshed(result: Dict[str, Any]) -> bool:
+    """Whether a lookup produced a fresh upstream answer; errors, estimates and stale rows are not cached."""
+    return result.get("status") not in ("error", "estimated") and "cache_info" not in result
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,143 @@
+"""Read-only reporting snapshot of the cache database.
+
+Dashboard, export and weekly report queries scan and aggregate the whole cache,
+while every API lookup writes to the same file. The snapshot copies the live
+database into a separate file (`<cache db>.reporting` by default) with the
+SQLite online backup API, and reporting reads go to the copy. The live database
+runs in WAL mode, so the backup reads one consistent view while lookups keep
+writing. The copy is made next to the snapshot and renamed over it, so readers
+never see a half-written file.
+
+Each worker refreshes the snapshot once it is PRIZM_REPORTING_SNAPSHOT_SECONDS
+old. A lease row makes sure only one worker copies at a time. The snapshot is
+opened read-only (SQLite `mode=ro`), so reads never migrate or lock it. Reads
+fall back to the live database when the snapshot is missing, older than
+PRIZM_REPORTING_MAX_AGE_SECONDS (for example when no refresh thread is
+running), or copied before the last schema migration.
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from cache_manager_new import CacheManager
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "reporting_snapshot"
+
+
+class ReportingSnapshot:
+    """Keeps a periodically refreshed copy of the cache database for reporting reads."""
+
+    def __init__(
+        self,
+        cache_manager: Any,
+        path: Optional[str] = None,
+        refresh_seconds: Optional[float] = None,
+        max_age_seconds: Optional[float] = None,
+        lease_seconds: Optional[int] = None,
+    ) -> None:
+        self.cache_manager = cache_manager
+        self._path = path or os.environ.get("PRIZM_REPORTING_SNAPSHOT_PATH")
+        self.refresh_seconds = refresh_seconds or float(os.environ.get("PRIZM_REPORTING_SNAPSHOT_SECONDS", "300"))
+        self.max_age_seconds = max_age_seconds or float(os.environ.get("PRIZM_REPORTING_MAX_AGE_SECONDS", "900"))
+        self.lease_seconds = lease_seconds or int(os.environ.get("PRIZM_REPORTING_LEASE_SECONDS", "600"))
+        self._reader: Optional[CacheManager] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def path(self) -> str:
+        # Resolved on use so that building this object does not build the lazy cache manager.
+        return self._path or f"{self.cache_manager.db_path}.reporting"
+
+    def start(self) -> None:
+        """Start the refresh thread once per process."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="prizm-reporting-snapshot", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            age = self.age_seconds()
+            if age is None or age >= self.refresh_seconds:
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Reporting snapshot refresh failed")
+                age = 0
+            self._stop.wait(max(self.refresh_seconds - age, 1))
+
+    def age_seconds(self) -> Optional[float]:
+        try:
+            return max(time.time() - os.path.getmtime(self.path), 0.0)
+        except OSError:
+            return None
+
+    def is_fresh(self) -> bool:
+        age = self.age_seconds()
+        return age is not None and age <= self.max_age_seconds
+
+    def reader(self) -> Optional[CacheManager]:
+        """A read-only CacheManager over the snapshot, or None when reads should go to the live database."""
+        if not self.is_fresh():
+            return None
+        with self._lock:
+            if self._reader is None or self._reader.db_path != self.path:
+                self._reader = CacheManager(db_path=self.path, read_only=True)
+            reader = self._reader
+        return reader if reader.schema_is_current() else None
+
+    def status(self) -> Dict[str, Any]:
+        """Where reporting reads come from and how old the data is, for the dashboard."""
+        age = self.age_seconds()
+        refreshed_at = None
+        if age is not None:
+            refreshed_at = datetime.fromtimestamp(os.path.getmtime(self.path), timezone.utc).isoformat()
+        return {
+            "source": "snapshot" if self.is_fresh() else "live",
+            "refreshed_at": refreshed_at,
+            "age_seconds": None if age is None else int(age),
+            "refresh_seconds": int(self.refresh_seconds),
+            "max_age_seconds": int(self.max_age_seconds),
+        }
+
+    def refresh(self) -> Dict[str, Any]:
+        """Copy the live database into the snapshot file now, unless another worker is doing it."""
+        owner = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        if not self.cache_manager.acquire_maintenance_lease(LEASE_NAME, owner, self.lease_seconds):
+            logger.info("Reporting snapshot refresh skipped; another worker holds the lease")
+            return {"status": "skipped"}
+
+        started = time.monotonic()
+        temp_path = f"{self.path}.tmp"
+        try:
+            pages = self.cache_manager.backup(temp_path)
+            os.replace(temp_path, self.path)
+        except (sqlite3.Error, OSError) as e:
+            logger.error("Error refreshing reporting snapshot: %s", e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return {"status": "error", "error": str(e)}
+        finally:
+            self.cache_manager.release_maintenance_lease(LEASE_NAME, owner)
+
+        duration_ms = int((time.monotonic() - started) * 1000)
+        logger.info("Reporting snapshot refreshed: %s pages in %sms", pages, duration_ms)
+        return {"status": "success", "path": self.path, "pages": pages, "duration_ms": duration_ms}
@@ -0,0 +1,105 @@
+"""Background re-segmentation of cache rows from an older geocoder vintage.
+
+Each cache row records the geocoder vintage it was looked up under. After a
+vintage change, rows from the previous one keep serving until they expire; this
+worker looks them up again ahead of that, most-requested postal codes first
+(by lookup events over the last PRIZM_RESEGMENT_HOT_DAYS), then the rest. It
+spends at most PRIZM_RESEGMENT_LOOKUPS_PER_SECOND upstream lookups per second,
+and each old row is only replaced once its fresh lookup has finished. It is a
+`LeasedWorker`: one worker runs a pass at a time, and every worker reports that
+pass's progress.
+
+Rows cached before rows recorded their vintage are left alone unless
+PRIZM_RESEGMENT_UNTAGGED=1; `cache_cli.py tag-vintage` stamps them with the
+current vintage instead.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from leased_worker import LeasedWorker
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "resegment"
+
+
+class ResegmentWorker(LeasedWorker):
+    """Looks outdated postal codes up again under the current vintage on a daemon thread."""
+
+    LEASE_NAME = LEASE_NAME
+    THREAD_NAME = "prizm-resegment"
+    DESCRIPTION = "Re-segmentation"
+
+    def __init__(
+        self,
+        cache_manager: Any,
+        lookup_many: Callable[[List[str]], List[Dict[str, Any]]],  # one result per postal code, in order
+        vintage: Callable[[], str],
+        batch_size: Optional[int] = None,
+        lookups_per_second: Optional[float] = None,
+        interval_seconds: Optional[float] = None,
+        hot_days: Optional[int] = None,
+        include_untagged: Optional[bool] = None,
+        lease_seconds: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            cache_manager,
+            interval_seconds or float(os.environ.get("PRIZM_RESEGMENT_INTERVAL_SECONDS", "3600")),
+            lease_seconds or int(os.environ.get("PRIZM_RESEGMENT_LEASE_SECONDS", "300")),
+        )
+        self.lookup_many = lookup_many
+        self.vintage = vintage
+        self.batch_size = batch_size or int(os.environ.get("PRIZM_RESEGMENT_BATCH_SIZE", "50"))
+        self.lookups_per_second = lookups_per_second or float(os.environ.get("PRIZM_RESEGMENT_LOOKUPS_PER_SECOND", "2"))
+        self.hot_days = hot_days or int(os.environ.get("PRIZM_RESEGMENT_HOT_DAYS", "7"))
+        if include_untagged is None:
+            include_untagged = os.environ.get("PRIZM_RESEGMENT_UNTAGGED", "0") == "1"
+        self.include_untagged = include_untagged
+
+    def _pass_fields(self) -> Dict[str, Any]:
+        vintage = self.vintage()
+        return {
+            "vintage": vintage,
+            "outdated": self.cache_manager.count_outdated_entries(vintage, self.include_untagged),
+            "looked_up": 0,
+            "updated": 0,
+            "batches": 0,
+        }
+
+    def _run_pass(self, fields: Dict[str, Any], on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+        vintage = fields["vintage"]
+        looked_up = updated_total = batches = 0
+        # Codes whose lookup did not produce a current row (upstream errors) are not retried this pass.
+        attempted: set = set()
+        while not self._stop.is_set():
+            postal_codes = self.cache_manager.get_resegment_candidates(
+                vintage,
+                limit=self.batch_size,
+                hot_days=self.hot_days,
+                include_untagged=self.include_untagged,
+                exclude=attempted,
+            )
+            if not postal_codes:
+                break
+            started = time.monotonic()
+            results = self.lookup_many(postal_codes)
+            failed = [code for code, result in zip(postal_codes, results) if result.get("vintage") != vintage]
+            attempted.update(failed)
+            updated = len(postal_codes) - len(failed)
+            looked_up += len(postal_codes)
+            updated_total += updated
+            batches += 1
+            self._update(looked_up=looked_up, updated=updated_total, batches=batches)
+            if on_progress:
+                on_progress(self.progress())
+            if not updated:
+                self._update(error="No lookup in the last batch returned the current vintage; stopping the pass")
+                break
+            self._renew()
+            # Keep to the upstream budget: a batch of n lookups takes at least n / rate seconds.
+            self._stop.wait(max(0.0, len(postal_codes) / self.lookups_per_second - (time.monotonic() - started)))
+
+        logger.info("Re-segmentation looked up %s postal codes, %s now on vintage %s", looked_up, updated_total, vintage)
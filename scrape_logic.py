@@ -452,6 +452,11 @@ def process_postal_codes(postal_codes, headless=True):
         driver.set_window_size(1920, 1080)
         print("WebDriver created successfully")
 
+        # One bulk read for every valid code instead of a cache query per code
+        cached_results = cache_manager.get_cached_many(
+            formatted for formatted in map(validate_postal_code, postal_codes) if formatted
+        )
+
         for code in postal_codes:
             formatted = validate_postal_code(code)
             if not formatted:
@@ -462,7 +467,7 @@ def process_postal_codes(postal_codes, headless=True):
             print(f"\nProcessing postal code: {formatted}")
             
             # Check if we have cached data first
-            cached_result = cache_manager.get_cached_data(formatted)
+            cached_result = cached_results.get(formatted)
             if cached_result:
                 print(f"Using cached data for {formatted}")
                 results.append(cached_result)
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""Generate large synthetic cache databases and time CacheManager against them.
+
+The generated database has the same schema CacheManager creates. Segments
+follow the distribution in the fixture CSVs. Rows have a realistic mix of
+statuses, expiry dates and HTML blobs, plus a lookup event history with
+per-stage timings.
+
+    python synthetic_cache.py generate --postal-codes 900000 --events 3000000 --output /tmp/prizm_900k.db
+    python synthetic_cache.py scale-test --db /tmp/prizm_900k.db
+    python synthetic_cache.py scale-test --sizes 10000,100000,1000000 --output scale.json
+    python synthetic_cache.py compare-backends --postal-codes 1000000
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator
+
+from cache_manager_new import BACKENDS, LOOKUP_STAGES, CacheManager, create_cache_backend
+from fake_upstream import load_fixtures
+from segment_net_worth import average_household_net_worth_amount
+
+FSA_LETTERS = "ABCEGHJKLMNPRSTVXY"
+LDU_LETTERS = "ABCEGHJKLMNPRSTVWXYZ"
+POSTAL_CODE_SPACE = len(FSA_LETTERS) * 10 * len(LDU_LETTERS) * 10 * len(LDU_LETTERS) * 10
+CACHE_DURATION_DAYS = {"success": 3650, "invalid": 90, "error": 30}
+ERROR_MESSAGES = [
+    "PRIZM geocoder quota is unavailable; try again later",
+    "Lookup budget of 20s exhausted",
+    "503 Server Error: Service Unavailable",
+]
+INSERT_CHUNK = 10000
+# postal_code_cache columns, in the order cache_rows yields them.
+CACHE_ROW_COLUMNS = (
+    "postal_code", "segment_number", "segment_name", "segment_description", "who_they_are",
+    "average_household_income", "education", "urbanity", "average_household_net_worth",
+    "average_household_net_worth_amount", "occupation", "diversity", "family_life", "tenure", "home_type",
+    "latitude", "longitude", "geography_json", "message", "geocoder_found", "status", "confirmed",
+    "cached_at", "expires_at", "html_content",
+)
+
+
+def postal_code_at(index: int) -> str:
+    """Map an integer in [0, POSTAL_CODE_SPACE) to a distinct, well-formed postal code."""
+    digits = []
+    for radix in (10, len(LDU_LETTERS), 10, len(LDU_LETTERS), 10, len(FSA_LETTERS)):
+        index, remainder = divmod(index, radix)
+        digits.append(remainder)
+    ldu3, ldu2, ldu1, fsa3, fsa2, fsa1 = digits
+    return f"{FSA_LETTERS[fsa1]}{fsa2}{LDU_LETTERS[fsa3]} {ldu1}{LDU_LETTERS[ldu2]}{ldu3}"
+
+
+def segment_weights() -> tuple[list[int], list[float], Dict[int, Dict[str, Any]]]:
+    """Fixture segment frequencies, with a small floor so every segment 1-67 appears."""
+    postal_segments, profiles = load_fixtures()
+    counts = Counter(postal_segments.values())
+    segments = list(range(1, 68))
+    return segments, [counts.get(segment, 0) + 0.5 for segment in segments], profiles
+
+
+def html_blob(rng: random.Random, postal_code: str) -> str:
+    body = "".join(f"<div class=\"row\">{rng.getrandbits(64):016x}</div>" for _ in range(rng.randint(200, 1200)))
+    return f"<html><head><title>{postal_code}</title></head><body>{body}</body></html>"
+
+
+def cache_rows(
+    rng: random.Random,
+    count: int,
+    history_days: int,
+    status_mix: tuple[float, float, float],
+    html_ratio: float,
+    expired_ratio: float,
+) -> Iterator[tuple]:
+    segments, weights, profiles = segment_weights()
+    now = datetime.now()
+    for index in sorted(rng.sample(range(POSTAL_CODE_SPACE), count)):
+        postal_code = postal_code_at(index)
+        status = rng.choices(("success", "error", "invalid"), weights=status_mix)[0]
+        cached_at = now - timedelta(seconds=rng.randint(0, history_days * 86400))
+        expires_at = cached_at + timedelta(days=CACHE_DURATION_DAYS[status])
+        if rng.random() < expired_ratio:
+            expires_at = now - timedelta(seconds=rng.randint(1, 30 * 86400))
+
+        segment = rng.choices(segments, weights=weights)[0] if status == "success" else None
+        profile = profiles.get(segment, {}) if segment else {}
+        message = None
+        if status == "error":
+            message = rng.choice(ERROR_MESSAGES)
+        elif status == "invalid":
+            message = "Postal code not found in PRIZM geocoder"
+
+        yield (
+            postal_code,
+            str(segment) if segment else None,
+            profile.get("PRIZM Name") or (f"Segment {segment}" if segment else None),
+            profile.get("PRIZM Descriptor"),
+            profile.get("PRIZM Descriptor"),
+            int(profile["Average Income"]) if profile.get("Average Income") else (60000 + segment * 1500 if segment else None),
+            profile.get("Education"),
+            profile.get("Urbanity"),
+            average_household_net_worth_amount(segment) if segment else None,
+            average_household_net_worth_amount(segment) if segment else None,
+            profile.get("Job Type"),
+            profile.get("Cultural Diversity Index"),
+            profile.get("Family Status"),
+            profile.get("Tenure"),
+            profile.get("Dwelling Type"),
+            round(rng.uniform(42.0, 60.0), 5) if segment else None,
+            round(rng.uniform(-140.0, -52.0), 5) if segment else None,
+            json.dumps({"fsa": postal_code[:3]}) if segment else None,
+            message,
+            status == "success",
+            status,
+            rng.random() < 0.3,
+            cached_at.strftime("%Y-%m-%d %H:%M:%S"),
+            str(expires_at),
+            html_blob(rng, postal_code) if rng.random() < html_ratio else None,
+        )
+
+
+def event_rows(rng: random.Random, postal_codes: list[str], count: int, history_days: int) -> Iterator[tuple]:
+    now = datetime.now(timezone.utc)
+    endpoints = ("single", "batch", "batch_stream", "job")
+    batch_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    for _ in range(count):
+        # Popularity is skewed: a small share of postal codes gets most of the traffic.
+        postal_code = postal_codes[int(len(postal_codes) * rng.random() ** 3)]
+        endpoint = rng.choices(endpoints, weights=(70, 20, 7, 3))[0]
+        if rng.random() < 0.02:
+            batch_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        from_cache = rng.random() < 0.8
+        status = "success" if rng.random() < 0.93 else rng.choice(("error", "invalid"))
+        stages = {"cache_read": rng.randint(0, 3)}
+        if not from_cache:
+            if postal_code[1] == "0":
+                stages["rural"] = int(rng.lognormvariate(4.0, 0.5))
+            stages["geocoder"] = int(rng.lognormvariate(5.5, 0.6))
+            stages["segment"] = int(rng.lognormvariate(4.0, 0.5))
+            stages["cache_write"] = rng.randint(1, 15)
+        requested_at = now - timedelta(seconds=rng.randint(0, history_days * 86400))
+        yield (
+            requested_at.strftime("%Y-%m-%d %H:%M:%S"),
+            postal_code,
+            status,
+            "cache" if from_cache else "upstream",
+            endpoint,
+            batch_id if endpoint != "single" else None,
+            None if status == "success" else rng.choice(ERROR_MESSAGES),
+            from_cache,
+            sum(stages.values()) + rng.randint(0, 5),
+            *(stages.get(stage) for stage in LOOKUP_STAGES),
+        )
+
+
+def chunks(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_cache_db(
+    db_path: str,
+    postal_codes: int = 100000,
+    events: int = 300000,
+    seed: int = 0,
+    history_days: int = 365,
+    status_mix: tuple[float, float, float] = (0.90, 0.07, 0.03),
+    html_ratio: float = 0.02,
+    expired_ratio: float = 0.05,
+) -> Dict[str, Any]:
+    """Create (or replace) a cache database with synthetic rows and event history."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    CacheManager(db_path=db_path)
+    rng = random.Random(seed)
+    started = time.monotonic()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA synchronous=OFF")
+        codes = []
+        for chunk in chunks(cache_rows(rng, postal_codes, history_days, status_mix, html_ratio, expired_ratio), INSERT_CHUNK):
+            conn.executemany(
+                f"""
+                INSERT INTO postal_code_cache ({", ".join(CACHE_ROW_COLUMNS)})
+                VALUES ({", ".join("?" for _ in CACHE_ROW_COLUMNS)})
+                """,
+                chunk,
+            )
+            conn.commit()
+            codes.extend(row[0] for row in chunk)
+
+        rng.shuffle(codes)
+        stage_columns = ", ".join(f"{stage}_ms" for stage in LOOKUP_STAGES)
+        for chunk in chunks(event_rows(rng, codes, events, history_days), INSERT_CHUNK):
+            conn.executemany(
+                f"""
+                INSERT INTO lookup_events (
+                    requested_at, postal_code, status, source, endpoint, batch_id, message, from_cache, duration_ms,
+                    {stage_columns}
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?{", ?" * len(LOOKUP_STAGES)})
+                """,
+                chunk,
+            )
+            conn.commit()
+        # Bulk inserts skip cache_data, which normally formats the display columns.
+        CacheManager(db_path=db_path).backfill_display_values()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "db_path": db_path,
+        "postal_codes": postal_codes,
+        "events": events,
+        "seed": seed,
+        "database_size_bytes": os.path.getsize(db_path),
+        "generation_seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def time_calls(func: Callable[[], Any], calls: int) -> Dict[str, Any]:
+    durations = []
+    result = None
+    for _ in range(calls):
+        started = time.perf_counter()
+        result = func()
+        durations.append((time.perf_counter() - started) * 1000)
+    rows = len(result) if isinstance(result, (list, str)) else None
+    return {
+        "calls": calls,
+        "mean_ms": round(statistics.fmean(durations), 3),
+        "p50_ms": round(statistics.median(durations), 3),
+        "max_ms": round(max(durations), 3),
+        "result_size": rows,
+    }
+
+
+def run_scale_test(db_path: str, point_calls: int = 200, scan_calls: int = 3, seed: int = 0) -> Dict[str, Any]:
+    """Time every CacheManager method against a copy of `db_path` (the original is left untouched)."""
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="prizm-scale-")
+    test_db = os.path.join(workdir, "scale.db")
+    shutil.copyfile(db_path, test_db)
+    try:
+        with sqlite3.connect(test_db) as conn:
+            row_count = conn.execute("SELECT COUNT(*) FROM postal_code_cache").fetchone()[0]
+            event_count = conn.execute("SELECT COUNT(*) FROM lookup_events").fetchone()[0]
+            sample = [row[0] for row in conn.execute(
+                "SELECT postal_code FROM postal_code_cache WHERE expires_at > datetime('now') ORDER BY RANDOM() LIMIT ?",
+                (point_calls,),
+            )]
+            html_sample = [row[0] for row in conn.execute(
+                "SELECT postal_code FROM postal_code_cache WHERE html_content IS NOT NULL LIMIT ?", (point_calls,)
+            )]
+        hits = itertools.cycle(sample or [postal_code_at(0)])
+        html_hits = itertools.cycle(html_sample or sample or [postal_code_at(0)])
+        random_codes = (postal_code_at(rng.randrange(POSTAL_CODE_SPACE)) for _ in itertools.count())
+        payload = {"segment_number": "21", "segment_name": "Scenic Retirement", "status": "success", "average_household_income": "$140,223"}
+
+        with quiet_cache_logging():
+            cache = CacheManager(db_path=test_db)
+            methods = {
+                "get_cached_data[hit]": time_calls(lambda: cache.get_cached_data(next(hits)), point_calls),
+                "get_cached_data[miss]": time_calls(lambda: cache.get_cached_data(next(random_codes)), point_calls),
+                "get_cached_html": time_calls(lambda: cache.get_cached_html(next(html_hits)), point_calls),
+                "cache_data": time_calls(lambda: cache.cache_data(next(random_codes), payload), point_calls),
+                "record_lookup_event": time_calls(
+                    lambda: cache.record_lookup_event(next(random_codes), "success", "upstream", stage_timings={"geocoder": 200}),
+                    point_calls,
+                ),
+                "confirm_data": time_calls(lambda: cache.confirm_data(next(hits)), point_calls),
+                "get_unconfirmed_entries": time_calls(cache.get_unconfirmed_entries, scan_calls),
+                "get_cache_stats": time_calls(cache.get_cache_stats, scan_calls),
+                "list_cache_entries": time_calls(cache.list_cache_entries, scan_calls),
+                "list_cache_entries[status=error]": time_calls(lambda: cache.list_cache_entries(status="error"), scan_calls),
+                "list_cache_entries[search]": time_calls(lambda: cache.list_cache_entries(search="V8A"), scan_calls),
+                "get_daily_cache_counts": time_calls(lambda: cache.get_daily_cache_counts(30), scan_calls),
+                "get_lookup_event_summary": time_calls(lambda: cache.get_lookup_event_summary(7), scan_calls),
+                "get_dashboard_summary": time_calls(cache.get_dashboard_summary, scan_calls),
+                "export_cache_csv": time_calls(cache.export_cache_csv, scan_calls),
+                "delete_cached_data": time_calls(lambda: cache.delete_cached_data(next(hits)), point_calls),
+                # Destructive, so only timed once and last.
+                "cleanup_expired_cache": time_calls(cache.cleanup_expired_cache, 1),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "db_path": db_path,
+        "postal_codes": row_count,
+        "events": event_count,
+        "database_size_bytes": os.path.getsize(db_path),
+        "methods": methods,
+    }
+
+
+def lookup_results(rng: random.Random, count: int) -> list[tuple[str, Dict[str, Any]]]:
+    """Synthetic (postal code, lookup result) pairs shaped like PrizmClient responses."""
+    results = []
+    for row in cache_rows(rng, count, 365, (0.90, 0.07, 0.03), html_ratio=0, expired_ratio=0):
+        result = dict(zip(CACHE_ROW_COLUMNS, row))
+        geography = result.pop("geography_json")
+        result["geography"] = json.loads(geography) if geography else None
+        for column in ("confirmed", "cached_at", "expires_at", "html_content"):
+            del result[column]
+        results.append((result["postal_code"], result))
+    return results
+
+
+def time_backend_methods(
+    backend: Any,
+    hits: Iterator[str],
+    misses: Iterator[str],
+    payload: Dict[str, Any],
+    point_calls: int,
+    bulk_size: int,
+) -> Dict[str, Any]:
+    """Time the lookup-path operations of one loaded backend."""
+    return {
+        "get_cached_data[hit]": time_calls(lambda: backend.get_cached_data(next(hits)), point_calls),
+        "get_cached_data[miss]": time_calls(lambda: backend.get_cached_data(next(misses)), point_calls),
+        f"get_cached_many[{bulk_size}]": time_calls(
+            lambda: backend.get_cached_many([next(hits) for _ in range(bulk_size)]), max(point_calls // bulk_size, 1)
+        ),
+        "cache_data": time_calls(lambda: backend.cache_data(next(misses), payload), point_calls),
+        "record_lookup_event": time_calls(
+            lambda: backend.record_lookup_event(next(hits), "success", "cache", from_cache=True), point_calls
+        ),
+        "iter_cache_entries": time_calls(lambda: sum(1 for _ in backend.iter_cache_entries()), 1),
+        "get_cache_stats": time_calls(backend.get_cache_stats, 1),
+    }
+
+
+def run_backend_comparison(
+    postal_codes: int = 100000,
+    point_calls: int = 2000,
+    bulk_size: int = 100,
+    seed: int = 0,
+    backends: tuple[str, ...] = BACKENDS,
+) -> Dict[str, Any]:
+    """Load the same synthetic lookup results into each backend and time the lookup-path operations."""
+    rng = random.Random(seed)
+    entries = lookup_results(rng, postal_codes)
+    codes = [postal_code for postal_code, _ in entries]
+    hits = itertools.cycle(rng.sample(codes, min(point_calls, len(codes))))
+    misses = itertools.cycle(postal_code_at(rng.randrange(POSTAL_CODE_SPACE)) for _ in range(point_calls))
+    payload = entries[0][1]
+    workdir = tempfile.mkdtemp(prefix="prizm-backends-")
+    reports = {}
+    try:
+        for name in backends:
+            backend = create_cache_backend(name, os.path.join(workdir, f"cache.{name}"))
+            try:
+                with quiet_cache_logging():
+                    started = time.monotonic()
+                    for chunk in chunks(iter(entries), INSERT_CHUNK):
+                        backend.cache_many(chunk)
+                    load_seconds = time.monotonic() - started
+                    methods = time_backend_methods(backend, hits, misses, payload, point_calls, bulk_size)
+                reports[name] = {
+                    "load_seconds": round(load_seconds, 2),
+                    "size_bytes": backend.get_cache_stats().get("database_size_bytes"),
+                    "methods": methods,
+                }
+            finally:
+                backend.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"postal_codes": postal_codes, "backends": reports}
+
+
+@contextmanager
+def quiet_cache_logging() -> Iterator[None]:
+    # CacheManager logs every hit and write at INFO; at this volume the logging dominates the timings.
+    loggers = [logging.getLogger(name) for name in ("cache_manager_new", "lmdb_cache")]
+    levels = [cache_logger.level for cache_logger in loggers]
+    for cache_logger in loggers:
+        cache_logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        for cache_logger, level in zip(loggers, levels):
+            cache_logger.setLevel(level)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Synthetic cache databases for scale testing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Create a synthetic cache database")
+    generate.add_argument("--output", required=True, help="database path (replaced if it exists)")
+    generate.add_argument("--postal-codes", type=int, default=100000)
+    generate.add_argument("--events", type=int, default=300000)
+    generate.add_argument("--history-days", type=int, default=365)
+    generate.add_argument("--html-ratio", type=float, default=0.02, help="fraction of rows with an HTML blob")
+    generate.add_argument("--expired-ratio", type=float, default=0.05, help="fraction of rows already expired")
+    generate.add_argument("--status-mix", default="0.90,0.07,0.03", help="success,error,invalid weights")
+    generate.add_argument("--seed", type=int, default=0)
+
+    scale = subparsers.add_parser("scale-test", help="Time every CacheManager method against synthetic databases")
+    source = scale.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="existing database to test (a copy is used)")
+    source.add_argument("--sizes", help="comma-separated postal code counts to generate and test, e.g. 10000,100000,1000000")
+    scale.add_argument("--events-per-code", type=float, default=3.0, help="lookup events generated per postal code with --sizes")
+    scale.add_argument("--point-calls", type=int, default=200, help="calls per single-row method")
+    scale.add_argument("--scan-calls", type=int, default=3, help="calls per aggregate or listing method")
+    scale.add_argument("--seed", type=int, default=0)
+    scale.add_argument("--output", help="write the JSON report here as well as to stdout")
+
+    compare = subparsers.add_parser("compare-backends", help="Time the lookup path on each cache backend")
+    compare.add_argument("--postal-codes", type=int, default=100000)
+    compare.add_argument("--point-calls", type=int, default=2000)
+    compare.add_argument("--bulk-size", type=int, default=100)
+    compare.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated backend names")
+    compare.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        status_mix = tuple(float(weight) for weight in args.status_mix.split(","))
+        if len(status_mix) != 3:
+            parser.error("--status-mix needs three weights: success,error,invalid")
+        result = generate_cache_db(
+            args.output,
+            postal_codes=args.postal_codes,
+            events=args.events,
+            seed=args.seed,
+            history_days=args.history_days,
+            status_mix=status_mix,
+            html_ratio=args.html_ratio,
+            expired_ratio=args.expired_ratio,
+        )
+        print(json.dumps(result, indent=2))
+        return 0
+
+    if args.command == "compare-backends":
+        result = run_backend_comparison(
+            args.postal_codes, args.point_calls, args.bulk_size, args.seed, tuple(args.backends.split(","))
+        )
+        print(json.dumps(result, indent=2))
+        return 0
+
+    reports = []
+    if args.db:
+        reports.append(run_scale_test(args.db, args.point_calls, args.scan_calls, args.seed))
+    else:
+        with tempfile.TemporaryDirectory(prefix="prizm-synthetic-") as tmpdir:
+            for size in (int(size) for size in args.sizes.split(",")):
+                db_path = os.path.join(tmpdir, f"cache_{size}.db")
+                print(f"Generating {size} postal codes...", file=sys.stderr)
+                generated = generate_cache_db(db_path, postal_codes=size, events=int(size * args.events_per_code), seed=args.seed)
+                print(f"Timing CacheManager at {size} postal codes...", file=sys.stderr)
+                report = run_scale_test(db_path, args.point_calls, args.scan_calls, args.seed)
+                report["generation_seconds"] = generated["generation_seconds"]
+                reports.append(report)
+
+    output = json.dumps({"created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "runs": reports}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
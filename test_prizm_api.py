@@ -1,10 +1,83 @@
+import gzip
+import io
 import json
 import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import ANY, AsyncMock, Mock, patch
 
-from app import app, cache_duration_for_result
-from prizm_client import PrizmClient, PrizmLookupError, normalize_postal_code
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+import cache_cli
+import cache_manager_new
+from app import app, cache_duration_for_result, get_prizm_codes, stream_batch_results
+from batch_jobs import BatchJobRunner, job_results_csv
+from benchmark import compare_to_baseline, percentile
+from cache_janitor import LEASE_NAME, CacheJanitor
+from cache_manager_new import CacheManager
+from fake_upstream import FakeUpstream
+from lazy import LazyObject
+from payload_store import UpstreamPayloadStore
+from prizm_client import Deadline, PrizmClient, PrizmDeadlineExceeded, PrizmLookupError, normalize_postal_code
+from profiler import RequestProfiler
+from refresh_ahead import RefreshAheadWorker
+from reporting_snapshot import ReportingSnapshot
+from resegment_worker import ResegmentWorker
+from synthetic_cache import generate_cache_db, run_scale_test
+
+try:
+    import pyarrow.parquet as pq
+
+    import analytics_export
+except ImportError:  # optional analytics dependencies
+    analytics_export = None
+
+try:
+    import lmdb_cache
+except ImportError:  # optional embedded key-value backend
+    lmdb_cache = None
+
+try:
+    import postgres_cache
+except ImportError:  # optional server-database backend
+    postgres_cache = None
+
+# A throwaway database the Postgres backend tests may truncate, e.g. postgresql://localhost/prizm_test
+POSTGRES_TEST_DSN = os.environ.get("PRIZM_TEST_POSTGRES_DSN")
+
+try:
+    import httpx
+
+    import asgi
+except ImportError:  # optional async serving dependencies
+    asgi = None
+
+
+_module_tmpdir = tempfile.TemporaryDirectory()
+_module_env = patch.dict(os.environ, {"PRIZM_CACHE_DB_PATH": os.path.join(_module_tmpdir.name, "prizm_cache.db")})
+_module_payloads = LazyObject(lambda: UpstreamPayloadStore(db_path=os.path.join(_module_tmpdir.name, "prizm_cache.db.payloads")))
+_module_patches = [
+    _module_env,
+    patch("app.payload_store", _module_payloads),
+    patch("cache_cli.payload_store", _module_payloads),
+]
+
+
+def setUpModule():
+    # app's cache_manager is built on first use, from PRIZM_CACHE_DB_PATH; keep it (and the migrate
+    # lock next to the database) out of the working directory, and the payloads lookups store with it.
+    for module_patch in _module_patches:
+        module_patch.start()
+
+
+def tearDownModule():
+    for module_patch in reversed(_module_patches):
+        module_patch.stop()
+    _module_tmpdir.cleanup()
 
 
 LOOKUP_RESULT = {
@@ -55,8 +128,8 @@ class TestPrizmAPI(unittest.TestCase):
         self.assertEqual(data["status"], "success")
         self.assertEqual(data["postal_code"], "V8A 0A8")
         self.assertEqual(data["prizm_code"], "21")
-        lookup.assert_called_once_with("V8A0A8")
-        get_cached_data.assert_called_once_with("V8A 0A8")
+        lookup.assert_called_once_with("V8A0A8", deadline=ANY, timings=ANY, payloads=[])
+        get_cached_data.assert_called_once_with("V8A 0A8", include_expired=False)
         cache_data.assert_called_once_with("V8A 0A8", LOOKUP_RESULT, custom_duration_days=3650)
 
     def test_cache_duration_for_result(self):
@@ -92,9 +165,11 @@ class TestPrizmAPI(unittest.TestCase):
         cache_data.assert_not_called()
 
     @patch("app.cache_manager.cache_data", return_value=True)
-    @patch("app.cache_manager.get_cached_data", return_value=None)
+    @patch("app.cache_manager.cache_many", return_value=2)
+    @patch("app.cache_manager.get_cached_data")
+    @patch("app.cache_manager.get_cached_many", return_value={})
     @patch("app.prizm_client.lookup", return_value=LOOKUP_RESULT)
-    def test_batch_postal_codes(self, lookup, _get_cached_data, _cache_data):
+    def test_batch_postal_codes(self, lookup, get_cached_many, get_cached_data, cache_many, cache_data):
         response = self.client.post("/api/prizm/batch", json={"postal_codes": ["V8A0A8", "V8A 0A8"]})
         data = json.loads(response.data)
 
@@ -102,6 +177,96 @@ class TestPrizmAPI(unittest.TestCase):
         self.assertEqual(data["total"], 2)
         self.assertEqual(data["successful"], 2)
         self.assertEqual(lookup.call_count, 2)
+        get_cached_many.assert_called_once_with(["V8A 0A8", "V8A 0A8"])
+        get_cached_data.assert_not_called()
+        cache_many.assert_called_once_with(
+            [("V8A 0A8", LOOKUP_RESULT), ("V8A 0A8", LOOKUP_RESULT)], duration_policy=cache_duration_for_result
+        )
+        cache_data.assert_not_called()
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_many", return_value=1)
+    @patch("app.cache_manager.get_cached_many", side_effect=lambda codes: {
+        code: {**LOOKUP_RESULT, "postal_code": code} for code in codes if code == "V8A 0A8"
+    })
+    @patch("app.prizm_client.lookup", return_value=LOOKUP_RESULT)
+    def test_batch_stream_emits_cache_hits_first_and_summary(self, lookup, _get_cached_many, cache_many, _record):
+        response = self.client.post("/api/prizm/batch/stream", json={"postal_codes": ["M5V3L9", "V8A0A8"]})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual([line["type"] for line in lines], ["result", "result", "summary"])
+        self.assertEqual(lines[0]["index"], 1)
+        self.assertEqual(lines[1]["index"], 0)
+        self.assertEqual(lines[2]["total"], 2)
+        self.assertEqual(lines[2]["cache_hits"], 1)
+        lookup.assert_called_once_with("M5V3L9", deadline=ANY, timings=ANY, payloads=[])
+        cache_many.assert_called_once_with([("M5V 3L9", LOOKUP_RESULT)], duration_policy=cache_duration_for_result)
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_many", return_value=2)
+    @patch("app.cache_manager.get_cached_many", return_value={})
+    @patch("app.prizm_client.lookup", return_value=LOOKUP_RESULT)
+    def test_batch_stream_accepts_csv_upload(self, lookup, _get_cached_many, _cache_many, _record):
+        upload = (io.BytesIO(b"postal_code,name\nV8A0A8,a\nM5V3L9,b\n"), "codes.csv")
+        response = self.client.post("/api/prizm/batch/stream", data={"file": upload}, content_type="multipart/form-data")
+        summary = json.loads(response.get_data(as_text=True).splitlines()[-1])
+
+        self.assertEqual(summary["total"], 2)
+        self.assertEqual(summary["successful"], 2)
+        self.assertEqual(lookup.call_count, 2)
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_many", side_effect=lambda entries, duration_policy: len(entries))
+    @patch("app.cache_manager.get_cached_many", return_value={})
+    def test_batch_stream_caches_as_it_goes_and_on_disconnect(self, _get_cached_many, cache_many, _record):
+        def lookup(postal_code, deadline=None, timings=None, payloads=None):
+            time.sleep(0.02)
+            return {**LOOKUP_RESULT, "postal_code": postal_code}
+
+        postal_codes = [f"V8A0A{digit}" for digit in range(1, 7)]
+        environ = {"STREAM_BATCH_CONCURRENCY": "1", "STREAM_BATCH_WRITE_SIZE": "2"}
+        with patch("app.prizm_client.lookup", side_effect=lookup), patch.dict(os.environ, environ):
+            stream = stream_batch_results(postal_codes, "stream-1")
+            emitted = [normalize_postal_code(json.loads(next(stream))["result"]["postal_code"]) for _ in range(3)]
+            self.assertEqual(cache_many.call_count, 1)
+            stream.close()
+
+        cached = [cache_key for call in cache_many.call_args_list for cache_key, _ in call.args[0]]
+        self.assertEqual(cached[:3], emitted)
+        self.assertLess(len(cached), len(postal_codes))
+
+    def test_batch_stream_requires_postal_codes(self):
+        response = self.client.post("/api/prizm/batch/stream", json={"postal_codes": []})
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_data", return_value=True)
+    @patch("app.prizm_client.lookup", side_effect=PrizmDeadlineExceeded("budget exhausted"))
+    def test_deadline_exceeded_serves_stale_cache_row(self, _lookup, cache_data, record):
+        def cached(_postal_code, include_expired=False):
+            return {**LOOKUP_RESULT, "_cache_info": {"from_cache": True}} if include_expired else None
+
+        with patch("app.cache_manager.get_cached_data", side_effect=cached):
+            data = self.client.get("/api/prizm?postal_code=V8A0A8", headers={"X-Request-Budget-Ms": "500"}).get_json()
+
+        self.assertEqual(data["status"], "success")
+        self.assertTrue(data["cache_info"]["stale"])
+        cache_data.assert_not_called()
+        self.assertEqual(record.call_args.args[2], "stale")
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_data", return_value=True)
+    @patch("app.cache_manager.get_cached_data", return_value=None)
+    def test_deadline_exceeded_returns_partial_result(self, _get_cached_data, cache_data, _record):
+        partial = PrizmClient()._partial_response("V8A 0A8", 21, {}, "budget exhausted")
+        with patch("app.prizm_client.lookup", side_effect=PrizmDeadlineExceeded("budget exhausted", partial)):
+            data = self.client.get("/api/prizm?postal_code=V8A0A8").get_json()
+
+        self.assertEqual(data["status"], "partial")
+        self.assertEqual(data["segment_number"], "21")
+        cache_data.assert_not_called()
 
     def test_missing_postal_code_parameter(self):
         response = self.client.get("/api/prizm")
@@ -135,6 +300,1147 @@ class TestPrizmAPI(unittest.TestCase):
         finally:
             os.environ.pop("PRIZM_API_KEY", None)
 
+    @patch("app.cache_manager.record_lookup_event", return_value=True)
+    @patch("app.cache_manager.cache_many", return_value=2)
+    @patch("app.cache_manager.get_cached_many", return_value={})
+    @patch("app.prizm_client.lookup", return_value=LOOKUP_RESULT)
+    def test_metrics_endpoint_exposes_hot_path_histograms(self, lookup, get_cached_many, cache_many, record_lookup_event):
+        self.client.post("/api/prizm/batch", json={"postal_codes": ["V8A0A8", "K1A0B1"]})
+
+        response = self.client.get("/metrics")
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('prizm_http_request_duration_seconds_count{endpoint="/api/prizm/batch",method="POST",status="200"}', body)
+        self.assertIn('prizm_cache_lookups_total{result="miss",tier="fresh"}', body)
+        self.assertIn('prizm_batch_size_bucket{endpoint="batch",le="2.0"}', body)
+        self.assertIn("prizm_cache_db_duration_seconds", body)
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_data", return_value=True)
+    @patch("app.cache_manager.get_cached_data", return_value=None)
+    def test_lookup_event_records_stage_timings(self, _get_cached_data, _cache_data, record):
+        def lookup(_postal_code, deadline=None, timings=None, payloads=None):
+            timings.update({"geocoder": 120, "segment": 30})
+            return LOOKUP_RESULT
+
+        with patch("app.prizm_client.lookup", side_effect=lookup):
+            self.client.get("/api/prizm?postal_code=V8A0A8")
+
+        stage_timings = record.call_args.kwargs["stage_timings"]
+        self.assertEqual(set(stage_timings), {"cache_read", "geocoder", "segment", "cache_write"})
+        self.assertEqual(stage_timings["geocoder"], 120)
+
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_many", return_value=3)
+    @patch("app.cache_manager.get_cached_many", return_value={})
+    def test_batch_lookup_events_time_each_lookup(self, _get_cached_many, _cache_many, record):
+        def lookup(_postal_code, deadline=None, timings=None, payloads=None):
+            time.sleep(0.05)
+            return LOOKUP_RESULT
+
+        with patch("app.prizm_client.lookup", side_effect=lookup):
+            get_prizm_codes(["V8A0A8", "K1A0B1", "M5V3L9"], "batch")
+
+        durations = [call.kwargs["duration_ms"] for call in record.call_args_list]
+        self.assertEqual(len(durations), 3)
+        self.assertLess(max(durations), 100)
+
+
+class TestLookupEventStages(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_summary_reports_stage_percentiles(self):
+        for geocoder_ms in range(1, 101):
+            self.cache.record_lookup_event(
+                "V8A0A8", "success", "upstream", stage_timings={"cache_read": 1, "geocoder": geocoder_ms}
+            )
+
+        stages = self.cache.get_lookup_event_summary(7)["stage_latency_ms"]
+        self.assertEqual(stages["geocoder"], {"count": 100, "p50": 50, "p95": 95, "p99": 99})
+        self.assertEqual(stages["cache_read"]["p99"], 1)
+        self.assertEqual(stages["rural"], {"count": 0, "p50": None, "p95": None, "p99": None})
+
+    def test_summary_of_an_empty_window(self):
+        summary = self.cache.get_lookup_event_summary(7)
+        self.assertEqual((summary["lookups"], summary["by_day"]), (0, []))
+        self.assertEqual(summary["stage_latency_ms"]["geocoder"]["count"], 0)
+
+    def test_rollup_aggregates_and_deletes_old_events(self):
+        for status in ("success", "success", "success", "not_found"):
+            self.cache.record_lookup_event("V8A0A8", status, "upstream", duration_ms=10)
+        self.cache.record_lookup_event("V8A0A8", "success", "cache", from_cache=True)
+        with self.cache._connect() as conn:
+            conn.execute("UPDATE lookup_events SET requested_at = datetime('now', '-40 days', id || ' minutes') WHERE id <= 4")
+            conn.commit()
+
+        self.cache.event_archive_dir = os.path.join(self.tmpdir.name, "archive")
+        result = self.cache.rollup_lookup_events(retention_days=30, batch_size=3)
+        self.assertEqual((result["rolled_up"], result["batches"]), (4, 2))
+        self.assertEqual(self.cache.rollup_lookup_events(retention_days=30)["rolled_up"], 0)
+        (archive,) = os.listdir(self.cache.event_archive_dir)
+        with gzip.open(os.path.join(self.cache.event_archive_dir, archive), "rt") as handle:
+            self.assertEqual(len(handle.read().splitlines()), 4)
+
+        summary = self.cache.get_lookup_event_summary(60)
+        self.assertEqual((summary["lookups"], summary["successful"], summary["failed"]), (5, 4, 1))
+        self.assertEqual(summary["cache_hits"], 1)
+        self.assertEqual(len(summary["by_day"]), 2)
+        self.assertEqual(self.cache.get_lookup_event_summary(7)["lookups"], 1)
+        self.assertEqual(self.cache.get_cache_stats()["lookup_events_rolled_up"], 4)
+
+    def test_rollup_archives_nothing_when_the_batch_fails(self):
+        self.cache.record_lookup_event("V8A0A8", "success", "upstream")
+        with self.cache._connect() as conn:
+            conn.execute("UPDATE lookup_events SET requested_at = datetime('now', '-40 days')")
+            conn.execute("DROP TABLE lookup_event_daily")
+            conn.commit()
+
+        self.cache.event_archive_dir = os.path.join(self.tmpdir.name, "archive")
+        self.assertIn("error", self.cache.rollup_lookup_events(retention_days=30))
+        self.assertFalse(os.path.exists(self.cache.event_archive_dir))
+
+
+class TestFsaIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_rebuild_counts_segments_per_fsa(self):
+        for postal_code, segment in [("V8A 0A1", "21"), ("V8A 0A2", "21"), ("V8A 0A3", "21"), ("V8A 0A4", "5"), ("M5V 3L9", "8")]:
+            self.cache.cache_data(postal_code, {**LOOKUP_RESULT, "segment_number": segment})
+        self.cache.cache_data("V8A 0A5", {"status": "invalid"})
+
+        self.assertEqual(self.cache.rebuild_fsa_index(), 2)
+        distribution = self.cache.get_fsa_distribution("v8a")
+        self.assertEqual(distribution["postal_codes"], 4)
+        self.assertEqual(distribution["dominant_segment"]["segment_number"], "21")
+        self.assertEqual(distribution["dominant_segment"]["share"], 0.75)
+        self.assertEqual([s["segment_number"] for s in distribution["segments"]], ["21", "5"])
+        self.assertIsNone(self.cache.get_fsa_distribution("K1A"))
+        self.assertNotIn("latitude", self.cache.get_segment_profile("21"))
+
+    def test_nearby_orders_by_distance_and_tracks_cache_writes(self):
+        points = {"V8A 0A1": (49.835, -124.524, "21"), "V8A 0A2": (49.840, -124.524, "21"),
+                  "V8A 0A3": (49.860, -124.524, "5"), "M5V 3L9": (43.642, -79.387, "8")}
+        for postal_code, (lat, lon, segment) in points.items():
+            self.cache.cache_data(postal_code, {**LOOKUP_RESULT, "segment_number": segment, "latitude": lat, "longitude": lon})
+        # Re-caching replaces the row; its old R*Tree entry must not linger.
+        self.cache.cache_data("V8A 0A2", {**LOOKUP_RESULT, "latitude": 49.845, "longitude": -124.524})
+
+        nearby = self.cache.get_nearby(49.835, -124.524, radius_km=2)
+        self.assertEqual([r["postal_code"] for r in nearby["results"]], ["V8A 0A1", "V8A 0A2"])
+        self.assertAlmostEqual(nearby["results"][1]["distance_km"], 1.112, places=2)
+        self.assertEqual(nearby["segments"], [{"segment_number": "21", "segment_name": "Scenic Retirement", "postal_codes": 2, "share": 1.0}])
+
+        in_box = self.cache.get_nearby(49.85, -124.524, bbox=(49.8, -124.6, 49.9, -124.4))
+        self.assertEqual(in_box["count"], 3)
+        self.cache.delete_cached_data("V8A 0A3")
+        self.assertEqual(self.cache.get_nearby(49.85, -124.524, bbox=(49.8, -124.6, 49.9, -124.4))["count"], 2)
+        with self.cache._connect() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM postal_code_rtree").fetchone()[0], 3)
+
+    def test_vacuum_rebuilds_the_spatial_index(self):
+        for number, lat in enumerate((49.80, 49.81, 49.82, 49.83)):
+            self.cache.cache_data(f"V8A 0A{number}", {**LOOKUP_RESULT, "latitude": lat, "longitude": -124.5})
+        self.cache.delete_cached_data("V8A 0A0")
+        # What a VACUUM is allowed to do to a table without an INTEGER PRIMARY KEY.
+        with self.cache._connect() as conn:
+            conn.execute("UPDATE postal_code_cache SET rowid = rowid - 1")
+            conn.commit()
+        self.assertEqual([r["postal_code"] for r in self.cache.get_nearby(49.83, -124.5, radius_km=0.5)["results"]], [])
+
+        self.assertEqual(self.cache.vacuum()["spatial_indexed"], 3)
+        nearby = self.cache.get_nearby(49.83, -124.5, radius_km=0.5)
+        self.assertEqual([r["postal_code"] for r in nearby["results"]], ["V8A 0A3"])
+
+    def test_nearby_endpoint_validates_input(self):
+        client = app.test_client()
+        self.assertEqual(client.get("/api/prizm/nearby?lat=49.8").status_code, 400)
+        self.assertEqual(client.get("/api/prizm/nearby?lat=49.8&lon=-124.5&radius=500").status_code, 400)
+        self.assertEqual(client.get("/api/prizm/nearby?lat=49.8&lon=-124.5&limit=-1").status_code, 400)
+        with patch("app.cache_manager.get_nearby", return_value={"count": 0, "results": [], "segments": []}) as nearby:
+            response = client.get("/api/prizm/nearby?lat=49.8&lon=-124.5&radius=2&limit=5")
+        self.assertEqual(response.status_code, 200)
+        nearby.assert_called_once_with(49.8, -124.5, radius_km=2.0, limit=5)
+
+    def test_fsa_endpoint(self):
+        client = app.test_client()
+        with patch("app.cache_manager.get_fsa_distribution", return_value={"fsa": "V8A", "postal_codes": 4}) as get:
+            response = client.get("/api/prizm/fsa/v8a")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["postal_codes"], 4)
+        get.assert_called_once_with("V8A")
+        self.assertEqual(client.get("/api/prizm/fsa/123").status_code, 400)
+
+    @patch.dict(os.environ, {"PRIZM_FSA_ESTIMATE_FALLBACK": "1"})
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_data")
+    @patch("app.cache_manager.get_cached_data", return_value=None)
+    @patch("app.prizm_client.lookup", side_effect=PrizmLookupError("quota exceeded"))
+    def test_estimate_fallback_when_upstream_fails(self, _lookup, _get_cached_data, cache_data, record):
+        distribution = {
+            "fsa": "V8A",
+            "postal_codes": 40,
+            "dominant_segment": {"segment_number": "21", "share": 0.6},
+        }
+        with patch("app.cache_manager.get_fsa_distribution", return_value=distribution), \
+                patch("app.cache_manager.get_segment_profile", return_value={**LOOKUP_RESULT, "postal_code": None}):
+            data = app.test_client().get("/api/prizm?postal_code=V8A0A8").get_json()
+
+        self.assertEqual(data["status"], "estimated")
+        self.assertEqual((data["postal_code"], data["prizm_code"]), ("V8A 0A8", "21"))
+        self.assertEqual(data["estimate"], {"fsa": "V8A", "share": 0.6, "postal_codes": 40})
+        cache_data.assert_not_called()
+        self.assertEqual(record.call_args.args[2], "estimate")
+
+
+@unittest.skipIf(analytics_export is None, "pyarrow is not installed")
+class TestColumnarExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        for number in range(5):
+            self.cache.cache_data(f"V8A 0A{number}", {**LOOKUP_RESULT, "latitude": 49.8, "longitude": -124.5})
+        self.cache.cache_data("BAD", {"status": "invalid"})
+        self.cache.record_lookup_event("V8A 0A1", "success", "upstream", duration_ms=12, stage_timings={"geocoder": 9})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parquet_export_has_typed_columns(self):
+        path = os.path.join(self.tmpdir.name, "cache.parquet")
+        rows = analytics_export.write_export(self.cache, "postal_code_cache", "parquet", path, batch_size=2)
+        table = pq.read_table(path)
+
+        self.assertEqual((rows, table.num_rows), (6, 6))
+        self.assertEqual(str(table.schema.field("average_household_income").type), "int64")
+        self.assertEqual(str(table.schema.field("cached_at").type), "timestamp[us]")
+        self.assertEqual(str(table.schema.field("status").type), "dictionary<values=string, indices=int32, ordered=0>")
+        self.assertEqual(table.column("average_household_income").to_pylist()[0], 140223)
+        self.assertEqual(table.column("latitude").to_pylist()[0], 49.8)
+
+    def test_streamed_download(self):
+        client = app.test_client()
+        with patch("app.cache_manager", self.cache):
+            response = client.get("/api/cache/export.arrow?table=events")
+            self.assertEqual(client.get("/api/cache/export.parquet?table=nope").status_code, 400)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("prizm-lookup_events-", response.headers["Content-Disposition"])
+        events = analytics_export.pa.ipc.open_stream(response.data).read_all()
+        self.assertEqual(events.column("geocoder_ms").to_pylist(), [9])
+        self.assertEqual(events.column("from_cache").to_pylist(), [False])
+
+
+class CacheBackendConformance:
+    """Checks every CacheBackend must pass; subclasses provide make_backend."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.backend = self.make_backend(self.tmpdir.name)
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmpdir.cleanup()
+
+    def test_point_get_put_and_delete(self):
+        self.assertTrue(self.backend.cache_data("v8a0a8", {**LOOKUP_RESULT, "geography": {"fsa": "V8A"}}, html_content="<html>"))
+        cached = self.backend.get_cached_data("V8A 0A8")
+
+        self.assertEqual(cached["average_household_income"], "$140,223")
+        self.assertEqual(cached["average_household_net_worth_amount"], 1255437)
+        self.assertEqual(cached["geography"], {"fsa": "V8A"})
+        self.assertEqual(cached["_cache_info"]["from_cache"], True)
+        self.assertEqual(cached["_cache_info"]["has_html"], True)
+        self.assertIsNone(self.backend.get_cached_data("M5V 3L9"))
+        self.assertTrue(self.backend.delete_cached_data("V8A0A8"))
+        self.assertFalse(self.backend.delete_cached_data("V8A0A8"))
+        self.assertIsNone(self.backend.get_cached_data("V8A 0A8"))
+
+    def test_expired_entries_are_hidden_unless_asked_for(self):
+        self.backend.cache_data("V8A 0A8", LOOKUP_RESULT, custom_duration_days=-1)
+        self.backend.cache_data("M5V 3L9", {"status": "invalid", "message": "Not found"})
+
+        self.assertIsNone(self.backend.get_cached_data("V8A 0A8"))
+        self.assertEqual(self.backend.get_cached_data("V8A 0A8", include_expired=True)["status"], "success")
+        stats = self.backend.get_cache_stats()
+        self.assertEqual((stats["total_entries"], stats["valid_entries"], stats["expired_entries"]), (2, 1, 1))
+        self.assertEqual(stats["status_breakdown"], {"invalid": 1})
+
+    def test_bulk_get_put_and_scan(self):
+        entries = [(code, {**LOOKUP_RESULT, "postal_code": code}) for code in ("V8A 0A8", "A1A 1A1", "M5V3L9")]
+        self.assertEqual(self.backend.cache_many(entries), 3)
+
+        found = self.backend.get_cached_many(["m5v3l9", "V8A 0A8", "X0X 0X0"])
+        self.assertEqual(sorted(found), ["M5V 3L9", "V8A 0A8"])
+        self.assertEqual([entry["postal_code"] for entry in self.backend.iter_cache_entries(batch_size=2)], ["A1A 1A1", "M5V 3L9", "V8A 0A8"])
+
+    def test_cache_many_applies_the_duration_policy_and_updates_in_place(self):
+        self.backend.cache_data("V8A 0A8", {**LOOKUP_RESULT, "education": "High school"})
+        entries = [("V8A0A8", LOOKUP_RESULT), ("M5V 3L9", {"status": "error", "message": "quota unavailable"})]
+        self.assertEqual(self.backend.cache_many(entries, duration_policy=lambda data: 30 if data["status"] == "success" else -1), 2)
+
+        self.assertEqual(self.backend.get_cached_data("V8A 0A8")["education"], LOOKUP_RESULT["education"])
+        self.assertIsNone(self.backend.get_cached_data("M5V 3L9"))
+        self.assertEqual(self.backend.get_cached_data("M5V 3L9", include_expired=True)["status"], "error")
+        self.assertEqual(self.backend.get_cache_stats()["total_entries"], 2)
+
+    def test_vintage_and_source_round_trip(self):
+        self.backend.cache_data("V8A 0A8", {**LOOKUP_RESULT, "vintage": "2026", "source": "rural"})
+        self.backend.cache_data("M5V 3L9", LOOKUP_RESULT)
+
+        cached = self.backend.get_cached_data("V8A 0A8")
+        self.assertEqual((cached["vintage"], cached["source"]), ("2026", "rural"))
+        self.assertNotIn("vintage", self.backend.get_cached_data("M5V 3L9"))
+
+    def test_admin_queries(self):
+        self.backend.cache_data("V8A 0A8", LOOKUP_RESULT, html_content="<html>V8A</html>")
+        self.backend.cache_data("M5V 3L9", LOOKUP_RESULT)
+        self.backend.cache_data("K1A 0B1", LOOKUP_RESULT, custom_duration_days=-1, html_content="<html>K1A</html>")
+
+        self.assertTrue(self.backend.confirm_data("v8a0a8"))
+        self.assertFalse(self.backend.confirm_data("K1A 0B1"))
+        self.assertTrue(self.backend.get_cached_data("V8A 0A8")["_cache_info"]["confirmed"])
+        self.assertEqual([entry["postal_code"] for entry in self.backend.get_unconfirmed_entries()], ["M5V 3L9"])
+        self.assertTrue(self.backend.unconfirm_data("V8A 0A8"))
+        self.assertEqual(len(self.backend.get_unconfirmed_entries(limit=1)), 1)
+
+        self.assertEqual(self.backend.get_cached_html("V8A0A8"), "<html>V8A</html>")
+        self.assertIsNone(self.backend.get_cached_html("M5V 3L9"))
+        self.assertIsNone(self.backend.get_cached_html("K1A 0B1"))
+
+        self.assertTrue(self.backend.clear_cache())
+        self.assertIsNone(self.backend.get_cached_data("V8A 0A8"))
+        self.assertIsNone(self.backend.get_cached_html("V8A 0A8"))
+        self.assertEqual(self.backend.get_cache_stats()["total_entries"], 0)
+
+    def test_delete_expired_batch(self):
+        for number in range(5):
+            self.backend.cache_data(f"V8A 0A{number}", LOOKUP_RESULT, custom_duration_days=-1)
+        self.backend.cache_data("M5V 3L9", LOOKUP_RESULT)
+
+        self.assertEqual([self.backend.delete_expired_batch(2) for _ in range(4)], [2, 2, 1, 0])
+        self.assertEqual(self.backend.get_cache_stats()["total_entries"], 1)
+        self.assertIsNotNone(self.backend.get_cached_data("M5V 3L9"))
+
+    def test_lookup_events(self):
+        self.backend.record_lookup_event("V8A0A8", "success", "upstream", endpoint="single", stage_timings={"geocoder": 120})
+        self.backend.record_lookup_event("V8A 0A8", "success", "cache", from_cache=True, duration_ms=2)
+
+        events = list(self.backend.iter_lookup_events(days=1, batch_size=1))
+        self.assertEqual([event["source"] for event in events], ["upstream", "cache"])
+        self.assertEqual(events[0]["stage_timings"], {"geocoder": 120})
+        self.assertEqual(events[1]["from_cache"], True)
+        self.assertEqual(self.backend.get_cache_stats()["lookup_events"], 2)
+
+
+class TestSQLiteBackendConformance(CacheBackendConformance, unittest.TestCase):
+    def make_backend(self, directory):
+        return cache_manager_new.create_cache_backend("sqlite", os.path.join(directory, "cache.db"))
+
+    def test_get_cached_many_reads_in_chunks_on_one_connection(self):
+        codes = ["V8A 0A8", "A1A 1A1", "M5V 3L9", "K1A 0B1", "T2P 1J9"]
+        for code in codes:
+            self.backend.cache_data(code, {**LOOKUP_RESULT, "postal_code": code}, html_content="<html>")
+        self.backend.cache_data("H2X 1Y4", LOOKUP_RESULT, custom_duration_days=-1)
+
+        with patch.object(cache_manager_new, "GET_MANY_CHUNK", 2), patch.object(
+            self.backend, "_connect", wraps=self.backend._connect
+        ) as connect:
+            found = self.backend.get_cached_many([code.replace(" ", "").lower() for code in codes] + ["H2X1Y4", "X0X 0X0"])
+        connect.assert_called_once_with()
+        self.assertEqual(sorted(found), sorted(codes))
+        self.assertEqual(found["K1A 0B1"], self.backend.get_cached_data("K1A 0B1"))
+        self.assertTrue(found["K1A 0B1"]["_cache_info"]["has_html"])
+
+    def test_recaching_keeps_the_row_and_confirmation_until_the_segment_changes(self):
+        self.backend.cache_data("V8A 0A8", {**LOOKUP_RESULT, "latitude": 49.835, "longitude": -124.524})
+        self.assertTrue(self.backend.confirm_data("V8A 0A8"))
+
+        def row():
+            with self.backend._connect() as conn:
+                return conn.execute(
+                    "SELECT rowid, confirmed, cached_at FROM postal_code_cache WHERE postal_code = 'V8A 0A8'"
+                ).fetchone()
+
+        before = row()
+        with patch.object(self.backend, "_connect", wraps=self.backend._connect) as connect:
+            self.backend.cache_many([("V8A 0A8", {**LOOKUP_RESULT, "latitude": 49.835, "longitude": -124.524, "tenure": "Own"})] * 3)
+        connect.assert_called_once_with()
+        self.assertEqual(tuple(row()), tuple(before))
+        self.assertEqual(self.backend.get_cached_data("V8A 0A8")["tenure"], "Own")
+        self.assertEqual(len(self.backend.get_nearby(49.835, -124.524, radius_km=1)["results"]), 1)
+
+        self.backend.cache_data("V8A 0A8", {**LOOKUP_RESULT, "segment_number": "5", "latitude": 49.9, "longitude": -124.524})
+        self.assertEqual((row()["rowid"], row()["confirmed"]), (before["rowid"], 0))
+        self.assertEqual(self.backend.get_nearby(49.835, -124.524, radius_km=1)["results"], [])
+        self.assertEqual(len(self.backend.get_nearby(49.9, -124.524, radius_km=1)["results"]), 1)
+
+
+@unittest.skipIf(lmdb_cache is None, "lmdb and msgpack are not installed")
+class TestLMDBBackendConformance(CacheBackendConformance, unittest.TestCase):
+    def make_backend(self, directory):
+        return cache_manager_new.create_cache_backend("lmdb", os.path.join(directory, "cache.lmdb"))
+
+    def test_responses_and_dashboard_queries_match_sqlite(self):
+        sqlite_backend = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        result = {**LOOKUP_RESULT, "latitude": "49.3", "population": 1200, "geocoder_found": 1, "education": ""}
+        for backend in (sqlite_backend, self.backend):
+            backend.cache_data("V8A 0A8", result)
+            backend.cache_data("M5V 3L9", {"status": "error", "message": "quota unavailable"})
+            backend.cache_data("K1A 0B1", result, custom_duration_days=-1)
+            backend.record_lookup_event("V8A 0A8", "success", "upstream", stage_timings={"geocoder": 120})
+            backend.record_lookup_event("M5V 3L9", "error", "upstream", message="quota unavailable")
+            backend.record_lookup_event("V8A 0A8", "success", "cache", from_cache=True)
+
+        responses = [backend.get_cached_data("V8A 0A8") for backend in (sqlite_backend, self.backend)]
+        for response in responses:
+            response.pop("_cache_info")
+        self.assertEqual(responses[0], responses[1])
+
+        def without_times(rows):
+            return [{k: v for k, v in row.items() if k not in ("cached_at", "expires_at")} for row in rows]
+
+        for query in (
+            {},
+            {"search": "v8a"},
+            {"search": "QUOTA"},
+            {"status": "error"},
+            {"include_expired": True},
+            {"include_expired": True, "limit": 1, "offset": 1},
+        ):
+            self.assertEqual(
+                without_times(sqlite_backend.list_cache_entries(**query)), without_times(self.backend.list_cache_entries(**query))
+            )
+        self.assertEqual(sqlite_backend.get_daily_cache_counts(7), self.backend.get_daily_cache_counts(7))
+        summaries = [backend.get_lookup_event_summary(7) for backend in (sqlite_backend, self.backend)]
+        for key in ("lookups", "successful", "failed", "cache_hits", "upstream_attempts", "by_day", "stage_latency_ms"):
+            self.assertEqual(summaries[0][key], summaries[1][key])
+
+    def test_delete_expired_batch_drops_html(self):
+        for number in range(3):
+            self.backend.cache_data(f"V8A 0A{number}", LOOKUP_RESULT, custom_duration_days=-1, html_content="<html>")
+
+        self.assertEqual(self.backend.delete_expired_batch(), 3)
+        with self.backend.env.begin() as txn:
+            self.assertEqual(txn.stat(self.backend._html)["entries"], 0)
+
+    def test_admin_routes_and_janitor_use_lmdb(self):
+        client = app.test_client()
+        self.backend.cache_data("V8A 0A8", LOOKUP_RESULT, html_content="<html>V8A</html>")
+        self.backend.cache_data("M5V 3L9", LOOKUP_RESULT, custom_duration_days=-1)
+        with patch("app.CACHE_BACKEND", "lmdb"), patch("app.cache_store", self.backend):
+            self.assertEqual(client.post("/api/cache/confirm/V8A0A8").status_code, 200)
+            self.assertTrue(self.backend.get_cached_data("V8A 0A8")["_cache_info"]["confirmed"])
+            self.assertEqual(client.get("/api/debug/html/V8A0A8").data, b"<html>V8A</html>")
+            self.assertEqual(client.get("/api/cache/stats").get_json()["cache_stats"]["total_entries"], 2)
+            self.assertEqual(client.get("/api/cache/entries").get_json()["count"], 1)
+            self.assertEqual(client.get("/api/prizm/fsa/V8A").status_code, 501)
+            self.assertEqual(client.get("/api/prizm/nearby?lat=49.8&lon=-124.5").status_code, 501)
+            self.assertEqual(client.post("/api/cache/clear").status_code, 200)
+        self.assertIsNone(self.backend.get_cached_data("V8A 0A8"))
+
+        self.backend.cache_data("M5V 3L9", LOOKUP_RESULT, custom_duration_days=-1)
+        sqlite_backend = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        self.assertEqual(CacheJanitor(sqlite_backend, pause_ms=0, store=self.backend).run_once()["deleted"], 1)
+        self.assertEqual(self.backend.get_cache_stats()["total_entries"], 0)
+
+
+@unittest.skipIf(postgres_cache is None or not POSTGRES_TEST_DSN, "set PRIZM_TEST_POSTGRES_DSN to a throwaway database")
+class TestPostgresBackendConformance(CacheBackendConformance, unittest.TestCase):
+    def make_backend(self, directory):
+        backend = cache_manager_new.create_cache_backend("postgres", POSTGRES_TEST_DSN)
+        with backend.pool.connection() as conn:
+            conn.execute("TRUNCATE postal_code_cache, lookup_events, batch_jobs, batch_job_items RESTART IDENTITY")
+        return backend
+
+    def test_batch_jobs_are_shared_between_instances(self):
+        other = cache_manager_new.create_cache_backend("postgres", POSTGRES_TEST_DSN)
+        try:
+            job_id = self.backend.create_batch_job(["V8A0A8", "BAD"])
+            self.assertEqual(other.claim_batch_job("other-instance"), job_id)
+            self.assertIsNone(self.backend.claim_batch_job("this-instance"))
+            self.assertEqual(other.get_pending_batch_job_items(job_id), [(0, "V8A0A8"), (1, "BAD")])
+            self.assertTrue(other.checkpoint_batch_job(job_id, [(0, LOOKUP_RESULT), (1, {"status": "invalid"})]))
+            self.assertTrue(other.renew_batch_job_lease(job_id, "other-instance"))
+            other.finish_batch_job(job_id, "completed")
+
+            job = self.backend.get_batch_job(job_id)
+            self.assertEqual((job["status"], job["processed"], job["successful"], job["failed"]), ("completed", 2, 1, 1))
+            results = list(self.backend.iter_batch_job_results(job_id, chunk_size=1))
+            self.assertEqual(
+                [(index, code, result["status"]) for index, code, result in results],
+                [(0, "V8A0A8", "success"), (1, "BAD", "invalid")],
+            )
+        finally:
+            other.close()
+
+    def test_responses_and_dashboard_queries_match_sqlite(self):
+        sqlite_backend = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        result = {**LOOKUP_RESULT, "latitude": "49.3", "population": 1200, "geocoder_found": 1, "education": ""}
+        for backend in (sqlite_backend, self.backend):
+            backend.cache_data("V8A 0A8", result)
+            backend.cache_data("M5V 3L9", {"status": "error", "message": "quota unavailable"})
+            backend.record_lookup_event("V8A 0A8", "success", "upstream", stage_timings={"geocoder": 120})
+            backend.record_lookup_event("M5V 3L9", "error", "upstream", message="quota unavailable")
+
+        responses = [backend.get_cached_data("V8A 0A8") for backend in (sqlite_backend, self.backend)]
+        for response in responses:
+            response.pop("_cache_info")
+        self.assertEqual(responses[0], responses[1])
+
+        def without_times(rows):
+            return [{k: v for k, v in row.items() if k not in ("cached_at", "expires_at")} for row in rows]
+
+        self.assertEqual(
+            without_times(sqlite_backend.list_cache_entries(search="v8a")),
+            without_times(self.backend.list_cache_entries(search="v8a")),
+        )
+        summaries = [backend.get_lookup_event_summary(7) for backend in (sqlite_backend, self.backend)]
+        for key in ("lookups", "successful", "failed", "upstream_attempts", "stage_latency_ms"):
+            self.assertEqual(summaries[0][key], summaries[1][key])
+        self.assertEqual(
+            self.backend.export_cache_csv().splitlines()[0], sqlite_backend.export_cache_csv().splitlines()[0]
+        )
+
+
+class TestUpstreamPayloads(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        self.store = UpstreamPayloadStore(db_path=os.path.join(self.tmpdir.name, "cache.db.payloads"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_default_path_follows_cache_manager(self):
+        with patch("payload_store.cache_manager", self.cache), patch.dict(os.environ):
+            os.environ.pop("PRIZM_PAYLOAD_DB_PATH", None)
+            self.assertEqual(UpstreamPayloadStore().db_path, f"{self.cache.db_path}.payloads")
+
+    def test_rederive_rebuilds_rows_from_stored_payloads(self):
+        upstream = FakeUpstream(latency_ms=1, latency_sigma=0.1).start()
+        try:
+            client = PrizmClient(geocoder_api_url=upstream.url, supabase_url=upstream.url)
+            payloads = []
+            result = client.lookup("V8A 2P4", payloads=payloads)
+            client.session.close()
+        finally:
+            upstream.stop()
+
+        self.assertEqual([(key, endpoint) for key, _, endpoint, _ in payloads], [("V8A 2P4", "geocoder"), ("62", "segment")])
+        self.assertEqual(self.store.store_payloads(payloads), 2)
+        self.assertEqual(self.store.store_payloads(payloads), 2)
+        self.assertEqual(list(self.store.get_payloads(client.geocoder_vintage, "segment")), ["62"])
+
+        self.cache.cache_data("V8A 2P4", {**result, "segment_name": "stale mapping"})
+        with patch.object(cache_cli, "payload_store", self.store), patch.object(cache_cli, "cache_store", self.cache):
+            self.assertEqual(cache_cli.rederive(None, success_days=30, invalid_days=30, error_days=30), (1, 0, 0))
+            self.assertEqual(cache_cli.rederive("2019", success_days=30, invalid_days=30, error_days=30), (0, 0, 0))
+
+        fresh = CacheManager(db_path=os.path.join(self.tmpdir.name, "fresh.db"))
+        fresh.cache_data("V8A 2P4", result)
+        rebuilt, expected = self.cache.get_cached_data("V8A 2P4"), fresh.get_cached_data("V8A 2P4")
+        rebuilt.pop("_cache_info")
+        expected.pop("_cache_info")
+        self.assertEqual(rebuilt, expected)
+
+
+class TestSchemaBootstrap(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_migrations_run_once_per_schema_version(self):
+        CacheManager(db_path=self.db_path)
+        with patch.object(CacheManager, "_migrate_schema") as migrate:
+            CacheManager(db_path=self.db_path)
+            migrate.assert_not_called()
+
+            with patch.object(cache_manager_new, "SCHEMA_VERSION", cache_manager_new.SCHEMA_VERSION + 1):
+                CacheManager(db_path=self.db_path)
+            migrate.assert_called_once()
+
+    def test_currency_display_is_stored_at_write_time_and_backfilled(self):
+        manager = CacheManager(db_path=self.db_path)
+        manager.cache_data("K1A0B1", {"status": "success", "segment_number": "21", "average_household_income": "$140,223"})
+        with manager._connect() as conn:
+            conn.execute(
+                "INSERT INTO postal_code_cache (postal_code, segment_number, average_household_income, status, expires_at)"
+                " VALUES ('M5V 2T6', '3', 95199, 'success', datetime('now', '+1 day'))"
+            )
+            conn.commit()
+        manager.backfill_display_values()
+
+        with patch.object(manager, "_format_currency_from_int", side_effect=AssertionError("formatted on read")):
+            written = manager.get_cached_data("K1A0B1")
+            backfilled = manager.get_cached_data("M5V2T6")
+        self.assertEqual(written["average_household_income"], "$140,223")
+        self.assertEqual(written["average_household_net_worth"], "$1M to $2.15M")
+        self.assertEqual(written["average_household_net_worth_amount"], 1255437)
+        self.assertEqual(backfilled["average_household_income"], "$95,199")
+        self.assertEqual(backfilled["average_household_net_worth_amount"], 2337233)
+
+    def test_lazy_object_builds_on_first_use(self):
+        factory = Mock(return_value=Mock(lookup=Mock(return_value="real")))
+        client = LazyObject(factory)
+        factory.assert_not_called()
+
+        with patch.object(client, "lookup", return_value="patched"):
+            self.assertEqual(client.lookup(), "patched")
+        self.assertEqual(client.lookup(), "real")
+        factory.assert_called_once_with()
+
+
+class TestBatchJobs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_job_checkpoints_and_completes(self):
+        job_id = self.cache.create_batch_job(["V8A0A8", "BAD", "M5V3L9"])
+        worker_id = "test-worker"
+        self.assertEqual(self.cache.claim_batch_job(worker_id), job_id)
+        self.assertIsNone(self.cache.claim_batch_job("other-worker"))
+
+        def lookup(postal_code, _job_id):
+            if postal_code == "BAD":
+                return {"postal_code": postal_code, "status": "invalid"}
+            return {**LOOKUP_RESULT, "postal_code": normalize_postal_code(postal_code)}
+
+        runner = BatchJobRunner(lookup, self.cache, checkpoint_size=2)
+        runner.process_job(job_id, worker_id)
+
+        job = self.cache.get_batch_job(job_id)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual((job["processed"], job["successful"], job["failed"]), (3, 2, 1))
+        csv_text = "".join(job_results_csv(self.cache.iter_batch_job_results(job_id)))
+        self.assertEqual(len(csv_text.strip().splitlines()), 4)
+        self.assertIn("M5V 3L9", csv_text)
+
+    def test_expired_lease_is_reclaimed(self):
+        job_id = self.cache.create_batch_job(["V8A0A8"])
+        self.assertEqual(self.cache.claim_batch_job("dead-worker", lease_seconds=-1), job_id)
+        self.assertEqual(self.cache.claim_batch_job("new-worker"), job_id)
+        self.assertFalse(self.cache.renew_batch_job_lease(job_id, "dead-worker"))
+
+    @patch("app.reporting_snapshot.start")
+    @patch("app.job_runner.start")
+    def test_job_api_queues_and_reports_conflict_until_finished(self, start, _snapshot_start):
+        with patch("app.job_store", self.cache):
+            response = self.client_post_job()
+            self.assertEqual(response.status_code, 202)
+            job_id = response.get_json()["job_id"]
+            start.assert_called()
+
+            client = app.test_client()
+            self.assertEqual(client.get(f"/api/jobs/{job_id}").get_json()["status"], "queued")
+            self.assertEqual(client.get(f"/api/jobs/{job_id}/results").status_code, 409)
+            self.assertEqual(client.get("/api/jobs/missing").status_code, 404)
+
+    def client_post_job(self):
+        return app.test_client().post("/api/jobs", json={"postal_codes": ["V8A0A8", "M5V3L9"]})
+
+
+class TestCacheJanitor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_deletes_expired_entries_in_batches(self):
+        for number in range(5):
+            self.cache.cache_data(f"V8A 0A{number}", LOOKUP_RESULT, custom_duration_days=-2)
+        self.cache.cache_data("M5V 3L9", LOOKUP_RESULT)
+
+        batches = []
+        janitor = CacheJanitor(self.cache, batch_size=2, pause_ms=0)
+        progress = janitor.run_once(on_progress=lambda p: batches.append(p["deleted"]))
+
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual((progress["state"], progress["deleted"], progress["batches"]), ("idle", 5, 3))
+        self.assertEqual(self.cache.get_cache_stats()["total_entries"], 1)
+        self.assertIsNotNone(self.cache.get_cached_data("M5V 3L9"))
+
+    def test_skips_pass_while_another_worker_holds_lease(self):
+        self.cache.cache_data("V8A 0A8", LOOKUP_RESULT, custom_duration_days=-2)
+        self.assertTrue(self.cache.acquire_maintenance_lease(LEASE_NAME, "other-worker"))
+
+        progress = CacheJanitor(self.cache, pause_ms=0).run_once()
+        self.assertIn("skipped_at", progress)
+        self.assertEqual(self.cache.get_cache_stats()["total_entries"], 1)
+
+        self.cache.release_maintenance_lease(LEASE_NAME, "other-worker")
+        self.assertEqual(CacheJanitor(self.cache, pause_ms=0).run_once()["deleted"], 1)
+
+    def test_progress_is_shared_between_workers(self):
+        for number in range(3):
+            self.cache.cache_data(f"V8A 0A{number}", LOOKUP_RESULT, custom_duration_days=-2)
+        other = CacheJanitor(self.cache)
+        self.assertEqual(other.progress(), {"state": "idle"})
+
+        seen = []
+        CacheJanitor(self.cache, batch_size=2, pause_ms=0).run_once(on_progress=lambda p: seen.append(other.progress()))
+        self.assertEqual([(p["state"], p["deleted"]) for p in seen], [("running", 2), ("running", 3)])
+        self.assertEqual((other.progress()["state"], other.progress()["deleted"]), ("idle", 3))
+
+    def test_progress_of_a_pass_whose_worker_died(self):
+        self.assertTrue(self.cache.acquire_maintenance_lease(LEASE_NAME, "dead-worker", lease_seconds=-1))
+        self.cache.save_maintenance_progress(LEASE_NAME, "dead-worker", {"state": "running", "deleted": 7})
+        progress = CacheJanitor(self.cache).progress()
+        self.assertEqual((progress["state"], progress["deleted"]), ("idle", 7))
+        self.assertIn("error", progress)
+
+    @patch("app.cache_janitor.trigger", return_value={"state": "queued"})
+    def test_cleanup_endpoint_returns_immediately(self, trigger):
+        response = app.test_client().post("/api/cache/cleanup")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()["progress"]["state"], "queued")
+        trigger.assert_called_once_with()
+
+
+class TestResegmentWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        for code in ("A1A 1A1", "B2B 2B2", "C3C 3C3", "D4D 4D4"):
+            self.cache.cache_data(code, {**LOOKUP_RESULT, "postal_code": code, "vintage": "2025"})
+        self.cache.cache_data("E5E 5E5", {**LOOKUP_RESULT, "postal_code": "E5E 5E5", "vintage": "2026"})
+        self.cache.cache_data("F6F 6F6", {**LOOKUP_RESULT, "postal_code": "F6F 6F6"})
+        self.cache.cache_data("G7G 7G7", {"status": "invalid", "message": "Invalid postal code format", "vintage": "2025"})
+        for code, hits in (("C3C 3C3", 3), ("B2B 2B2", 1), ("E5E 5E5", 5)):
+            for _ in range(hits):
+                self.cache.record_lookup_event(code, "success", "cache", endpoint="single", from_cache=True)
+        self.cache.record_lookup_event("D4D 4D4", "success", "upstream", endpoint="resegment")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def relookup(self, postal_codes, vintage="2026"):
+        results = []
+        for code in postal_codes:
+            result = {**LOOKUP_RESULT, "postal_code": code, "vintage": vintage}
+            self.cache.cache_data(code, result)
+            results.append(result)
+        return results
+
+    def test_candidates_are_popular_outdated_rows_first(self):
+        self.assertEqual(
+            self.cache.get_resegment_candidates("2026", limit=10),
+            ["C3C 3C3", "B2B 2B2", "A1A 1A1", "D4D 4D4"],
+        )
+        self.assertEqual(self.cache.get_resegment_candidates("2026", limit=3, exclude={"B2B 2B2"}), ["C3C 3C3", "A1A 1A1", "D4D 4D4"])
+        self.assertEqual(self.cache.get_resegment_candidates("2026", limit=10, include_untagged=True)[-1], "F6F 6F6")
+        self.assertEqual(self.cache.count_outdated_entries("2026"), 4)
+        self.assertEqual(self.cache.count_outdated_entries("2026", include_untagged=True), 5)
+
+    def test_tag_untagged_entries(self):
+        self.assertEqual(self.cache.tag_untagged_entries("2026", batch_size=1), 1)
+        self.assertEqual(self.cache.get_cached_data("F6F 6F6")["vintage"], "2026")
+        self.assertEqual(self.cache.count_outdated_entries("2026", include_untagged=True), 4)
+
+    def test_pass_looks_up_outdated_rows_in_batches(self):
+        batches = []
+        worker = ResegmentWorker(
+            self.cache,
+            lambda codes: batches.append(codes) or self.relookup(codes),
+            lambda: "2026",
+            batch_size=3,
+            lookups_per_second=1000,
+        )
+        progress = worker.run_once()
+
+        self.assertEqual(batches, [["C3C 3C3", "B2B 2B2", "A1A 1A1"], ["D4D 4D4"]])
+        self.assertEqual((progress["outdated"], progress["looked_up"], progress["updated"]), (4, 4, 4))
+        self.assertEqual(self.cache.count_outdated_entries("2026"), 0)
+        self.assertNotIn("vintage", self.cache.get_cached_data("F6F 6F6"))
+        other_worker = ResegmentWorker(self.cache, Mock(), lambda: "2026")
+        self.assertEqual((other_worker.progress()["state"], other_worker.progress()["updated"]), ("idle", 4))
+
+    def test_pass_stops_when_a_whole_batch_fails(self):
+        lookup = Mock(side_effect=lambda codes: [{"status": "error"} for _ in codes])
+        progress = ResegmentWorker(self.cache, lookup, lambda: "2026", batch_size=2, lookups_per_second=1000).run_once()
+
+        lookup.assert_called_once_with(["C3C 3C3", "B2B 2B2"])
+        self.assertEqual((progress["looked_up"], progress["updated"]), (2, 0))
+        self.assertIn("current vintage", progress["error"])
+        self.assertEqual(self.cache.count_outdated_entries("2026"), 4)
+
+    @patch("app.resegment_worker.trigger", return_value={"state": "queued"})
+    def test_resegment_endpoint_returns_immediately(self, trigger):
+        response = app.test_client().post("/api/cache/resegment")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()["progress"]["state"], "queued")
+        trigger.assert_called_once_with()
+
+    @patch("app.refresh_ahead_worker.trigger")
+    @patch("app.resegment_worker.trigger")
+    def test_sqlite_only_workers_refuse_other_backends(self, resegment, refresh_ahead):
+        with patch("app.CACHE_BACKEND", "postgres"):
+            self.assertEqual(app.test_client().post("/api/cache/resegment").status_code, 501)
+            self.assertEqual(app.test_client().post("/api/cache/refresh-ahead").status_code, 501)
+        resegment.assert_not_called()
+        refresh_ahead.assert_not_called()
+
+
+class TestRefreshAhead(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        for code, days in (("A1A 1A1", 1), ("B2B 2B2", 1), ("C3C 3C3", 30), ("D4D 4D4", 1), ("E5E 5E5", -1)):
+            self.cache.cache_data(code, {**LOOKUP_RESULT, "postal_code": code}, custom_duration_days=days)
+        for code, hits in (("A1A 1A1", 3), ("B2B 2B2", 5), ("C3C 3C3", 9), ("D4D 4D4", 2), ("E5E 5E5", 4)):
+            for _ in range(hits):
+                self.cache.record_lookup_event(code, "success", "cache", endpoint="single", from_cache=True)
+        # Background lookups do not make a postal code popular.
+        self.cache.record_lookup_event("D4D 4D4", "success", "upstream", endpoint="resegment")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def refresh(self, postal_codes):
+        for code in postal_codes:
+            self.cache.cache_data(code, {**LOOKUP_RESULT, "postal_code": code})
+            self.cache.record_lookup_event(code, "success", "upstream", endpoint="refresh")
+        return [{**LOOKUP_RESULT, "postal_code": code} for code in postal_codes]
+
+    def test_candidates_are_popular_rows_close_to_expiry(self):
+        self.assertEqual(self.cache.get_refresh_candidates(limit=10, ahead_hours=48), ["B2B 2B2", "E5E 5E5", "A1A 1A1"])
+        self.assertEqual(self.cache.get_refresh_candidates(limit=10, min_hits=5, ahead_hours=48), ["B2B 2B2"])
+        self.assertEqual(self.cache.get_refresh_candidates(limit=1, ahead_hours=48, exclude={"B2B 2B2"}), ["E5E 5E5"])
+
+    def test_popular_error_rows_are_retried_after_expiring_rows(self):
+        self.cache.cache_data("C3C 3C3", {"status": "error", "message": "Upstream timed out"}, custom_duration_days=30)
+        self.assertEqual(
+            self.cache.get_refresh_candidates(limit=10, ahead_hours=48), ["B2B 2B2", "E5E 5E5", "A1A 1A1", "C3C 3C3"]
+        )
+
+    def test_pass_stops_at_the_hourly_budget(self):
+        worker = RefreshAheadWorker(self.cache, self.refresh, lookups_per_hour=360000, batch_size=2, ahead_hours=48)
+        with patch.object(self.cache, "count_recent_lookups", side_effect=[0, 360000]) as count_recent_lookups:
+            progress = worker.run_once()
+
+        count_recent_lookups.assert_called_with("refresh", 3600)
+        self.assertEqual((progress["looked_up"], progress["refreshed"], progress["budget_exhausted"]), (2, 2, True))
+        self.assertEqual(self.cache.get_refresh_candidates(limit=10, ahead_hours=48), ["A1A 1A1"])
+        self.assertEqual(self.cache.count_recent_lookups("refresh"), 2)
+        self.assertEqual(worker.counts()["refreshes"], 2)
+
+    def test_pass_stops_when_a_whole_batch_fails(self):
+        lookup = Mock(side_effect=lambda codes: [{"status": "error"} for _ in codes])
+        progress = RefreshAheadWorker(self.cache, lookup, lookups_per_hour=360000, batch_size=2, ahead_hours=48).run_once()
+
+        lookup.assert_called_once_with(["B2B 2B2", "E5E 5E5"])
+        self.assertEqual((progress["looked_up"], progress["refreshed"]), (2, 0))
+        self.assertIn("failed", progress["error"])
+
+    def test_summary_counts_refresh_ahead_hits_and_misses(self):
+        self.cache.record_lookup_event("F6F 6F6", "success", "upstream", endpoint="single")
+        self.cache.record_lookup_event("F6F 6F6", "success", "upstream", endpoint="refresh")
+        self.cache.record_lookup_event("F6F 6F6", "success", "cache", endpoint="batch", from_cache=True)
+        self.cache.record_lookup_event("G7G 7G7", "success", "upstream", endpoint="single")
+        self.cache.record_lookup_event("G7G 7G7", "success", "upstream", endpoint="single")
+        self.cache.record_lookup_event("H8H 8H8", "success", "upstream", endpoint="single")
+
+        self.assertEqual(self.cache.get_refresh_ahead_counts(7), {"refreshes": 1, "hits": 1, "misses": 1})
+
+    @patch("app.refresh_ahead_worker.trigger", return_value={"state": "queued"})
+    def test_refresh_ahead_endpoint_returns_immediately(self, trigger):
+        response = app.test_client().post("/api/cache/refresh-ahead")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()["progress"]["state"], "queued")
+        trigger.assert_called_once_with()
+
+
+class TestReportingSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = CacheManager(db_path=os.path.join(self.tmpdir.name, "cache.db"))
+        self.snapshot = ReportingSnapshot(self.cache, refresh_seconds=60, max_age_seconds=120)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_refresh_copies_a_point_in_time_view(self):
+        self.cache.cache_data("V8A 0A8", LOOKUP_RESULT)
+        self.assertIsNone(self.snapshot.reader())
+        self.assertEqual(self.snapshot.refresh()["status"], "success")
+        self.cache.cache_data("M5V 3L9", LOOKUP_RESULT)
+
+        reader = self.snapshot.reader()
+        self.assertEqual(reader.get_cache_stats()["total_entries"], 1)
+        self.assertEqual(self.cache.get_cache_stats()["total_entries"], 2)
+        self.assertEqual(self.snapshot.status()["source"], "snapshot")
+
+        self.snapshot.refresh()
+        self.assertEqual(self.snapshot.reader().get_cache_stats()["total_entries"], 2)
+        self.assertFalse(os.path.exists(f"{self.snapshot.path}.migrate.lock"))
+
+    def test_reader_is_read_only_and_skips_an_outdated_snapshot(self):
+        self.snapshot.refresh()
+        reader = self.snapshot.reader()
+        self.assertFalse(reader.cache_data("V8A 0A8", LOOKUP_RESULT))
+        self.assertEqual(self.cache.get_cache_stats()["total_entries"], 0)
+
+        with patch.object(cache_manager_new, "SCHEMA_VERSION", cache_manager_new.SCHEMA_VERSION + 1):
+            self.assertIsNone(self.snapshot.reader())
+
+    def test_dashboard_falls_back_to_live_data_when_snapshot_is_stale(self):
+        self.cache.cache_data("V8A 0A8", LOOKUP_RESULT)
+        self.snapshot.refresh()
+        self.cache.cache_data("M5V 3L9", LOOKUP_RESULT)
+        client = app.test_client()
+
+        with patch("app.cache_manager", self.cache), patch("app.reporting_snapshot", self.snapshot):
+            summary = client.get("/api/dashboard/summary").get_json()
+            self.assertEqual(summary["reporting"]["source"], "snapshot")
+            self.assertEqual(summary["cache_stats"]["total_entries"], 1)
+
+            stale = time.time() - 600
+            os.utime(self.snapshot.path, (stale, stale))
+            summary = client.get("/api/dashboard/summary").get_json()
+            self.assertEqual(summary["reporting"]["source"], "live")
+            self.assertEqual(summary["cache_stats"]["total_entries"], 2)
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    slow_requests = 0
+
+    def do_GET(self):
+        if _JsonHandler.slow_requests > 0:
+            _JsonHandler.slow_requests -= 1
+            time.sleep(0.5)
+        body = b'[{"Segment Number": 62}]'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUpstreamConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _JsonHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = PrizmClient(supabase_url=f"http://127.0.0.1:{self.server.server_port}", pool_size=3)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sequential_requests_reuse_one_connection(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get_segment(62), {"Segment Number": 62})
+
+        [stats] = self.client.connection_stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+        self.assertEqual(stats["pool_size"], 3)
+
+    def test_slow_supabase_get_is_hedged(self):
+        self.client.hedge_requests = True
+        self.client.hedge_default_delay = 0.05
+        _JsonHandler.slow_requests = 1
+
+        started = time.monotonic()
+        self.assertEqual(self.client.get_segment(62), {"Segment Number": 62})
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(self.client.hedges_sent, 1)
+
+    def test_deadline_splits_budget_across_remaining_hops(self):
+        deadline = Deadline(6)
+        self.assertAlmostEqual(deadline.timeout_for(3, cap=12), 2, places=1)
+        self.assertAlmostEqual(deadline.timeout_for(1, cap=4), 4, places=1)
+        with self.assertRaises(PrizmDeadlineExceeded):
+            Deadline(0).timeout_for(1, cap=12)
+
+    def test_timeout_of_a_budget_bound_hop_is_a_deadline_error(self):
+        timeout = Mock(side_effect=requests.Timeout("read timed out"))
+        with self.assertRaises(PrizmDeadlineExceeded):
+            self.client._call(Deadline(6), 3, timeout)
+        self.assertLess(timeout.call_args.args[0], self.client.timeout_seconds)
+        with self.assertRaises(requests.Timeout):
+            self.client._call(None, 3, timeout)
+        with self.assertRaises(requests.Timeout):
+            self.client._call(Deadline(600), 1, timeout)
+
+    def test_read_timeouts_are_not_retried(self):
+        retry = self.client.adapter.max_retries
+        with self.assertRaises(ReadTimeoutError):
+            retry.increment("GET", "/", error=ReadTimeoutError(None, "/", "timed out"))
+        self.assertEqual(retry.increment("GET", "/", error=ProtocolError("reset")).total, retry.total - 1)
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_admin_header_profiles_request_and_profile_can_be_downloaded(self):
+        profiler = RequestProfiler(directory=self.tmpdir.name, interval_ms=1)
+        admin = {"X-Admin-Key": "admin-secret"}
+
+        def slow_segments():
+            time.sleep(0.05)
+            return []
+
+        with patch.dict(os.environ, {"PRIZM_ADMIN_KEY": "admin-secret"}), patch("app.profiler", profiler), \
+                patch("app.prizm_client.get_all_segments", side_effect=slow_segments):
+            client = app.test_client()
+            self.assertNotIn("X-Profile-Name", client.get("/api/segments", headers={"X-Profile": "1"}).headers)
+            name = client.get("/api/segments", headers={"X-Profile": "1", **admin}).headers["X-Profile-Name"]
+
+            listing = client.get("/api/admin/profiles", headers=admin).get_json()
+            download = client.get(f"/api/admin/profiles/{name}", headers=admin)
+            self.assertEqual(client.get("/api/admin/profiles").status_code, 403)
+            self.assertEqual(client.get("/api/admin/profiles/../../etc/passwd", headers=admin).status_code, 404)
+
+        self.assertEqual([profile["name"] for profile in listing["profiles"]], [name])
+        self.assertEqual(listing["profiles"][0]["request"], "get_api_segments")
+        self.assertIn("slow_segments_(test_prizm_api.py:", download.get_data(as_text=True))
+        self.assertRegex(download.get_data(as_text=True).splitlines()[0], r"^\S+ \d+$")
+
+    def test_threshold_keeps_only_slow_requests_in_a_bounded_buffer(self):
+        profiler = RequestProfiler(directory=self.tmpdir.name, threshold_ms=20, interval_ms=1, max_files=2)
+        self.assertIsNone(RequestProfiler(directory=self.tmpdir.name, sample_rate=0, threshold_ms=0).start())
+
+        names = []
+        for duration_ms in (5, 30, 40, 50):
+            session = profiler.start()
+            time.sleep(0.02)
+            names.append(profiler.finish(session, "GET /api/prizm/batch", duration_ms))
+
+        self.assertIsNone(names[0])
+        self.assertEqual(len(profiler.list_profiles()), 2)
+        self.assertEqual({profile["duration_ms"] for profile in profiler.list_profiles()}, {40, 50})
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def test_fake_upstream_serves_fixture_segments(self):
+        upstream = FakeUpstream(latency_ms=1, latency_sigma=0.1).start()
+        try:
+            client = PrizmClient(geocoder_api_url=upstream.url, supabase_url=upstream.url)
+            result = client.lookup("V8A 2P4")
+            client.session.close()
+        finally:
+            upstream.stop()
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["segment_number"], "62")
+        self.assertEqual(result["segment_name"], "Suburban Recliners")
+
+    def test_synthetic_cache_scale_test_times_every_method(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "synthetic.db")
+            generated = generate_cache_db(db_path, postal_codes=300, events=900, html_ratio=0.05)
+            report = run_scale_test(db_path, point_calls=5, scan_calls=1)
+
+            cache = CacheManager(db_path=db_path)
+            stats = cache.get_cache_stats()
+
+        self.assertEqual(generated["postal_codes"], 300)
+        self.assertEqual((report["postal_codes"], report["events"]), (300, 900))
+        self.assertIn("export_cache_csv", report["methods"])
+        self.assertIn("cleanup_expired_cache", report["methods"])
+        self.assertEqual(stats["total_entries"], 300)
+        self.assertGreater(stats["status_breakdown"]["success"], stats["status_breakdown"].get("error", 0))
+
+    def test_baseline_comparison_flags_regressions(self):
+        def run(p95, rps):
+            return {"scenario": "single_warm", "concurrency": 8, "latency_ms": {"p95": p95}, "throughput_rps": rps}
+
+        [ok] = compare_to_baseline([run(105, 95)], {"results": [run(100, 100)]}, threshold=0.10)
+        [slow] = compare_to_baseline([run(130, 70)], {"results": [run(100, 100)]}, threshold=0.10)
+
+        self.assertFalse(ok["regression"])
+        self.assertEqual(slow["reasons"], ["p95 latency up 30%", "throughput down 30%"])
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+
+
+@unittest.skipIf(asgi is None, "async serving dependencies are not installed")
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake_client = AsyncMock()
+        self.fake_client.lookup.return_value = LOOKUP_RESULT
+        self.asgi_app = asgi.PrizmASGIApp(app, client=self.fake_client)
+        self.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.asgi_app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.http.aclose()
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_data", return_value=True)
+    @patch("app.cache_manager.get_cached_data", return_value=None)
+    async def test_async_single_lookup(self, _get_cached_data, cache_data, _record):
+        response = await self.http.get("/api/prizm", params={"postal_code": "V8A0A8"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["prizm_code"], "21")
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "*")
+        self.fake_client.lookup.assert_awaited_once_with("V8A0A8", deadline=ANY, timings=ANY, payloads=[])
+        cache_data.assert_called_once_with("V8A 0A8", LOOKUP_RESULT, custom_duration_days=3650)
+
+    @patch("app.cache_manager.record_lookup_event")
+    @patch("app.cache_manager.cache_many", return_value=2)
+    @patch("app.cache_manager.get_cached_many", return_value={})
+    async def test_async_batch_keeps_request_order(self, _get_cached_many, cache_many, _record):
+        response = await self.http.post("/api/prizm/batch", json={"postal_codes": ["V8A0A8", "M5V3L9"]})
+        data = response.json()
+
+        self.assertEqual(data["total"], 2)
+        self.assertEqual(self.fake_client.lookup.await_count, 2)
+        cache_many.assert_called_once()
+        self.assertEqual((await self.http.post("/api/prizm/batch", json={"postal_codes": []})).status_code, 400)
+
+    async def test_async_client_resolves_geocoder_then_segment(self):
+        def handler(request):
+            if request.url.path.endswith("/RuralEnhanced"):
+                return httpx.Response(200, json={"1": {"found": True, "segmentation": {"codes": {"PZMLLIC": "62"}}}})
+            return httpx.Response(200, json=[{"PRIZM Name": "Down to Earth", "Average Income": "95199"}])
+
+        client = asgi.AsyncPrizmClient()
+        await client.aclose()
+        client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        result = await client.lookup("M5V3L9")
+        await client.aclose()
+
+        self.assertEqual(result["segment_number"], "62")
+        self.assertEqual(result["average_household_income"], "$95,199")
+
+    async def test_other_routes_fall_through_to_flask(self):
+        response = await self.http.get("/health")
+        self.assertEqual(response.json()["status"], "ok")
+
+    async def test_api_key_is_enforced(self):
+        with patch.dict(os.environ, {"PRIZM_API_KEY": "secret"}):
+            self.assertEqual((await self.http.get("/api/prizm", params={"postal_code": "V8A0A8"})).status_code, 401)
+
 
 if __name__ == "__main__":
     unittest.main()